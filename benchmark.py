@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 from protobrain import brain
 from protobrain import neuron
@@ -7,7 +9,6 @@ from protobrain import learning
 from protobrain.encoders import numerical
 from protobrain.metrics import benchmark
 from protobrain.metrics import spike_count
-from protobrain.metrics import spike_density
 
 
 if __name__ == "__main__":
@@ -53,4 +54,4 @@ if __name__ == "__main__":
     ]
 
     b = benchmark.Benchmark(metrics)
-    results = b.run(brains, sample_inputs, verbose=True)
+    results = b.run(brains, sample_inputs, verbose=True, workers=os.cpu_count(), seed=0)
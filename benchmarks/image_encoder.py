@@ -0,0 +1,55 @@
+"""Compare the torch and NumPy backends of BlackWhiteEncoder.
+
+Run from the repository root with `python -m benchmarks.image_encoder`.
+"""
+
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from protobrain.encoders import image
+
+
+def import_time(module: str) -> float:
+    """The seconds a fresh interpreter takes to import a module."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    repeats = 5
+    baseline = import_time("numpy")
+    print(f"import torch: {(import_time('torch') - baseline) * 1e3:.0f}ms")
+
+    print(f"{'images':>16} {'torch':>12} {'numpy':>12} {'gain':>8}")
+    for count, size in [(1, 64), (100, 64), (1_000, 64), (100, 256), (10, 1024)]:
+        images = np.random.random((count, size, size))
+        encoders = [
+            image.BlackWhiteEncoder(size, size, backend=backend)
+            for backend in (image.TORCH, image.NUMPY)
+        ]
+        for encoder in encoders:
+            encoder.noise_value = 0
+
+        torch_encoded, numpy_encoded = (e.encode_many(images) for e in encoders)
+        mismatches = np.count_nonzero(torch_encoded != numpy_encoded)
+
+        torch_time, numpy_time = (
+            min(
+                timeit.repeat(
+                    lambda e=e, images=images: e.encode_many(images),
+                    number=1,
+                    repeat=repeats,
+                )
+            )
+            for e in encoders
+        )
+        print(
+            f"{f'{count} x {size}x{size}':>16} {torch_time * 1e3:>10.2f}ms "
+            f"{numpy_time * 1e3:>10.2f}ms {torch_time / numpy_time:>7.2f}x"
+            + (f" ({mismatches} bits differ)" if mismatches else "")
+        )
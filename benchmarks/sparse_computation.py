@@ -0,0 +1,63 @@
+"""Compare the top-k selection of SparseComputation against a full sort.
+
+Run from the repository root with `python -m benchmarks.sparse_computation`.
+"""
+
+import timeit
+
+import numpy as np
+
+from protobrain import computation
+
+
+def argsort_selection(activations: np.ndarray, n: int) -> np.ndarray:
+    """The selection by full sort that SparseComputation used to perform."""
+    top_indices = activations.argsort()[-n:]
+    result = np.zeros(len(activations))
+    result[top_indices] = 1
+    return result
+
+
+if __name__ == "__main__":
+    sparsity = 0.01
+    repeats = 20
+    sparse = computation.SparseComputation(sparsity)
+    sparse_indices = computation.SparseComputation(sparsity, indices=True)
+
+    print(
+        f"{'neurons':>10} {'argsort':>12} {'partition':>12} {'indices':>12} {'gain':>8}"
+    )
+    for size in [1_000, 10_000, 100_000, 200_000, 1_000_000]:
+        activations = np.random.random(size)
+        out = np.zeros(size)
+        n = int(np.ceil(sparsity * size))
+
+        np.testing.assert_array_equal(
+            argsort_selection(activations, n), sparse._fire(activations, out)
+        )
+
+        baseline = min(
+            timeit.repeat(
+                lambda activations=activations, n=n: argsort_selection(activations, n),
+                number=1,
+                repeat=repeats,
+            )
+        )
+        partition = min(
+            timeit.repeat(
+                lambda activations=activations, out=out: sparse._fire(activations, out),
+                number=1,
+                repeat=repeats,
+            )
+        )
+        indices = min(
+            timeit.repeat(
+                lambda activations=activations: sparse_indices._fire(activations),
+                number=1,
+                repeat=repeats,
+            )
+        )
+        print(
+            f"{size:>10} {baseline * 1e3:>10.3f}ms {partition * 1e3:>10.3f}ms "
+            f"{indices * 1e3:>10.3f}ms {baseline / partition:>7.1f}x"
+        )
@@ -1,9 +1,16 @@
 """The top-level module for dealing with a brain instance."""
 
+from collections.abc import Sequence
+
+import numpy as np
+
+from protobrain import checkpoint
+from protobrain import compiled
 from protobrain import computation as _computation
 from protobrain import learning as _learning
 from protobrain import neuron
 from protobrain import sensor
+from protobrain.metrics import metric
 
 
 class Brain:
@@ -30,19 +37,100 @@ class Brain:
         """
         self.neurons = neurons
         self.sensor = sensor
-        self.computation = computation
-        self.learning = learning
+        if computation is not None:
+            self.computation = computation
+        if learning is not None:
+            self.learning = learning
+        self.recorders = []
 
-        neurons.input = sensor
+        if neurons.input._connected_output not in (sensor, sensor.output):
+            neurons.input = sensor
 
     def compute(self):
         """Compute the next brain state."""
-        return self.neurons.compute()
+        values = self.neurons.compute()
+        for recorder in self.recorders:
+            recorder.next(self.neurons)
+        return values
+
+    def attach(self, recorder: metric.Metric):
+        """Record the state of the neurons after computing every step.
+
+        Args:
+            recorder: A metric, like an ActivityRecorder, which gets reset
+        """
+        recorder.reset()
+        self.recorders.append(recorder)
+
+    def detach(self, recorder: metric.Metric):
+        """Stop recording the state of the neurons with an attached recorder.
+
+        Args:
+            recorder: A recorder attached to this brain
+
+        Returns:
+            The results of the recorder, e.g. the directory of an activity
+            recording, which is finished.
+        """
+        self.recorders.remove(recorder)
+        return recorder.compute()
+
+    def compute_batch(self, values: Sequence) -> np.ndarray:
+        """Compute the brain states for a sequence of sensor values at once.
+
+        The whole sequence is encoded up front and pushed through each layer
+        as a single matrix product, without any learning in between.
+
+        Args:
+            values: The sensor values to compute, in order
+
+        Returns:
+            A matrix with the output of the neurons for each value in its rows.
+        """
+        if self.recorders:
+            raise ValueError(
+                "Cannot compute a batch while recorders are attached, "
+                "as they record every step: detach them first"
+            )
+        return self.neurons.compute_batch(self.sensor.feed_many(values))
 
     def learn(self):
         """Learn and adapt connections."""
         self.neurons.learn()
 
+    def save(self, path: str) -> None:
+        """Save the brain, including its synapses, into a directory.
+
+        Args:
+            path: The directory to save into, see checkpoint
+        """
+        checkpoint.save(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Brain":
+        """Restore a brain saved into a directory.
+
+        Args:
+            path: The directory the brain was saved into
+            mmap: Optional - whether to map the synapses into memory instead
+                of reading them, so that even large brains load immediately
+
+        Returns:
+            The brain, computing and learning as the saved one did.
+        """
+        neurons, sensor = checkpoint.load(path, mmap=mmap)
+        return cls(neurons, sensor)
+
+    def compile(self) -> compiled.CompiledBrain:
+        """Freeze the brain into a flat plan to run many steps quickly.
+
+        Returns:
+            An executor giving the same results as computing and learning
+            through this brain, which holds on to its outputs until closed,
+            see compiled.CompiledBrain
+        """
+        return compiled.CompiledBrain(self)
+
     @property
     def computation(self):
         return self.neurons.computation
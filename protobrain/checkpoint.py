@@ -0,0 +1,408 @@
+"""Module for saving the whole state of a brain and restoring it.
+
+A checkpoint is a directory holding:
+
+* brain.json, the topology: the shape, synapse type and density of every
+  innermost layer, the name of each of their inputs and what it is connected
+  to, and how the layers are nested
+* the encoder of the sensor and the computation and learning functions of
+  the layers, described in brain.json by the parameters they were created
+  with, so that loading a checkpoint never runs code stored in it
+* one raw NumPy file per array of synapses, which can be mapped into memory
+  when loading instead of being read. The synapses of inputs that are stacked,
+  see synapses.InputStack, are saved as the single block they are stacked
+  into, so that mapping them does not need to copy them into a new block.
+* the value and output of the sensor and the output of every layer, so that
+  layers reading the previous step carry on as they would have
+"""
+
+import json
+import os
+
+import numpy as np
+
+from protobrain import computation
+from protobrain import learning
+from protobrain import neuron
+from protobrain import scheduler
+from protobrain import sensor as _sensor
+from protobrain import synapses
+from protobrain.encoders import image
+from protobrain.encoders import numerical
+
+FORMAT = 2
+
+_TOPOLOGY = "brain.json"
+_SENSOR_VALUE = "sensor.value"
+_SPARSE_ARRAYS = ("indptr", "indices", "data")
+_LAYERED = ("LayeredNeurons", "Scheduler")
+
+_NUMERICAL_PARAMETERS = ("min_value", "max_value", "length", "sparsity", "cache_size")
+
+# The types of objects that can be saved, each with the parameters it is
+# created with, which it keeps as attributes of the same name unless renamed
+# in _ATTRIBUTES.
+_PARAMETERS = {
+    cls.__name__: (cls, parameters)
+    for cls, parameters in [
+        (numerical.SimpleEncoder, _NUMERICAL_PARAMETERS),
+        (numerical.CyclicEncoder, _NUMERICAL_PARAMETERS),
+        (
+            image.BlackWhiteEncoder,
+            (
+                "height",
+                "width",
+                "min_spatial_resolution",
+                "brightness_buckets",
+                "normalize",
+                "backend",
+            ),
+        ),
+        (computation.StandardComputation, ("threshold", "gains")),
+        (computation.SparseComputation, ("n", "indices", "gains")),
+        (learning.HebbianLearning, ("increase", "decrease")),
+    ]
+}
+_ATTRIBUTES = {"min_value": "min", "max_value": "max"}
+
+
+def _encode_object(obj) -> dict:
+    """Describe an encoder, computation or learning function in JSON."""
+    kind = type(obj).__name__
+    if kind not in _PARAMETERS or type(obj) is not _PARAMETERS[kind][0]:
+        raise ValueError(f"Cannot save objects of type {kind}")
+    _, parameters = _PARAMETERS[kind]
+    return {
+        "type": kind,
+        "parameters": {
+            name: getattr(obj, _ATTRIBUTES.get(name, name)) for name in parameters
+        },
+    }
+
+
+def _decode_object(description: dict):
+    """Create an encoder, computation or learning function from its description."""
+    if description["type"] not in _PARAMETERS:
+        raise ValueError(f"Cannot load objects of type {description['type']}")
+    cls, _ = _PARAMETERS[description["type"]]
+    return cls(**description["parameters"])
+
+
+def _encode_json(value):
+    """Convert the NumPy scalars JSON does not know about."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot save {value!r} in JSON")
+
+
+def _stacked(inputs: tuple[synapses.Input, ...]) -> np.ndarray | None:
+    """The synapses of the inputs stacked into one block, without stacking them.
+
+    Args:
+        inputs: The inputs of a layer
+
+    Returns:
+        Their synapses, one input after the other, or None if they cannot be
+        stacked, see synapses.InputStack
+    """
+    if len(inputs) < 2 or not all(inp.connected for inp in inputs):
+        return None
+    stack = inputs[0]._stack
+    if stack is not None and stack.matches(inputs):
+        return stack.synapses
+    if not synapses.InputStack.stackable(inputs):
+        return None
+    return np.concatenate([inp.synapses for inp in inputs])
+
+
+class _Objects:
+    """The functions of a brain, each stored once however often it is used."""
+
+    def __init__(self):
+        self.objects = []
+        self._indices = {}
+
+    def add(self, obj) -> int | None:
+        """Store an object, giving its index, or None for no object."""
+        if obj is None:
+            return None
+        if id(obj) not in self._indices:
+            self._indices[id(obj)] = len(self.objects)
+            self.objects.append(obj)
+        return self._indices[id(obj)]
+
+
+def _encode_index(index):
+    """Describe the index of an output slice in JSON."""
+    if isinstance(index, tuple):
+        return {"tuple": [_encode_index(i) for i in index]}
+    if isinstance(index, slice):
+        return {"slice": [index.start, index.stop, index.step]}
+    if isinstance(index, (int, np.integer)):
+        return int(index)
+    raise ValueError(f"Cannot save an output sliced by {index!r}")
+
+
+def _decode_index(index):
+    """Restore the index of an output slice from its description."""
+    if isinstance(index, int):
+        return index
+    if "tuple" in index:
+        return tuple(_decode_index(i) for i in index["tuple"])
+    return slice(*index["slice"])
+
+
+def _encode_source(source, sources: dict[int, dict]) -> dict:
+    """Describe what an input is connected to in JSON.
+
+    Args:
+        source: The output, merge, slice or neurons the input reads from
+        sources: The description of each layer and sensor output, by id
+
+    Returns:
+        The description of the source
+    """
+    if isinstance(source, synapses.OutputMerge):
+        return {
+            "merge": [_encode_source(output, sources) for output in source._outputs],
+            "axis": source._axis,
+            "shared": source.shared,
+        }
+    if isinstance(source, synapses.OutputSlice):
+        return {
+            "slice": _encode_source(source._output, sources),
+            "index": _encode_index(source._slice),
+        }
+    output = source if isinstance(source, synapses.Output) else source.output
+    if id(output) not in sources:
+        raise ValueError(f"Cannot save an input connected to {source}")
+    return sources[id(output)]
+
+
+def _decode_source(source: dict, outputs: dict) -> synapses.Output:
+    """Restore what an input is connected to from its description."""
+    if "merge" in source:
+        return synapses.OutputMerge(
+            *(_decode_source(output, outputs) for output in source["merge"]),
+            axis=source["axis"],
+            shared=source["shared"],
+        )
+    if "slice" in source:
+        return _decode_source(source["slice"], outputs)[_decode_index(source["index"])]
+    if "sensor" in source:
+        return outputs["sensor"]
+    return outputs[source["layer"]]
+
+
+def _encode_tree(neurons: neuron.Neurons, leaves: dict[int, int]) -> dict:
+    """Describe how layers are nested in JSON."""
+    if not isinstance(neurons, neuron.LayeredNeurons):
+        return {"leaf": leaves[id(neurons)]}
+    kind = type(neurons).__name__
+    if kind not in _LAYERED:
+        raise ValueError(f"Cannot save layers of type {kind}")
+    return {
+        "type": kind,
+        "layers": [_encode_tree(layer, leaves) for layer in neurons.layers],
+        "pipelined": neurons.pipelined,
+        "workers": neurons.workers,
+        "contiguous": neurons.contiguous,
+    }
+
+
+def _decode_tree(tree: dict, leaves: list[neuron.Neurons]) -> neuron.Neurons:
+    """Restore nested layers from their description."""
+    if "leaf" in tree:
+        return leaves[tree["leaf"]]
+    layers = [_decode_tree(layer, leaves) for layer in tree["layers"]]
+    if tree["type"] == "Scheduler":
+        return scheduler.Scheduler(layers, contiguous=tree["contiguous"])
+    return neuron.LayeredNeurons(
+        layers,
+        pipelined=tree["pipelined"],
+        workers=tree["workers"],
+        contiguous=tree["contiguous"],
+    )
+
+
+def save(brain, path: str) -> None:
+    """Save a brain into a directory, creating it if necessary.
+
+    Args:
+        brain: The brain to save
+        path: The directory of the checkpoint
+    """
+    neurons = brain.neurons
+    leaves = (
+        neurons.leaves() if isinstance(neurons, neuron.LayeredNeurons) else [neurons]
+    )
+    sources = {id(brain.sensor.output): {"sensor": True}}
+    sources.update({id(leaf.output): {"layer": i} for i, leaf in enumerate(leaves)})
+    objects = _Objects()
+    encoder = objects.add(brain.sensor._encoder)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "sensor.npy"), brain.sensor.output.values)
+    value = brain.sensor.value
+    if isinstance(value, np.ndarray):
+        np.save(os.path.join(path, f"{_SENSOR_VALUE}.npy"), value)
+        value = {"file": _SENSOR_VALUE}
+    layers = []
+    for i, leaf in enumerate(leaves):
+        stack = _stacked(tuple(leaf.inputs.values()))
+        offsets = None
+        if stack is not None:
+            np.save(os.path.join(path, f"layer_{i}.stack.npy"), stack)
+            offsets = np.cumsum(
+                [0] + [len(inp.synapses) for inp in leaf.inputs.values()]
+            )
+
+        inputs = []
+        for j, (name, inp) in enumerate(leaf.inputs.items()):
+            if not inp.connected:
+                continue
+            prefix = f"layer_{i}.input_{j}"
+            weights = inp.synapses
+            sparse = isinstance(weights, synapses.SparseSynapses)
+            if stack is not None:
+                prefix = None
+            elif sparse:
+                for array in _SPARSE_ARRAYS:
+                    np.save(
+                        os.path.join(path, f"{prefix}.{array}.npy"),
+                        getattr(weights, array),
+                    )
+            else:
+                np.save(os.path.join(path, f"{prefix}.npy"), weights)
+            inputs.append(
+                {
+                    "name": name,
+                    "source": _encode_source(inp._connected_output, sources),
+                    "file": prefix,
+                    "sparse": list(weights.shape) if sparse else None,
+                    "rows": (
+                        [int(offsets[j]), int(offsets[j + 1])]
+                        if offsets is not None
+                        else None
+                    ),
+                }
+            )
+        np.save(os.path.join(path, f"layer_{i}.npy"), leaf.values)
+        layers.append(
+            {
+                "shape": list(leaf.shape),
+                "dtype": leaf.dtype.name,
+                "density": leaf.density,
+                "computation": objects.add(leaf.computation),
+                "learning": objects.add(leaf.learning),
+                "stack": f"layer_{i}.stack" if stack is not None else None,
+                "inputs": inputs,
+            }
+        )
+
+    topology = {
+        "format": FORMAT,
+        "objects": [_encode_object(obj) for obj in objects.objects],
+        "encoder": encoder,
+        "value": value,
+        "layers": layers,
+        "neurons": _encode_tree(neurons, {id(l): i for i, l in enumerate(leaves)}),
+    }
+    with open(os.path.join(path, _TOPOLOGY), "w") as f:
+        json.dump(topology, f, indent=2, default=_encode_json)
+
+
+def load(path: str, mmap: bool = True) -> tuple[neuron.Neurons, _sensor.Sensor]:
+    """Restore the neurons and sensor of a brain saved into a directory.
+
+    Args:
+        path: The directory of the checkpoint
+        mmap: Optional - whether to map the synapses into memory, only reading
+            them from the files when used. They are mapped copy-on-write, so
+            learning changes them in memory but never in the files.
+
+    Returns:
+        The neurons, with their computation and learning functions, connected
+        to the sensor.
+    """
+    with open(os.path.join(path, _TOPOLOGY)) as f:
+        topology = json.load(f)
+    if topology.get("format") != FORMAT:
+        raise ValueError(f"Unsupported checkpoint format: {topology.get('format')}")
+    objects = [_decode_object(obj) for obj in topology["objects"]]
+
+    def get(index: int | None):
+        return None if index is None else objects[index]
+
+    def read(name: str) -> np.ndarray:
+        return np.load(
+            os.path.join(path, name + ".npy"), mmap_mode="c" if mmap else None
+        )
+
+    sensor = _sensor.Sensor(get(topology["encoder"]))
+    leaves = [
+        neuron.Neurons(
+            tuple(layer["shape"]),
+            computation=get(layer["computation"]),
+            learning=get(layer["learning"]),
+            dtype=layer["dtype"],
+            density=layer["density"],
+        )
+        for layer in topology["layers"]
+    ]
+    outputs = {"sensor": sensor.output}
+    outputs.update({i: leaf.output for i, leaf in enumerate(leaves)})
+
+    stacks = [
+        read(layer["stack"]) if layer.get("stack") else None
+        for layer in topology["layers"]
+    ]
+
+    def connect(leaf: neuron.Neurons, inp: dict, stack: np.ndarray | None) -> None:
+        if stack is not None:
+            weights = stack[slice(*inp["rows"])]
+        elif inp["sparse"] is not None:
+            weights = synapses.SparseSynapses(
+                *(read(f"{inp['file']}.{array}") for array in _SPARSE_ARRAYS),
+                inp["sparse"],
+            )
+        else:
+            weights = read(inp["file"])
+        leaf.set(
+            inp["name"],
+            _decode_source(inp["source"], outputs),
+            lambda output_shape, input_shape: weights,
+        )
+
+    # Inputs from the sensor are connected last, as layers are expected to be
+    # nested before their input is, while scheduling needs every other input.
+    sensed = []
+    for leaf, layer, stack in zip(leaves, topology["layers"], stacks):
+        for inp in layer["inputs"]:
+            if "sensor" in inp["source"]:
+                sensed.append((leaf, inp, stack))
+            else:
+                connect(leaf, inp, stack)
+    neurons = _decode_tree(topology["neurons"], leaves)
+    for leaf, inp, stack in sensed:
+        connect(leaf, inp, stack)
+
+    for leaf, layer, stack in zip(leaves, topology["layers"], stacks):
+        # Restore the order of the inputs, which that of a stack follows.
+        names = [inp["name"] for inp in layer["inputs"]]
+        inputs = {name: leaf.inputs[name] for name in names}
+        inputs.update(leaf.inputs)
+        leaf.inputs.clear()
+        leaf.inputs.update(inputs)
+        if stack is not None:
+            synapses.InputStack(leaf.inputs.values(), stack)
+
+    value = topology["value"]
+    if isinstance(value, dict):
+        value = np.load(os.path.join(path, value["file"] + ".npy"))
+    sensor._value = value
+    sensor.output.values = np.load(os.path.join(path, "sensor.npy"))
+    for i, leaf in enumerate(leaves):
+        leaf.output.values = np.load(os.path.join(path, f"layer_{i}.npy"))
+
+    return neurons, sensor
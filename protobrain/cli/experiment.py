@@ -4,60 +4,300 @@ Entry point for running experiments through the protobuf interface.
 Creates the setup defined by the experiment protobuf instance that is received
 and then proceeds to run the experiment by feeding the inputs to the sensor.
 
+The inputs are either those of the experiment, or a separate stream of
+SensorValue protobufs written with a ProtoWriter, which is read one value at a
+time, so that experiments of any length run in constant memory. The stream is
+read from stdin when its path is "-", in which case every snapshot is written
+as soon as it is taken.
+
 Outputs snapshots on every iteration and saves them to the provided file.
 
+Several experiments can be run at once, given as pairs of paths or listed in
+a manifest, see read_manifest. They are run on a pool of worker processes,
+which are started once and reused, so that each experiment does not pay for
+starting Python and importing the project. An experiment that fails does not
+stop the others, and a summary of failures and throughput is printed at the
+end.
+
 *******************************************
-usage: experiment.py [-h] experiment output
+usage: experiment.py [-h] [--manifest MANIFEST] [--jobs JOBS] [--input INPUT]
+                     [paths ...]
 
 positional arguments:
-  experiment  Path to a binary protobuf file with the experiment
-  output      Path to a binary file for the output
+  paths                Pairs of paths to a binary protobuf file with an
+                       experiment and to a binary file for its output
 
 optional arguments:
-  -h, --help  show this help message and exit
+  -h, --help           show this help message and exit
+  --manifest MANIFEST  Path to a file listing experiment and output paths, one
+                       pair per line
+  --jobs JOBS          Number of worker processes to run the experiments on
+  --input INPUT        Path to a stream of SensorValue protobufs to use as the
+                       inputs of a single experiment, or - for stdin
 """
 
 import argparse
+import concurrent.futures
+import logging
+import sys
+import time
+from collections.abc import Iterable, Iterator
 
 from protobrain import brain
 from protobrain import computation
 from protobrain import learning
 from protobrain import sensor
+from protobrain.proto import encoder_pb2
 from protobrain.proto import experiment_pb2
 from protobrain.util import proto_io
 from protobrain.util import proto_parse
 
+STDIN = "-"
+
+log = logging.getLogger(__name__)
+
+
+def read_inputs(path: str) -> Iterator:
+    """Read the values of a stream of SensorValue protobufs, one at a time.
+
+    Args:
+        path: The path of the stream, or STDIN
+
+    Returns:
+        The values, read as they are needed
+    """
+    if path == STDIN:
+        yield from proto_parse.decode_input(
+            proto_io.ProtoReader(sys.stdin.buffer, encoder_pb2.SensorValue)
+        )
+        return
+    with open(path, "rb") as input_file:
+        yield from proto_parse.decode_input(
+            proto_io.ProtoReader(input_file, encoder_pb2.SensorValue)
+        )
+
+
+def run(
+    exp: experiment_pb2.Experiment,
+    output_path: str,
+    inputs: Iterable | None = None,
+    buffer_size: int = 1 << 20,
+) -> int:
+    """Run an experiment, writing a snapshot of the brain after every step.
+
+    Args:
+        exp: The experiment to run
+        output_path: The file to write the snapshots to, along with its index
+        inputs: Optional - the values to feed, instead of the experiment's
+        buffer_size: Optional - the number of bytes of snapshots to gather
+            before writing them, see proto_io.ProtoWriter
+
+    Returns:
+        The number of steps run.
+    """
+    if inputs is None:
+        inputs = proto_parse.decode_input(exp.input)
+
+    senz = sensor.Sensor(proto_parse.decode_encoder(exp.encoder))
+    brain_ = brain.Brain(
+        sensor=senz,
+        neurons=proto_parse.decode_neurons(exp.cortex),
+        computation=computation.SparseComputation(5),
+        learning=learning.HebbianLearning(),
+    )
+
+    steps = 0
+    with (
+        open(output_path, "wb") as output_file,
+        open(proto_io.index_path(output_path), "wb") as index_file,
+        proto_io.ProtoWriter(output_file, index_file, buffer_size) as writer,
+    ):
+        for value in inputs:
+            senz.feed(value)
+            brain_.compute()
+            brain_.learn()
+            writer.write(proto_parse.encode_brain(brain_))
+            steps += 1
+            if not buffer_size:
+                output_file.flush()
+                index_file.flush()
+    return steps
+
+
+def run_file(
+    experiment_path: str, output_path: str, input_path: str | None = None
+) -> int:
+    """Run the experiment saved in a file, see run.
+
+    Args:
+        experiment_path: The file with the experiment protobuf
+        output_path: The file to write the snapshots to
+        input_path: Optional - a stream of inputs to use, see read_inputs
+
+    Returns:
+        The number of steps run.
+    """
+    exp = experiment_pb2.Experiment()
+    with open(experiment_path, "rb") as experiment_file:
+        exp.ParseFromString(experiment_file.read())
+
+    if input_path is None:
+        return run(exp, output_path)
+    return run(
+        exp,
+        output_path,
+        read_inputs(input_path),
+        buffer_size=0 if input_path == STDIN else 1 << 20,
+    )
+
+
+def _run_isolated(experiment_path: str, output_path: str) -> tuple[int, str | None]:
+    """Run the experiment saved in a file, catching and logging any error.
+
+    Returns:
+        The number of steps run, and the error if the experiment failed.
+    """
+    try:
+        return run_file(experiment_path, output_path), None
+    except Exception as e:
+        log.exception("Experiment %s failed", experiment_path)
+        return 0, f"{type(e).__name__}: {e}"
+
+
+def read_manifest(path: str) -> list[tuple[str, str]]:
+    """Read the experiments listed in a manifest.
+
+    Every line of the manifest holds the path of an experiment and the path of
+    its output, separated by whitespace. Empty lines and lines starting with #
+    are skipped.
+
+    Args:
+        path: The path of the manifest
+
+    Returns:
+        The (experiment, output) pairs, in order
+    """
+    pairs = []
+    with open(path) as manifest:
+        for number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            paths = line.split()
+            if len(paths) != 2:
+                raise ValueError(f"{path}:{number}: expected experiment and output")
+            pairs.append(tuple(paths))
+    return pairs
+
+
+def run_many(
+    pairs: list[tuple[str, str]], jobs: int = 1
+) -> list[tuple[int, str | None]]:
+    """Run several experiments, each one in the first free worker process.
+
+    The workers are started once and reused for every experiment they run.
+    An experiment that fails only loses its own output.
+
+    Args:
+        pairs: The (experiment, output) paths of every experiment
+        jobs: Optional - the number of worker processes, or 1 to run the
+            experiments one after another in this process
+
+    Returns:
+        The number of steps run and the error, if any, of every experiment.
+        The traceback of every error is logged.
+    """
+    if jobs == 1:
+        return [_run_isolated(*pair) for pair in pairs]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_run_isolated, *pair) for pair in pairs]
+        results = []
+        for (experiment_path, _), future in zip(pairs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker itself died, e.g. killed for running out of memory.
+                log.exception("Worker running experiment %s failed", experiment_path)
+                results.append((0, f"{type(e).__name__}: {e}"))
+        return results
+
+
+def summarize(
+    pairs: list[tuple[str, str]],
+    results: list[tuple[int, str | None]],
+    seconds: float,
+) -> str:
+    """Describe the failures and the throughput of a run of experiments."""
+    lines = [
+        f"{experiment_path}: {error}"
+        for (experiment_path, _), (_, error) in zip(pairs, results)
+        if error
+    ]
+    failed = len(lines)
+    steps = sum(steps for steps, _ in results)
+    seconds = max(seconds, 1e-9)
+    lines.append(
+        f"Ran {len(pairs)} experiments ({failed} failed), {steps} steps "
+        f"in {seconds:.2f}s: {len(pairs) / seconds:.2f} experiments/s, "
+        f"{steps / seconds:.1f} steps/s"
+    )
+    return "\n".join(lines)
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "experiment",
-        help="Path to a binary protobuf file with the experiment",
+        "paths",
+        help="Pairs of paths to a binary protobuf file with an experiment "
+        "and to a binary file for its output",
+        nargs="*",
+        type=str,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Path to a file listing experiment and output paths, one pair per line",
+        type=str,
+    )
+    parser.add_argument(
+        "--jobs",
+        help="Number of worker processes to run the experiments on",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--input",
+        help="Path to a stream of SensorValue protobufs to use as the inputs "
+        f"of a single experiment, or {STDIN} for stdin",
         type=str,
     )
-    parser.add_argument("output", help="Path to a binary file for the output", type=str)
 
     args = parser.parse_args()
-    experiment_path = args.experiment
-    output_path = args.output
-
-    exp = experiment_pb2.Experiment()
-    with open(experiment_path, "rb") as input_file:
-        exp.ParseFromString(input_file.read())
+    if len(args.paths) % 2:
+        parser.error("expected pairs of experiment and output paths")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    pairs = list(zip(args.paths[::2], args.paths[1::2]))
+    if args.manifest:
+        pairs += read_manifest(args.manifest)
+    if not pairs:
+        parser.error("no experiments to run")
 
-    _computation = computation.SparseComputation(5)
-    _learning = learning.HebbianLearning()
+    if args.input is not None:
+        if len(pairs) != 1:
+            parser.error("--input needs a single experiment")
+        run_file(*pairs[0], args.input)
+        return
 
-    senz = sensor.Sensor(proto_parse.decode_encoder(exp.encoder))
-    brian = brain.Brain(sensor=senz, neurons=proto_parse.decode_neurons(exp.cortex))
-
-    with open(output_path, "wb") as output_file:
-        writer = proto_io.ProtoWriter(output_file)
-        for value in proto_parse.decode_input(exp.input):
-            senz.feed(value)
-            brian.compute(_computation)
-            brian.learn(_learning)
-            writer.write(proto_parse.encode_brain(brian))
+    start = time.perf_counter()
+    results = run_many(pairs, args.jobs)
+    if len(pairs) > 1:
+        print(summarize(pairs, results, time.perf_counter() - start), file=sys.stderr)
+    errors = [error for _, error in results if error]
+    if len(pairs) == 1 and errors:
+        print(errors[0], file=sys.stderr)
+    if errors:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""Module for running a brain from a flat execution plan."""
+
+import weakref
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, Self
+
+import numpy as np
+
+from protobrain import computation as _computation
+from protobrain import neuron
+from protobrain import scheduler
+from protobrain import synapses
+
+if TYPE_CHECKING:
+    from protobrain import brain as _brain
+
+
+def _bound_output(source) -> synapses.Output | None:
+    """The output an input reads from, if its values keep the same array."""
+    output = source if isinstance(source, synapses.Output) else source.output
+    if type(output) is synapses.Output and output._bound:
+        return output
+    return None
+
+
+def _bind(output: synapses.Output) -> np.ndarray | None:
+    """Make the output keep its values in an array of its own.
+
+    Returns:
+        The array, or None if the output was already bound or cannot be
+    """
+    if type(output) is synapses.Output and not output._bound:
+        output.bind(np.zeros(output.shape))
+        return output.values
+    return None
+
+
+def _unbind(bound: list[tuple[synapses.Output, np.ndarray]]) -> None:
+    """Unbind the outputs that are still bound to the given arrays."""
+    for output, buffer in bound:
+        if output._bound and output.values is buffer:
+            output.unbind()
+
+
+class CompiledBrain:
+    """A brain frozen into a flat list of steps, run with little overhead.
+
+    Compiling binds the output of every layer and of the sensor to an array
+    of its own, so that each step can read inputs from and write outputs into
+    the same arrays every time. The most common layers, with a single input of
+    dense synapses and one of the available computations, then take a single
+    product and activation per step without going through the neurons.
+
+    The outputs stay bound until the compiled brain is closed, with close or
+    at the end of a with statement, or garbage collected. Until then nothing
+    else can bind them, e.g. to merge them with shared storage, and they do
+    not alternate between buffers when the brain itself computes.
+
+    Every step gives the same results as computing and learning through the
+    brain itself. Changes to the connections or to the computation and
+    learning functions made after compiling are not seen by the plan.
+    """
+
+    def __init__(self, brain: "_brain.Brain"):
+        """Compile the brain.
+
+        Args:
+            brain: The brain to compile
+        """
+        neurons = brain.neurons
+        if isinstance(neurons, neuron.LayeredNeurons) and neurons.pipelined:
+            raise ValueError("Cannot compile pipelined layers")
+
+        if isinstance(neurons, scheduler.Scheduler):
+            layers = neurons.order
+        elif isinstance(neurons, neuron.LayeredNeurons):
+            layers = neurons.leaves()
+        else:
+            layers = [neurons]
+
+        for layer in layers:
+            if not layer.computation:
+                raise ValueError(f"Computation function not set for {layer}!")
+
+        bound = [
+            (output, buffer)
+            for output in (brain.sensor.output, *(layer.output for layer in layers))
+            if (buffer := _bind(output)) is not None
+        ]
+        self._unbind = weakref.finalize(self, _unbind, bound)
+
+        self.brain = brain
+        self.layers = layers
+        self._steps = [self._plan(layer) for layer in layers]
+        self._learning = [(layer, layer.learning) for layer in layers]
+
+    def __enter__(self) -> Self:
+        """Use the compiled brain in a with statement, which closes it at the end."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the compiled brain."""
+        self.close()
+
+    def close(self) -> None:
+        """Unbind the outputs bound by compiling, after which it cannot run."""
+        self._unbind()
+
+    def _plan(self, layer: neuron.Neurons) -> Callable[[], None]:
+        """Create the function that computes a layer in place.
+
+        The activations of a layer are computed before its output is written,
+        so the output can go straight into the array that holds the values of
+        the previous step.
+
+        Args:
+            layer: The layer to compute
+
+        Returns:
+            A function computing the layer on every call
+        """
+        computation = layer.computation
+        output = layer.output
+        values = output.values
+        activations = layer._activations
+        inputs = layer.inputs
+
+        if (
+            type(computation)
+            in (_computation.StandardComputation, _computation.SparseComputation)
+            and not getattr(computation, "indices", False)
+            and len(inputs) == 1
+        ):
+            ((name, inp),) = inputs.items()
+            source = _bound_output(inp._connected_output)
+            weights = inp.synapses
+            if (
+                source is not None
+                and isinstance(weights, np.ndarray)
+                and weights.dtype.itemsize >= 4
+                and source.values.ndim == 1
+                and _computation._buffer(
+                    activations, source.values, weights, weights.dtype
+                )
+                is not None
+            ):
+                source_values = source.values
+                gain = computation.gains.get(name, 1)
+                fire = computation._fire
+
+                def step():
+                    np.dot(
+                        source_values.astype(weights.dtype, copy=False),
+                        inp.synapses,
+                        out=activations,
+                    )
+                    fire(_computation._scale(activations, gain), values)
+                    output.version += 1
+
+                return step
+
+        if not getattr(computation, "buffered", False):
+
+            def step():
+                np.copyto(values, computation(**inputs))
+                output.version += 1
+
+            return step
+
+        def step():
+            computation(out=values, activations=activations, **inputs)
+            output.version += 1
+
+        return step
+
+    def run(
+        self, inputs: Sequence, learn: bool = True, metrics: Sequence = ()
+    ) -> np.ndarray:
+        """Feed a sequence of values to the brain, one step at a time.
+
+        Args:
+            inputs: The sensor values, in order
+            learn: Optional - whether to learn after every step
+            metrics: Optional - metrics to record the state of the neurons
+                after every step, along with the recorders attached to the brain
+
+        Returns:
+            A matrix with the output of the neurons for each value in its rows.
+        """
+        if not self._unbind.alive:
+            raise ValueError("Cannot run a closed compiled brain")
+        if learn:
+            for layer, learning in self._learning:
+                if not learning:
+                    raise ValueError(f"Learning function not set for {layer}!")
+
+        neurons = self.brain.neurons
+        feed = self.brain.sensor.feed
+        steps = self._steps
+        learning = self._learning if learn else ()
+        metrics = (*self.brain.recorders, *metrics)
+        outputs = np.empty((len(inputs),) + neurons.shape)
+        for i, value in enumerate(inputs):
+            feed(value)
+            for step in steps:
+                step()
+            for layer, function in learning:
+                function(layer)
+            for metric in metrics:
+                metric.next(neurons)
+            outputs[i] = neurons.values
+        return outputs
@@ -1,22 +1,193 @@
 """A module for defining different kinds of neuronal computations."""
 
 import abc
-from typing import TYPE_CHECKING
 
 import numpy as np
 
-if TYPE_CHECKING:
-    from protobrain import synapses
+from protobrain import synapses
+
+# Number of narrow weights widened at a time when adding them up.
+_CHUNK_SIZE = 1 << 20
+
+
+def _dot(
+    values: np.ndarray, main: "synapses.Input", out: np.ndarray | None = None
+) -> np.ndarray:
+    """Add up the weights of the synapses, weighted by the input values.
+
+    Narrow synapses only add up the rows of the active inputs, see _widened.
+    Sparse synapses only visit the synapses of the active inputs.
+
+    Args:
+        values: The values of the input
+        main: The input holding the synapses
+        out: Optional - a preallocated array to write the activations into,
+            only used if it has the shape and type of the result
+
+    Returns:
+        The activation of each neuron
+    """
+    weights = main.synapses
+    if isinstance(weights, synapses.SparseSynapses):
+        return _rescale(weights.dot(values).reshape(main.shape), main)
+    if weights.dtype.itemsize < 4:
+        active = np.flatnonzero(values)
+        activations = _widened(
+            values[active],
+            weights,
+            active,
+            out=_buffer(out, values, weights, np.float32),
+        )
+        return _rescale(activations, main)
+    return np.dot(
+        values.astype(weights.dtype, copy=False),
+        weights,
+        out=_buffer(out, values, weights, weights.dtype),
+    )
+
+
+def _buffer(
+    out: np.ndarray | None, values: np.ndarray, weights: np.ndarray, dtype
+) -> np.ndarray | None:
+    """The preallocated array for the product of values and weights, if it fits."""
+    if out is None or values.ndim != 1 or weights.ndim != 2:
+        return None
+    if out.shape != weights.shape[1:] or out.dtype != dtype:
+        return None
+    return out if out.flags.c_contiguous else None
+
+
+def _matmul(values: np.ndarray, main: "synapses.Input") -> np.ndarray:
+    """Batched version of _dot, with the input values of a step in each row."""
+    weights = main.synapses
+    if isinstance(weights, synapses.SparseSynapses):
+        activations = weights.matmul(values).reshape((len(values),) + main.shape)
+        return _rescale(activations, main)
+    if weights.dtype.itemsize < 4:
+        return _rescale(_widened(values, weights), main)
+    return np.matmul(values.astype(weights.dtype, copy=False), weights)
+
+
+def _widened(
+    values: np.ndarray,
+    weights: np.ndarray,
+    rows: np.ndarray | None = None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Add up rows of narrow weights in float32, weighted by the values.
+
+    Narrow synapses would overflow or lose precision if accumulated in their
+    own type, so they are widened to float32, but only a chunk of rows at a
+    time, so that the widened copy stays small however large the synapses.
+
+    Args:
+        values: The values of the rows, along the last axis
+        weights: The narrow synapses
+        rows: Optional - the indices of the rows to add up, all by default
+        out: Optional - a preallocated float32 array to write the result into
+
+    Returns:
+        The weighted sum of the rows
+    """
+    product = np.dot if values.ndim == 1 else np.matmul
+    count = len(weights) if rows is None else len(rows)
+    step = max(1, _CHUNK_SIZE // max(1, int(np.prod(weights.shape[1:]))))
+
+    def block(start: int) -> np.ndarray:
+        stop = start + step
+        chunk = weights[start:stop] if rows is None else weights[rows[start:stop]]
+        return chunk.astype(np.float32)
+
+    if count <= step:
+        return product(values.astype(np.float32), block(0), out=out)
+
+    if out is None:
+        out = np.zeros(values.shape[:-1] + weights.shape[1:], dtype=np.float32)
+    else:
+        out.fill(0)
+    for start in range(0, count, step):
+        out += product(
+            values[..., start : start + step].astype(np.float32), block(start)
+        )
+    return out
+
+
+def _rescale(activations: np.ndarray, main: "synapses.Input") -> np.ndarray:
+    """Convert activations in units of fixed-point synapses into weights."""
+    if main.resolution != 1:
+        activations *= main.resolution
+    return activations
+
+
+def _activate(
+    inputs: dict[str, "synapses.Input"],
+    gains: dict[str, float],
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Add up the weighted synapses of all the inputs, scaled by their gains.
+
+    Several inputs are stacked so that they take a single product of their
+    stacked values and synapses. Inputs that cannot be stacked are added up
+    one at a time.
+
+    Args:
+        inputs: The inputs by name
+        gains: The gain of each input by name, 1 if missing
+        out: Optional - a preallocated array to write the activations into,
+            see _dot
+
+    Returns:
+        The activation of each neuron
+    """
+    if len(inputs) == 1:
+        ((name, main),) = inputs.items()
+        return _scale(_dot(main.values, main, out), gains.get(name, 1))
+
+    stack = synapses.InputStack.of(inputs.values())
+    if stack is not None:
+        return _dot(stack.values([gains.get(name, 1) for name in inputs]), stack, out)
+
+    return sum(
+        _scale(_dot(inp.values, inp), gains.get(name, 1))
+        for name, inp in inputs.items()
+    )
+
+
+def _scale(activations: np.ndarray, gain: float) -> np.ndarray:
+    """Scale the activations by a gain, in place."""
+    if gain != 1:
+        activations *= gain
+    return activations
 
 
 class Computation(abc.ABC):
-    """Base class for all other computations to inherit from."""
+    """Base class for all other computations to inherit from.
+
+    Computations are given the inputs by name. Those that set buffered are
+    also given two optional preallocated arrays: out for the output values and
+    activations for the intermediate activations. Neurons pass arrays of their
+    own on every step, so that these need not be allocated on every step.
+    """
+
+    buffered = False
 
     @abc.abstractmethod
     def __call__(self):
         """Compute the neurons' output."""
         raise NotImplementedError()
 
+    def batch(self, values: np.ndarray, main: "synapses.Input") -> np.ndarray:
+        """Compute the neurons' output for a batch of main input values.
+
+        Args:
+            values: A (T, inputs) matrix with the main input values of each step
+            main: The main input, whose synapses are used for every step
+
+        Returns:
+            A (T, neurons) matrix with the output of each step
+        """
+        raise NotImplementedError(f"{self} does not support batched computation")
+
     def __repr__(self):
         """The name of this computation."""
         return self.__class__.__name__
@@ -25,64 +196,201 @@ class Computation(abc.ABC):
 class StandardComputation(Computation):
     """The standard computation is a thresholded dot product."""
 
-    def __init__(self, threshold: float):
+    buffered = True
+
+    def __init__(self, threshold: float, gains: dict[str, float] | None = None):
         """Initialize the computation.
 
         Args:
             threshold: The cut-off threshold for the binary output
+            gains: Optional - a factor for the activations of each input by
+                name, 1 for any input that is missing
         """
         self.threshold = threshold
+        self.gains = gains or {}
 
-    def __call__(self, main: "synapses.Input") -> np.ndarray:
+    def __call__(
+        self,
+        main: "synapses.Input | None" = None,
+        out: np.ndarray | None = None,
+        activations: np.ndarray | None = None,
+        **inputs: "synapses.Input",
+    ) -> np.ndarray:
         """Compute the neurons' output.
 
-        For each neuron, adds up the weight of the active synapses,
-        then applies a threshold to get the activations.
+        For each neuron, adds up the weight of the active synapses of every
+        input scaled by the input's gain, then applies a threshold to get the
+        activations.
 
         Args:
             main: The main input
+            out: Optional - a preallocated array to write the binary values
+              into, to avoid allocating a new one on every step
+            activations: Optional - a preallocated array to add up the weights
+              into, used when it matches their shape and type
+            inputs: Any other inputs by name
 
         Returns:
             Binary values from the computation
         """
-        activations = np.dot(main.values, main.synapses)
-        return activations > self.threshold
+        if main is not None:
+            inputs = {synapses.MAIN_INPUT: main, **inputs}
+        return self._fire(_activate(inputs, self.gains, activations), out)
+
+    def batch(self, values: np.ndarray, main: "synapses.Input") -> np.ndarray:
+        """Compute the neurons' output for a batch of main input values.
+
+        Args:
+            values: A (T, inputs) matrix with the main input values of each step
+            main: The main input, whose synapses are used for every step
+
+        Returns:
+            A (T, neurons) matrix with the binary output of each step
+        """
+        gain = self.gains.get(synapses.MAIN_INPUT, 1)
+        return self._fire(_scale(_matmul(values, main), gain))
+
+    def _fire(
+        self, activations: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Apply the threshold along the last axis of the activations."""
+        return np.greater(activations, self.threshold, out=out)
 
 
 class SparseComputation(Computation):
-    """A computation with a limited number of active units."""
+    """A computation with a limited number of active units.
+
+    The top n units are found with a linear time partition instead of a full
+    sort. Units tied with the n-th highest activation are picked in order of
+    their index, so the result is deterministic.
+    """
 
-    def __init__(self, n: int | float):
+    buffered = True
+
+    def __init__(
+        self,
+        n: int | float,
+        indices: bool = False,
+        gains: dict[str, float] | None = None,
+    ):
         """Initialize the computation.
 
         Args:
             n: The number of neurons to activate in each timestep. If fractional,
               will activate this fraction of neurons.
+            indices: Whether to output the indices of the active neurons, in
+              increasing order, instead of their binary values. Indices do not
+              fit the output of the neurons, so such a computation can only be
+              called directly, not given to Neurons.
+            gains: Optional - a factor for the activations of each input by
+              name, 1 for any input that is missing
         """
         self.n = n
+        self.indices = indices
+        self.gains = gains or {}
 
-    def __call__(self, main: "synapses.Input"):
+    def __call__(
+        self,
+        main: "synapses.Input | None" = None,
+        out: np.ndarray | None = None,
+        activations: np.ndarray | None = None,
+        **inputs: "synapses.Input",
+    ):
         """Compute the neurons' output.
 
-        For each neuron, adds up the weight of the active synapses,
-        then sets the top n to be active.
+        For each neuron, adds up the weight of the active synapses of every
+        input scaled by the input's gain, then sets the top n to be active.
 
         Args:
             main: The main input
+            out: Optional - a preallocated array to write the binary values
+              into, which cannot be given when outputting indices
+            activations: Optional - a preallocated array to add up the weights
+              into, used when it matches their shape and type
+            inputs: Any other inputs by name
 
         Returns:
-            Binary values from the computation
+            Binary values from the computation, or the indices of the active
+            neurons if configured to output indices
         """
-        activations = np.dot(main.values, main.synapses)
+        if self.indices and out is not None:
+            raise ValueError(
+                f"{self} outputs indices, which cannot be written into the "
+                "output of neurons"
+            )
+        if main is not None:
+            inputs = {synapses.MAIN_INPUT: main, **inputs}
+        return self._fire(_activate(inputs, self.gains, activations), out)
 
-        n = (
-            int(np.ceil(self.n * len(activations)))
-            if isinstance(self.n, float)
-            else self.n
-        )
+    def batch(self, values: np.ndarray, main: "synapses.Input") -> np.ndarray:
+        """Compute the neurons' output for a batch of main input values.
+
+        Args:
+            values: A (T, inputs) matrix with the main input values of each step
+            main: The main input, whose synapses are used for every step
+
+        Returns:
+            A (T, neurons) matrix with the binary output of each step, or a
+            (T, n) matrix with the active indices if configured to output indices
+        """
+        gain = self.gains.get(synapses.MAIN_INPUT, 1)
+        return self._fire(_scale(_matmul(values, main), gain))
+
+    def _fire(
+        self, activations: np.ndarray, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Activate the top n units along the last axis of the activations."""
+        winners = self._select(activations)
+        if self.indices:
+            n = self._count(activations.shape[-1])
+            return np.nonzero(winners)[-1].reshape(winners.shape[:-1] + (n,))
+        if out is None:
+            return winners.astype(np.float64)
+        np.copyto(out, winners)
+        return out
+
+    def _count(self, size: int) -> int:
+        """The number of units to activate out of the given size."""
+        n = int(np.ceil(self.n * size)) if isinstance(self.n, float) else self.n
+        return min(n, size)
+
+    def _select(self, activations: np.ndarray) -> np.ndarray:
+        """Find the top n units along the last axis of the activations.
+
+        The masks are allocated on every call rather than kept, as the same
+        computation can be shared by layers computed in parallel.
+
+        Args:
+            activations: The activations of the units
+
+        Returns:
+            A boolean mask of the winning units
+        """
+        size = activations.shape[-1]
+        n = self._count(size)
+        if n == 0:
+            return np.zeros(activations.shape, dtype=bool)
+
+        kth = size - n
+        if activations.ndim == 1:
+            # A single step needs none of the indexing along the last axis.
+            threshold = activations[np.argpartition(activations, kth)[kth]]
+            winners = activations > threshold
+            ties = activations == threshold
+            missing = n - np.count_nonzero(winners)
+            if np.count_nonzero(ties) != missing:
+                ties &= np.cumsum(ties) <= missing
+            winners |= ties
+            return winners
 
-        top_indices = activations.argsort()[-n:]
+        partition = np.argpartition(activations, kth, axis=-1)[..., kth : kth + 1]
+        threshold = np.take_along_axis(activations, partition, axis=-1)
 
-        result = np.zeros(len(activations))
-        result[top_indices] = 1
-        return result
+        winners = activations > threshold
+        ties = activations == threshold
+        missing = n - winners.sum(axis=-1, keepdims=True)
+        if np.all(ties.sum(axis=-1, keepdims=True) == missing):
+            winners |= ties
+        else:
+            winners |= ties & (np.cumsum(ties, axis=-1) <= missing)
+        return winners
@@ -1,16 +1,57 @@
-"""Module for image representations."""
+"""Module for image representations.
 
-import itertools
+Images are averaged over boxes with either torch, which is only imported when
+used, or NumPy alone.
+"""
+
+import importlib.util
 import logging
+from typing import TYPE_CHECKING
 
 import numpy as np
-import torch
 
 from protobrain import sensor
 
+if TYPE_CHECKING:
+    import torch
+
 
 logger = logging.getLogger(__name__)
 
+TORCH = "torch"
+NUMPY = "numpy"
+
+
+def _convolve(
+    images: "torch.Tensor", weight: "torch.Tensor", stride: int | list[int]
+) -> "torch.Tensor":
+    """Convolve every image of a stack with the same filter, all at once.
+
+    The images are taken as the channels of a single image, convolved one by
+    one as separate groups, which is much faster than a batch of images with
+    a single channel each, and gives the same results as convolving every
+    image on its own.
+
+    Args:
+        images: The (N, height, width) images
+        weight: The (1, 1, height, width) filter
+        stride: The stride of the convolution
+
+    Returns:
+        The (N, height, width) convolved images
+    """
+    import torch
+
+    count = len(images)
+    results = torch.nn.functional.conv2d(
+        images.reshape(1, count, *images.shape[1:]),
+        weight=weight.expand(count, 1, -1, -1),
+        stride=stride,
+        padding=0,
+        groups=count,
+    )
+    return results.reshape(count, *results.shape[2:])
+
 
 class ImageEncoder(sensor.Encoder[np.ndarray]):
     """Base encoder for image types."""
@@ -40,7 +81,26 @@ class BlackWhiteEncoder(ImageEncoder):
         min_spatial_resolution: int | None = None,
         brightness_buckets: int = 2,
         normalize: bool = True,
+        backend: str | None = None,
     ):
+        """Initialize the encoder.
+
+        Args:
+            height: The height of the input images
+            width: The width of the input images
+            min_spatial_resolution: Optional - the smallest size of the boxes
+                that the images are averaged over
+            brightness_buckets: Optional - the number of ranges of brightness
+                that each average is encoded into
+            normalize: Optional - whether to scale every image by its maximum
+            backend: Optional - either TORCH or NUMPY, to compute the averages
+                with. TORCH by default, or NUMPY if torch is not installed
+        """
+        if backend is None:
+            backend = TORCH if importlib.util.find_spec("torch") else NUMPY
+        if backend not in (TORCH, NUMPY):
+            raise ValueError(f"Unsupported backend: {backend}")
+
         min_spatial_resolution = (
             max(1, min(width, height) // 16)
             if min_spatial_resolution is None
@@ -68,12 +128,15 @@ class BlackWhiteEncoder(ImageEncoder):
         self.brightness_buckets = brightness_buckets
         self.brightness_thresholds = np.arange(0, 1, 1.0 / brightness_buckets)
         self.noise_value = 0.5 / brightness_buckets
-        self.filter = torch.ones(
-            1, 1, minimum_height_resolution, minimum_width_resolution
-        ) * (1 / (minimum_height_resolution * minimum_width_resolution))
-        self.pool_filter = torch.ones(1, 1, 2, 2) * 0.25
+        self.filter = np.full(
+            (1, 1, minimum_height_resolution, minimum_width_resolution),
+            1 / (minimum_height_resolution * minimum_width_resolution),
+            dtype=np.float32,
+        )
+        self.pool_filter = np.full((1, 1, 2, 2), 0.25, dtype=np.float32)
         self.repeats = min_fits - 1
         self.normalize = normalize
+        self.backend = backend
 
     def encode(self, value: np.ndarray):
         """Encode the value to a binary representation.
@@ -87,41 +150,127 @@ class BlackWhiteEncoder(ImageEncoder):
         assert value.shape == (self.height, self.width), (
             f"Expected input of size {self.height} x {self.width}"
         )
-        if self.normalize:
-            value = value / max(1e-6, value.max())
-        elif value.dtype == np.uint8:
-            value = np.float32(value) / 255
-        input_tensor = torch.reshape(
-            torch.Tensor(value), shape=(1, 1, self.height, self.width)
+        return self.encode_many(value[np.newaxis])[0]
+
+    def encode_many(self, values: np.ndarray) -> np.ndarray:
+        """Encode a stack of images at once.
+
+        Every level of the pyramid is computed for all the images with a single
+        convolution, and all the brightness buckets are thresholded together.
+
+        Args:
+            values: The images to encode, as an (N, height, width) array
+
+        Returns:
+            An (N, length) matrix with the encoding of each image in its rows.
+        """
+        values = np.asarray(values)
+        assert values.shape[1:] == (self.height, self.width), (
+            f"Expected input of size N x {self.height} x {self.width}"
         )
+        if self.normalize:
+            maxima = values.max(axis=(1, 2), keepdims=True, initial=0)
+            values = values / np.maximum(1e-6, maxima)
+        elif values.dtype == np.uint8:
+            values = np.float32(values) / 255
+        return self._bucket(self._pyramid(values))
+
+    def _pyramid(self, values: np.ndarray) -> np.ndarray:
+        """Average the images over every level of the pyramid, with noise.
+
+        The first level averages boxes the size of the filter, overlapping by
+        half, and every other level averages 2x2 boxes of the previous one.
+
+        Args:
+            values: The (N, height, width) images, scaled between 0 and 1
+
+        Returns:
+            An (N, levels) matrix with the averages of all the levels of each
+            image, one level after another.
+        """
+        if self.backend == NUMPY:
+            return self._pyramid_numpy(values)
+        return self._pyramid_torch(values)
+
+    def _stride(self) -> tuple[int, int]:
+        """The stride of the boxes of the first level."""
         _, _, filter_height, filter_width = self.filter.shape
-        stride = [max(1, filter_height // 2), max(1, filter_width // 2)]
-        base_results = [
-            torch.nn.functional.conv2d(
-                input_tensor,
-                weight=self.filter,
-                stride=stride,
-                padding=0,
-            )
-        ]
-        noise = torch.randn_like(base_results[0]) * self.noise_value
-        base_results[0] = torch.clamp(base_results[0] + noise, min=0, max=1)
-        for _ in range(self.repeats):
-            base_results.append(
-                torch.nn.functional.conv2d(
-                    base_results[-1],
-                    weight=self.pool_filter,
-                    stride=1,
+        return max(1, filter_height // 2), max(1, filter_width // 2)
+
+    def _pyramid_torch(self, values: np.ndarray) -> np.ndarray:
+        """Compute the pyramid with a convolution per level, see _pyramid."""
+        import torch
+
+        with torch.inference_mode():
+            input_tensor = torch.as_tensor(values, dtype=torch.float32)
+            base_results = [
+                _convolve(
+                    input_tensor, torch.from_numpy(self.filter), list(self._stride())
                 )
-            )
-        unthresholded_results = np.concatenate(
-            [r.flatten().numpy() for r in base_results]
+            ]
+            noise = torch.randn_like(base_results[0]) * self.noise_value
+            base_results[0] = torch.clamp(base_results[0] + noise, min=0, max=1)
+            pool_filter = torch.from_numpy(self.pool_filter)
+            for _ in range(self.repeats):
+                base_results.append(_convolve(base_results[-1], pool_filter, 1))
+            return torch.cat(
+                [r.reshape(len(values), -1) for r in base_results], dim=1
+            ).numpy()
+
+    def _pyramid_numpy(self, values: np.ndarray) -> np.ndarray:
+        """Compute the pyramid with NumPy alone, see _pyramid.
+
+        The first level is read off a summed-area table of every image, where
+        the sum of any box takes four lookups, and the other levels add up
+        four shifted views of the previous one.
+        """
+        _, _, filter_height, filter_width = self.filter.shape
+        stride_height, stride_width = self._stride()
+        count, height, width = values.shape
+
+        table = np.zeros((count, height + 1, width + 1))
+        np.cumsum(values, axis=1, out=table[:, 1:, 1:])
+        np.cumsum(table[:, 1:, 1:], axis=2, out=table[:, 1:, 1:])
+        rows = slice(0, height - filter_height + 1, stride_height)
+        columns = slice(0, width - filter_width + 1, stride_width)
+        rows_end = slice(filter_height, height + 1, stride_height)
+        columns_end = slice(filter_width, width + 1, stride_width)
+        sums = (
+            table[:, rows_end, columns_end]
+            - table[:, rows, columns_end]
+            - table[:, rows_end, columns]
+            + table[:, rows, columns]
         )
+        level = (sums / (filter_height * filter_width)).astype(np.float32)
+        noise = np.random.standard_normal(level.shape).astype(np.float32)
+        level = np.clip(level + noise * np.float32(self.noise_value), 0, 1)
+
+        levels = [level.reshape(count, -1)]
+        for _ in range(self.repeats):
+            level = (
+                level[:, :-1, :-1]
+                + level[:, 1:, :-1]
+                + level[:, :-1, 1:]
+                + level[:, 1:, 1:]
+            ) * np.float32(0.25)
+            levels.append(level.reshape(count, -1))
+        return np.concatenate(levels, axis=1)
 
-        thresholded_results = [
-            (unthresholded_results <= high) & (unthresholded_results >= low)
-            for low, high in itertools.pairwise(
-                np.concatenate([self.brightness_thresholds, [1]])
-            )
-        ]
-        return np.concatenate(thresholded_results)
+    def _bucket(self, levels: np.ndarray) -> np.ndarray:
+        """Threshold the averages into every brightness bucket at once.
+
+        Each bucket includes both of its bounds, so averages falling right on
+        the bound between two buckets are in both.
+
+        Args:
+            levels: The (N, levels) averages of the images
+
+        Returns:
+            An (N, length) matrix with the averages in each bucket, one bucket
+            after another.
+        """
+        bounds = np.concatenate([self.brightness_thresholds, [1]])
+        low = bounds[:-1, np.newaxis]
+        high = bounds[1:, np.newaxis]
+        levels = levels[:, np.newaxis, :]
+        return ((levels >= low) & (levels <= high)).reshape(len(levels), -1)
@@ -1,17 +1,33 @@
 """Module for numerical encoders."""
 
+import abc
+import collections
 import math
+from collections.abc import Sequence
 
 import numpy as np
+import numpy.typing as npt
 
 from protobrain import sensor
 
 
 class NumericalEncoder(sensor.Encoder):
-    """Base encoder for numerical types."""
+    """Base encoder for numerical types.
+
+    A value is encoded as a band of activations, starting at a position that
+    depends on the value. As there are only as many different encodings as
+    there are positions, each encoding is computed once and shared by every
+    value it is given for, up to a limit on the memory they take, beyond which
+    the least recently used ones are dropped.
+    """
 
     def __init__(
-        self, min_value: float, max_value: float, length: int, sparsity: float = 0.02
+        self,
+        min_value: float,
+        max_value: float,
+        length: int,
+        sparsity: float = 0.02,
+        cache_size: int = 64 << 20,
     ):
         """Initialize the encoder.
 
@@ -20,75 +36,159 @@ class NumericalEncoder(sensor.Encoder):
             max_value: The maximum value supported by this encoder
             length: The length of the encoded representation
             sparsity: The sparsity of the encoded representation
+            cache_size: Optional - the number of bytes that the encodings kept
+                for reuse may take
         """
         super().__init__(default_value=0, shape=(length,))
         self.min = min_value
         self.max = max_value
         self.length = length
         self.sparsity = sparsity
+        self.signal_length = math.ceil(sparsity * length)
+        self.cache_size = cache_size
+        self._encodings = collections.OrderedDict()
+
+    def __getstate__(self) -> dict:
+        """Get the state for pickling, without the encodings kept for reuse."""
+        return {**self.__dict__, "_encodings": collections.OrderedDict()}
 
     @property
     def range(self):
         """The range of values supported by this encoder."""
         return self.max - self.min
 
+    @property
+    @abc.abstractmethod
+    def signal_range(self) -> int:
+        """The last position where a band of activations can start."""
+        raise NotImplementedError()
+
+    def _start(self, value: float) -> int:
+        """The position where the band of activations of a value starts."""
+        return int((value - self.min) / self.range * self.signal_range)
+
+    def _starts(self, values: np.ndarray) -> np.ndarray:
+        """The positions where the bands of activations of values start."""
+        values = np.asarray(values, dtype=np.float64)
+        if not np.all((self.min <= values) & (values <= self.max)):
+            raise ValueError("Value outside of the range of the encoder.")
+        return ((values - self.min) / self.range * self.signal_range).astype(np.intp)
 
-class SimpleEncoder(NumericalEncoder):
-    """The simplest numerical encoder."""
+    def _check(self, value: float) -> None:
+        """Make sure the value can be encoded."""
+        if not (self.min <= value <= self.max):
+            raise ValueError("Value outside of the range of the encoder.")
 
-    def encode(self, value: float):
+    def encode(self, value: float) -> np.ndarray:
         """Encode a value.
 
-        The signal length is determined by the output length and the sparsity.
-        The encoded value contains a band of activations of said length that
-        slide across the representation.
-
         Args:
             value: The value to encode
 
         Returns:
-            The encoded representation of the value
+            The encoded representation of the value, which is shared with other
+            values encoded the same way and so cannot be written to
         """
-        if not (self.min <= value <= self.max):
-            raise ValueError("Value outside of the range of the encoder.")
-
-        signal_length = math.ceil(self.sparsity * self.length)
-        signal_range = self.length - signal_length
-        signal_start = int((value - self.min) / self.range * signal_range)
+        self._check(value)
+        start = self._start(value)
+        encodings = self._encodings
+        encoded = encodings.get(start)
+        if encoded is not None:
+            encodings.move_to_end(start)
+            return encoded
+
+        encoded = np.zeros(self.length)
+        encoded[self._band(start)] = 1
+        encoded.flags.writeable = False
+        encodings[start] = encoded
+        if len(encodings) * encoded.nbytes > self.cache_size:
+            encodings.popitem(last=False)
+        return encoded
+
+    def on_bits(self, value: float) -> np.ndarray:
+        """The positions of the activations that encode a value.
 
-        encoded_value = np.zeros(self.length)
-        encoded_value[signal_start : signal_start + signal_length] = 1
+        Args:
+            value: The value to encode
 
-        return encoded_value
+        Returns:
+            The indices of the active units, in the order of the band
+        """
+        self._check(value)
+        return self._band(self._start(value))
 
+    def encode_many(
+        self, values: Sequence[float], dtype: npt.DTypeLike = np.float64
+    ) -> np.ndarray:
+        """Encode a sequence of values at once.
 
-class CyclicEncoder(NumericalEncoder):
-    """A cyclic encoder, similar to the SimpleEncoder, but loops."""
+        Args:
+            values: The values to encode, in order
+            dtype: Optional - the type of the encodings, e.g. bool to save
+                memory
 
-    def encode(self, value: float):
-        """Encode a value.
+        Returns:
+            A matrix with the encoding of each value in its rows.
+        """
+        bands = self._bands(self._starts(values))
+        encoded = np.zeros((len(bands), self.length), dtype=dtype)
+        np.put_along_axis(encoded, bands, 1, axis=1)
+        return encoded
 
-        The signal length is determined by the output length and the sparsity.
-        The encoded value contains a band of activations of said length that
-        slide across the representation and loop at the end.
+    def on_bits_many(self, values: Sequence[float]) -> tuple[np.ndarray, np.ndarray]:
+        """The positions of the activations that encode a sequence of values.
 
         Args:
-            value: The value to encode
+            values: The values to encode, in order
 
         Returns:
-            The encoded representation of the value
+            The indices of the active units of every value one after another,
+            and the offsets where those of each value start, along with the
+            total, so that the active units of the i-th value are
+            indices[offsets[i] : offsets[i + 1]].
         """
-        if not (self.min <= value <= self.max):
-            raise ValueError("Value outside of the range of the encoder.")
+        bands = self._bands(self._starts(values))
+        offsets = np.arange(len(bands) + 1) * self.signal_length
+        return bands.ravel(), offsets
+
+    def _bands(self, starts: np.ndarray) -> np.ndarray:
+        """The positions of the bands of activations starting at each start."""
+        bands = starts[:, np.newaxis] + np.arange(self.signal_length)
+        if self.signal_range + self.signal_length > self.length:
+            bands %= self.length
+        return bands
 
-        signal_length = math.ceil(self.sparsity * self.length)
-        signal_range = self.length - 1
-        signal_start = int((value - self.min) / self.range * signal_range)
+    def _band(self, start: int) -> np.ndarray:
+        """The positions of a band of activations, looping at the end."""
+        band = np.arange(start, start + self.signal_length)
+        if start + self.signal_length > self.length:
+            band %= self.length
+        return band
 
-        encoded_value = np.zeros(self.length)
-        encoded_value[signal_start : signal_start + signal_length] = 1
-        if signal_start + signal_length > self.length:
-            spill_size = (signal_start + signal_length) % self.length
-            encoded_value[:spill_size] = 1
 
-        return encoded_value
+class SimpleEncoder(NumericalEncoder):
+    """The simplest numerical encoder.
+
+    The signal length is determined by the output length and the sparsity.
+    The encoded value contains a band of activations of said length that
+    slide across the representation.
+    """
+
+    @property
+    def signal_range(self) -> int:
+        """The last position where a band of activations can start."""
+        return self.length - self.signal_length
+
+
+class CyclicEncoder(NumericalEncoder):
+    """A cyclic encoder, similar to the SimpleEncoder, but loops.
+
+    The signal length is determined by the output length and the sparsity.
+    The encoded value contains a band of activations of said length that
+    slide across the representation and loop at the end.
+    """
+
+    @property
+    def signal_range(self) -> int:
+        """The last position where a band of activations can start."""
+        return self.length - 1
@@ -5,6 +5,8 @@ from typing import TYPE_CHECKING
 
 import numpy as np
 
+from protobrain import synapses as _synapses
+
 if TYPE_CHECKING:
     from protobrain import neuron
 
@@ -27,6 +29,9 @@ class HebbianLearning(Learning):
 
     'Neurons that fire together, wire together.'
     'Neurons that fire apart, wire apart'
+
+    Fixed-point synapses are adjusted by the increase and decrease rounded to
+    the nearest number of units, but by at least one unit.
     """
 
     def __init__(self, increase: float = 0.05, decrease: float = 0.002):
@@ -45,16 +50,113 @@ class HebbianLearning(Learning):
         Increase the weights on synapses where input and output were active.
         Decrease the weights on synapses where only the output was active.
 
+        Synapses are updated in place and only those of active inputs or active
+        neurons are visited. Synapses with a weight of 0 are kept at 0.
+
         Args:
             neurons: The neurons to update
         """
-        active_neurons = np.array(neurons.output.values) == 1
+        active_neurons = np.array(neurons.output.values).ravel() == 1
         for _, input_unit in neurons.inputs.items():
-            active_inputs = np.array(input_unit.values) == 1
-            zeros = input_unit.synapses == 0
-            input_unit.synapses[np.ix_(active_inputs, ~active_neurons)] -= self.decrease
-            input_unit.synapses[np.ix_(~active_inputs, active_neurons)] -= self.decrease
-            input_unit.synapses[np.ix_(active_inputs, active_neurons)] += self.increase
-
-            input_unit.synapses[zeros] = 0
-            input_unit.synapses = np.clip(input_unit.synapses, 0, 1)
+            active_inputs = np.array(input_unit.values).ravel() == 1
+            learn = (
+                self._learn_sparse
+                if isinstance(input_unit.synapses, _synapses.SparseSynapses)
+                else self._learn_dense
+            )
+            learn(
+                input_unit.synapses,
+                active_inputs,
+                active_neurons,
+                self._units(self.increase, input_unit),
+                self._units(self.decrease, input_unit),
+            )
+
+    def _learn_dense(
+        self,
+        synapses: np.ndarray,
+        active_inputs: np.ndarray,
+        active_neurons: np.ndarray,
+        increase: float,
+        decrease: float,
+    ):
+        """Make dense synapses learn.
+
+        Only the rows of active inputs and the columns of active neurons are
+        visited, so the cost does not depend on the size of the whole tensor.
+
+        Args:
+            synapses: The synapses to update in place
+            active_inputs: Which inputs were active
+            active_neurons: Which neurons were active
+            increase: The increase, in units of the stored synapses
+            decrease: The decrease, in units of the stored synapses
+        """
+        from_active = np.flatnonzero(active_inputs)
+        to_active = np.flatnonzero(active_neurons)
+
+        delta = np.where(active_neurons, increase, -decrease)
+        self._adjust(synapses, from_active, delta)
+        self._adjust(
+            synapses, (np.flatnonzero(~active_inputs)[:, None], to_active), -decrease
+        )
+
+    def _learn_sparse(
+        self,
+        synapses: "_synapses.SparseSynapses",
+        active_inputs: np.ndarray,
+        active_neurons: np.ndarray,
+        increase: float,
+        decrease: float,
+    ):
+        """Make sparse synapses learn, only visiting those of active units.
+
+        Args:
+            synapses: The synapses to update in place
+            active_inputs: Which inputs were active
+            active_neurons: Which neurons were active
+            increase: The increase, in units of the stored synapses
+            decrease: The decrease, in units of the stored synapses
+        """
+        from_active = synapses.rows(np.flatnonzero(active_inputs))
+        to_active = synapses.columns(np.flatnonzero(active_neurons))
+        to_active = to_active[~active_inputs[synapses.row_of(to_active)]]
+
+        together = active_neurons[synapses.indices[from_active]]
+        delta = np.where(together, increase, -decrease)
+        self._adjust(
+            synapses.data,
+            np.concatenate([from_active, to_active]),
+            np.concatenate([delta, np.full(len(to_active), -decrease)]),
+        )
+
+    @staticmethod
+    def _units(amount: float, input_unit: "_synapses.Input") -> float:
+        """Convert a change in weight into units of the stored synapses."""
+        if input_unit.resolution == 1 or not amount:
+            return amount
+        return max(1, round(amount / input_unit.resolution))
+
+    @staticmethod
+    def _adjust(synapses: np.ndarray, index, delta: float | np.ndarray):
+        """Add to the indexed synapses, saturating at a weight of 0 and 1.
+
+        Synapses that had a weight of 0 are pruned and stay at 0.
+
+        Args:
+            synapses: The synapses to update in place
+            index: The index of the synapses to update
+            delta: The amount to add, in units of the stored synapses
+        """
+        block = synapses[index]
+        pruned = block == 0
+        if synapses.dtype.kind in "iu":
+            maximum = np.iinfo(synapses.dtype).max
+            block = block.astype(np.int16)
+        else:
+            maximum = 1
+        block += delta
+        np.minimum(block, maximum, out=block)
+        np.maximum(block, 0, out=block)
+        block[pruned] = 0
+        synapses[index] = block
@@ -0,0 +1,292 @@
+"""Module for recording the activity of neurons into memory-mapped files."""
+
+import json
+import math
+import os
+import tempfile
+
+import numpy as np
+import numpy.typing as npt
+
+from protobrain import neuron
+from protobrain.metrics import metric
+
+PACKED = "packed"
+INDICES = "indices"
+
+_METADATA = "recording.json"
+_STEPS = "steps"
+
+
+class _GrowableArray:
+    """A memory-mapped array of rows that doubles its capacity when full."""
+
+    def __init__(
+        self,
+        path: str,
+        dtype: npt.DTypeLike,
+        row_shape: tuple[int, ...] = (),
+        capacity: int = 1024,
+    ):
+        """Create the file backing the array.
+
+        Args:
+            path: The file to store the rows in
+            dtype: The type of the values
+            row_shape: The shape of each row
+            capacity: The number of rows to allocate at first
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = row_shape
+        self.size = 0
+        self._row_bytes = self.dtype.itemsize * math.prod(row_shape)
+        self._array = None
+        open(path, "wb").close()
+        self._map(max(1, capacity))
+
+    def _map(self, capacity: int) -> None:
+        """Resize the file to the given number of rows and map it."""
+        self._unmap()
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self._row_bytes)
+        self._array = np.memmap(
+            self.path, self.dtype, "r+", shape=(capacity,) + self.row_shape
+        )
+
+    def _unmap(self) -> None:
+        """Write the mapped rows to the file and release the mapping."""
+        if self._array is not None:
+            self._array.flush()
+            self._array = None
+
+    def append(self, rows: np.ndarray) -> None:
+        """Add rows at the end, growing the file if needed.
+
+        Args:
+            rows: An array of rows, each with the row shape
+        """
+        size = self.size + len(rows)
+        if self._array is None or size > len(self._array):
+            capacity = len(self._array) if self._array is not None else self.size
+            self._map(max(size, 2 * capacity))
+        self._array[self.size : size] = rows
+        self.size = size
+
+    def close(self) -> None:
+        """Write the rows to the file, trimming the unused capacity."""
+        self._unmap()
+        with open(self.path, "r+b") as f:
+            f.truncate(self.size * self._row_bytes)
+
+
+def _load(path: str, dtype: npt.DTypeLike, shape: tuple[int, ...]) -> np.ndarray:
+    """Map a file written by a _GrowableArray for reading."""
+    if not math.prod(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype, "r", shape=shape)
+
+
+class ActivityRecorder(metric.Metric):
+    """Records the output of every layer on every step into files.
+
+    The output of each innermost layer is appended to memory-mapped files,
+    either as rows of bits packed with np.packbits, or as the indices of the
+    active units along with the offsets where each step starts. The files grow
+    as needed, so recordings can be as long as the disk allows.
+
+    Every reset starts a new recording in a directory of its own, so that it
+    can be used as a metric in a benchmark of several brains. The result of
+    the metric is the directory of the recording, to be read with
+    ActivityRecording.
+
+    The metadata is written when the recording starts, and the number of
+    steps is kept in a mapped file updated once every step is written, so a
+    recording stays readable even if the process making it crashes.
+    """
+
+    def __init__(self, directory: str, mode: str = PACKED, capacity: int = 1024):
+        """Initialize the recorder.
+
+        Args:
+            directory: The directory to create recordings in
+            mode: Optional - either PACKED for rows of packed bits, or INDICES
+                for the indices of the active units
+            capacity: Optional - the number of steps to allocate at first
+        """
+        if mode not in (PACKED, INDICES):
+            raise ValueError(f"Unsupported recording mode: {mode}")
+
+        self.directory = directory
+        self.mode = mode
+        self.capacity = capacity
+        self.path = None
+        super().__init__("activity")
+
+    def __getstate__(self) -> dict:
+        """Get the state for pickling, without any ongoing recording."""
+        return {
+            **self.__dict__,
+            "path": None,
+            "_layers": None,
+            "_files": None,
+            "_counter": None,
+        }
+
+    def reset(self):
+        """Finish the ongoing recording, so that the next step starts a new one."""
+        if getattr(self, "_files", None):
+            self.close()
+        self.path = None
+        self._layers = None
+        self._files = None
+        self._counter = None
+        self._steps = 0
+
+    def _start(self, neurons: neuron.Neurons) -> None:
+        """Create the files of a new recording for the given neurons."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="recording-", dir=self.directory)
+        self._layers = (
+            neurons.leaves()
+            if isinstance(neurons, neuron.LayeredNeurons)
+            else [neurons]
+        )
+        self._files = []
+        for i, layer in enumerate(self._layers):
+            path = os.path.join(self.path, f"layer_{i}")
+            if self.mode == PACKED:
+                row = (math.ceil(math.prod(layer.shape) / 8),)
+                files = (_GrowableArray(path + ".bits", np.uint8, row, self.capacity),)
+            else:
+                indices = _GrowableArray(
+                    path + ".indices", np.uint32, capacity=self.capacity
+                )
+                offsets = _GrowableArray(
+                    path + ".offsets", np.int64, capacity=self.capacity
+                )
+                offsets.append(np.zeros(1, dtype=np.int64))
+                files = (indices, offsets)
+            self._files.append(files)
+
+        metadata = {
+            "mode": self.mode,
+            "layers": [{"shape": list(layer.shape)} for layer in self._layers],
+        }
+        with open(os.path.join(self.path, _METADATA), "w") as f:
+            json.dump(metadata, f)
+        self._counter = np.memmap(
+            os.path.join(self.path, _STEPS), np.int64, "w+", shape=(1,)
+        )
+
+    def next(self, neurons):
+        """Record the output of the neurons for the next step.
+
+        Args:
+            neurons: Brain state to record
+        """
+        if self._files is None:
+            self._start(neurons)
+
+        for layer, files in zip(self._layers, self._files):
+            active = np.ravel(layer.output.values) != 0
+            if self.mode == PACKED:
+                (bits,) = files
+                bits.append(np.packbits(active)[np.newaxis])
+            else:
+                indices, offsets = files
+                on_bits = np.flatnonzero(active).astype(np.uint32)
+                indices.append(on_bits)
+                offsets.append(np.array([indices.size]))
+        self._steps += 1
+        self._counter[0] = self._steps
+
+    def close(self) -> None:
+        """Write everything recorded so far to the files."""
+        if self._files is None:
+            return
+        for files in self._files:
+            for f in files:
+                f.close()
+        self._counter.flush()
+        self._files = None
+        self._counter = None
+
+    def compute(self):
+        """Finish the recording, giving its directory."""
+        if self.path is None:
+            raise RuntimeError("No iterations - cannot compute metric")
+        self.close()
+        return metric.MetricResults(self.name, global_result=self.path)
+
+
+class LayerActivity:
+    """The recorded activity of a single layer, read without copying."""
+
+    def __init__(self, path: str, mode: str, shape: tuple[int, ...], steps: int):
+        """Map the files of the layer.
+
+        Args:
+            path: The path of the layer's files, without extension
+            mode: The recording mode
+            shape: The shape of the layer's output
+            steps: The number of recorded steps
+        """
+        self.mode = mode
+        self.shape = shape
+        self.steps = steps
+        self.bits = self.indices = self.offsets = None
+        if mode == PACKED:
+            row = math.ceil(math.prod(shape) / 8)
+            self.bits = _load(path + ".bits", np.uint8, (steps, row))
+        else:
+            self.offsets = _load(path + ".offsets", np.int64, (steps + 1,))
+            self.indices = _load(path + ".indices", np.uint32, (int(self.offsets[-1]),))
+
+    def __len__(self) -> int:
+        """The number of recorded steps."""
+        return self.steps
+
+    def on_bits(self, step: int) -> np.ndarray:
+        """The indices of the active units on a step, in the flattened output."""
+        if self.mode == PACKED:
+            return np.flatnonzero(self[step])
+        return self.indices[self.offsets[step] : self.offsets[step + 1]]
+
+    def __getitem__(self, step: int) -> np.ndarray:
+        """The binary output of the layer on a step."""
+        size = math.prod(self.shape)
+        if self.mode == PACKED:
+            values = np.unpackbits(self.bits[step], count=size)
+        else:
+            values = np.zeros(size, dtype=np.uint8)
+            values[self.on_bits(step)] = 1
+        return values.reshape(self.shape)
+
+
+class ActivityRecording:
+    """A recording made by an ActivityRecorder."""
+
+    def __init__(self, path: str):
+        """Open the recording, which may still be in progress.
+
+        Args:
+            path: The directory of the recording
+        """
+        with open(os.path.join(path, _METADATA)) as f:
+            metadata = json.load(f)
+        self.mode = metadata["mode"]
+        self.steps = int(np.fromfile(os.path.join(path, _STEPS), np.int64, 1)[0])
+        self.layers = [
+            LayerActivity(
+                os.path.join(path, f"layer_{i}"),
+                self.mode,
+                tuple(layer["shape"]),
+                self.steps,
+            )
+            for i, layer in enumerate(metadata["layers"])
+        ]
+
+    def __len__(self) -> int:
+        """The number of recorded steps."""
+        return self.steps
@@ -1,6 +1,12 @@
 """Module for implementation of a benchmark to evaluate architectures."""
 
+import concurrent.futures
+import copy
+import itertools
 import logging
+import sys
+
+import numpy as np
 
 
 log = logging.getLogger(__name__)
@@ -17,14 +23,24 @@ class Benchmark:
         """
         self.metrics = metrics
 
-    def run(self, brains, inputs, learning=True, verbose=False):
+    def run(self, brains, inputs, learning=True, verbose=False, workers=1, seed=None):
         """Run the benchmark on the given brains with the given inputs.
 
+        Every brain is evaluated on its own copy of the brain and the metrics,
+        so the brains and metrics given are left untouched. With more than one
+        worker, brains are evaluated at the same time in separate processes.
+
         Args:
-            brains: Brain architectures to evaluate
+            brains: Brain architectures to evaluate, or functions creating
+                them, which are called once the random state is seeded so that
+                creating the brains is reproducible too
             inputs: Input sequence to use
             learning: Whether to use learning
             verbose: Whether to log progress as evaluations are run
+            workers: Optional - the number of processes evaluating brains
+            seed: Optional - a seed from which every brain gets its own random
+                state, the same regardless of the number of workers. The global
+                random state is restored after every brain.
 
         Returns:
             A list with results for each brain architecture given.
@@ -32,25 +48,86 @@ class Benchmark:
             entries for each metric.
         """
         log.setLevel(logging.DEBUG)
-        metric_results = []
-        for i, brain in enumerate(brains):
-            for metric in self.metrics:
-                metric.reset()
-
-            brain_results = {}
-            for inp in inputs:
-                brain.sensor.feed(inp)
-                brain.compute()
-                if learning:
-                    brain.learn()
-
-                for metric in self.metrics:
-                    metric.next(brain.neurons)
-
-            for metric in self.metrics:
-                result = metric.compute()
-                brain_results[metric.name] = result
+        seeds = (
+            [None] * len(brains)
+            if seed is None
+            else [
+                s.generate_state(1)[0]
+                for s in np.random.SeedSequence(seed).spawn(len(brains))
+            ]
+        )
+
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                metric_results = list(
+                    pool.map(
+                        _evaluate,
+                        brains,
+                        itertools.repeat(self.metrics),
+                        itertools.repeat(inputs),
+                        itertools.repeat(learning),
+                        seeds,
+                    )
+                )
+        else:
+            metric_results = [
+                _evaluate(
+                    copy.deepcopy(brain),
+                    copy.deepcopy(self.metrics),
+                    inputs,
+                    learning,
+                    brain_seed,
+                )
+                for brain, brain_seed in zip(brains, seeds)
+            ]
+
+        for i, brain_results in enumerate(metric_results):
+            for result in brain_results.values():
                 log.debug("Brain #%i - %s", i, result)
 
-            metric_results.append(brain_results)
         return metric_results
+
+
+def _evaluate(brain, metrics, inputs, learning, seed=None):
+    """Evaluate the metrics on a single brain.
+
+    Args:
+        brain: Brain architecture to evaluate, which gets changed, or a function
+            creating it
+        metrics: List of metric objects to use, which get reset
+        inputs: Input sequence to use
+        learning: Whether to use learning
+        seed: Optional - the seed for the random state of the brain, used while
+            evaluating it only
+
+    Returns:
+        The results of the brain, as {'metric_name': MetricResults}
+    """
+    torch = sys.modules.get("torch")
+    state = np.random.get_state()
+    torch_state = None if torch is None else torch.get_rng_state()
+    try:
+        if seed is not None:
+            np.random.seed(seed)
+            if torch is not None:
+                torch.manual_seed(seed)
+        if callable(brain):
+            brain = brain()
+
+        for metric in metrics:
+            metric.reset()
+
+        for inp in inputs:
+            brain.sensor.feed(inp)
+            brain.compute()
+            if learning:
+                brain.learn()
+
+            for metric in metrics:
+                metric.next(brain.neurons)
+
+        return {metric.name: metric.compute() for metric in metrics}
+    finally:
+        np.random.set_state(state)
+        if torch_state is not None:
+            torch.set_rng_state(torch_state)
@@ -7,7 +7,11 @@ from protobrain.metrics import metric
 
 
 class SpikeCount(metric.Metric):
-    """How many times each neuron spiked during the experiment."""
+    """How many times each neuron spiked during the experiment.
+
+    Spikes are added up in place into an integer array per layer, which is
+    histogrammed at the end instead of visiting every neuron.
+    """
 
     def __init__(self):
         """Initialize the metric."""
@@ -16,6 +20,7 @@ class SpikeCount(metric.Metric):
     def reset(self):
         """Reset all accumulators."""
         self._accumulator = None
+        self._activity_accumulator = None
 
     def next(self, neurons):
         """Record the next state for the metric computation.
@@ -23,13 +28,40 @@ class SpikeCount(metric.Metric):
         Args:
             neurons: Brain state to record
         """
+        if self._accumulator is None and (
+            isinstance(neurons, neuron.LayeredNeurons) and neurons.contiguous
+        ):
+            self._activity_accumulator = np.zeros(neurons.activity.shape, np.int64)
+            self._accumulator = self._split(
+                neurons,
+                iter(np.split(self._activity_accumulator, neurons.offsets[1:-1])),
+            )
+
+        if self._activity_accumulator is not None:
+            np.add(
+                self._activity_accumulator,
+                neurons.activity,
+                out=self._activity_accumulator,
+                casting="unsafe",
+            )
+            return
+
         self._accumulator = self._accumulate_partials(self._accumulator, neurons)
 
+    def _split(self, neurons, accumulators):
+        """Arrange views of the activity accumulator like the layers."""
+        if not isinstance(neurons, neuron.LayeredNeurons):
+            return next(accumulators).reshape(neurons.shape)
+        return [self._split(layer, accumulators) for layer in neurons.layers]
+
     def _accumulate_partials(self, accumulator, neurons):
         if not isinstance(neurons, neuron.LayeredNeurons):
-            return np.array(
-                neurons.output.values + (accumulator if accumulator is not None else 0)
+            if accumulator is None:
+                accumulator = np.zeros(neurons.output.shape, dtype=np.int64)
+            np.add(
+                accumulator, neurons.output.values, out=accumulator, casting="unsafe"
             )
+            return accumulator
 
         if not accumulator:
             accumulator = [None] * len(neurons.layers)
@@ -43,14 +75,16 @@ class SpikeCount(metric.Metric):
         if isinstance(accumulator, list):
             return [self._count(subacc) for subacc in accumulator]
 
-        non_zero_indices = list(zip(*np.where(accumulator > 0)))
-        counts = {
-            0: accumulator.size - len(non_zero_indices),
-        }
-        for indices in non_zero_indices:
-            value = accumulator[indices]
-            counts[value] = counts.get(value, 0) + 1
+        spikes = accumulator.ravel()
+        if spikes.size and spikes.max() <= spikes.size:
+            histogram = np.bincount(spikes)
+            values = np.flatnonzero(histogram)
+            occurrences = histogram[values]
+        else:
+            values, occurrences = np.unique(spikes, return_counts=True)
 
+        counts = {0: 0}
+        counts.update(zip(values.tolist(), occurrences.tolist()))
         return counts
 
     def _aggregate(self, counts):
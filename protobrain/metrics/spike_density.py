@@ -7,16 +7,35 @@ from protobrain.metrics import metric
 
 
 class SpikeDensity(metric.Metric):
-    """Fraction of neurons spiked during the experiment."""
+    """Fraction of neurons spiked during the experiment.
 
-    def __init__(self):
-        """Initialize the metric."""
+    When streaming, only a running sum of the density of each layer is kept,
+    so memory stays constant regardless of the number of steps. The results
+    per step are then limited to the most recent steps kept in the history.
+    """
+
+    def __init__(self, streaming=False, history=None):
+        """Initialize the metric.
+
+        Args:
+            streaming: Optional - whether to keep running sums per layer instead
+                of the densities of every step
+            history: Optional - when streaming, the number of most recent steps
+                to keep the densities of, for the per step results
+        """
+        self.streaming = streaming
+        self.history = history
         super().__init__("spike_density")
 
     def reset(self):
         """Reset all accumulators."""
         self._density_per_step_per_layer = []
         self._sizes_per_layer = None
+        self._layers = None
+        self._sizes = None
+        self._density_sums = None
+        self._recent_densities = None
+        self._steps = 0
 
     def next(self, neurons):
         """Record the next state for the metric computation.
@@ -27,10 +46,84 @@ class SpikeDensity(metric.Metric):
         if not self._sizes_per_layer:
             self._sizes_per_layer = self._size_per_layer(neurons)
 
+        if self.streaming:
+            self._accumulate(neurons)
+            return
+
+        if isinstance(neurons, neuron.LayeredNeurons) and neurons.contiguous:
+            self._density_per_step_per_layer.append(
+                self._nest(self._densities(neurons), tuple)
+            )
+            return
+
         self._density_per_step_per_layer.append(
             self._spike_density_per_layer(neurons, self._sizes_per_layer)
         )
 
+    def _accumulate(self, neurons):
+        """Add the densities of the current step to the running sums."""
+        densities = self._densities(neurons)
+        if self._density_sums is None:
+            self._density_sums = np.zeros(len(self._layers))
+            if self.history:
+                self._recent_densities = np.zeros((self.history, len(self._layers)))
+
+        self._density_sums += densities
+        if self.history:
+            self._recent_densities[self._steps % self.history] = densities
+        self._steps += 1
+
+    def _densities(self, neurons):
+        """The density of each innermost layer, in order."""
+        if self._layers is None:
+            self._layers = (
+                neurons.leaves()
+                if isinstance(neurons, neuron.LayeredNeurons)
+                else [neurons]
+            )
+            self._sizes = np.array([layer.output.values.size for layer in self._layers])
+
+        if isinstance(neurons, neuron.LayeredNeurons) and neurons.contiguous:
+            spikes = np.add.reduceat(neurons.activity, neurons.offsets[:-1])
+        else:
+            spikes = np.fromiter(
+                (np.sum(layer.output.values) for layer in self._layers),
+                dtype=float,
+                count=len(self._layers),
+            )
+        return spikes / self._sizes
+
+    def _nest(self, values, container):
+        """Arrange per layer values like the layers, from innermost ones in order."""
+        values = iter(values)
+
+        def build(size):
+            if isinstance(size, tuple):
+                return container(build(s) for s in size)
+            return float(next(values))
+
+        return build(self._sizes_per_layer)
+
+    def _compute_streaming(self):
+        """Compute the metric from the running sums."""
+        per_layer = self._density_sums / self._steps
+        global_result = np.dot(per_layer, self._sizes) / self._sizes.sum()
+
+        per_step_result = per_layer_per_step_result = None
+        if self.history:
+            recent = np.roll(self._recent_densities, -self._steps, axis=0)
+            recent = recent[-min(self.history, self._steps) :]
+            per_step_result = list(recent @ self._sizes / self._sizes.sum())
+            per_layer_per_step_result = [self._nest(r, tuple) for r in recent]
+
+        return metric.MetricResults(
+            self.name,
+            global_result=global_result,
+            per_layer_result=self._nest(per_layer, list),
+            per_step_result=per_step_result,
+            per_layer_per_step_result=per_layer_per_step_result,
+        )
+
     def _size_per_layer(self, layer):
         if isinstance(layer, neuron.LayeredNeurons):
             return tuple(self._size_per_layer(l) for l in layer.layers)
@@ -116,6 +209,9 @@ class SpikeDensity(metric.Metric):
         if not self._sizes_per_layer:
             raise RuntimeError("No iterations - cannot compute metric")
 
+        if self.streaming:
+            return self._compute_streaming()
+
         per_step_result = self._aggregate_over_layers()
         return metric.MetricResults(
             self.name,
@@ -1,9 +1,12 @@
 """Module dealing with Neurons."""
 
+import concurrent.futures
 import logging
-from typing import Callable
+import math
+from typing import Callable, Self
 
 import numpy as np
+import numpy.typing as npt
 
 from protobrain import computation as _computation
 from protobrain import learning as _learning
@@ -16,13 +19,15 @@ log = logging.getLogger(__name__)
 class Neurons:
     """Class representing neurons."""
 
-    MAIN_INPUT = "main"
+    MAIN_INPUT = synapses.MAIN_INPUT
 
     def __init__(
         self,
         shape: tuple[int, ...] | int,
         computation: _computation.Computation | None = None,
         learning: _learning.Learning | None = None,
+        dtype: npt.DTypeLike = np.float64,
+        density: float = 1.0,
     ):
         """Initialize the neurons.
 
@@ -30,21 +35,79 @@ class Neurons:
             units: Either a number of internal units or a list of layers
             computation: Optional - the computation function to use to obtain the outputs
             learning: Optional - the function to use for learning
+            dtype: Optional - the type used to store the synapses of every input,
+                see synapses.Input
+            density: Optional - the fraction of possible synapses that every input
+                creates, see synapses.Input
         """
         if isinstance(shape, int):
             shape = (shape,)
 
-        self.inputs = {self.MAIN_INPUT: synapses.Input(self.MAIN_INPUT, shape=shape)}
+        self.dtype = np.dtype(dtype)
+        self.density = density
+        self.inputs = {
+            self.MAIN_INPUT: synapses.Input(
+                self.MAIN_INPUT, shape=shape, dtype=dtype, density=density
+            )
+        }
         self.output = synapses.Output(shape=shape)
         self.computation = computation
         self.learning = learning
+        self._activations = np.empty(shape, dtype=np.result_type(dtype, np.float32))
 
     def compute(self) -> np.ndarray:
-        """Compute the output of this neuron."""
+        """Compute the output of this neuron.
+
+        Returns:
+            The new values of the output, see values
+        """
+        self.output.values = self.evaluate()
+        return self.values
+
+    def evaluate(self) -> np.ndarray:
+        """Compute the output of this neuron without setting it.
+
+        For a buffered computation, the activations and the output are
+        computed into arrays preallocated by these neurons. The output goes
+        into the spare array of the output, so the values remain readable until
+        they are set. Other computations are only given the inputs.
+        """
         if not self.computation:
             raise ValueError(f"Computation function not set for {self}!")
-        self.output.values = self.computation(**self.inputs)
-        return self.values
+        if not getattr(self.computation, "buffered", False):
+            return self.computation(**self.inputs)
+        return self.computation(
+            out=self.output.spare(), activations=self._activations, **self.inputs
+        )
+
+    def compute_batch(self, values: np.ndarray) -> np.ndarray:
+        """Compute the outputs of these neurons for a batch of steps at once.
+
+        Every step is computed from its row of main input values, so this is
+        only possible for neurons without any other inputs. Leaves the output
+        holding the values of the last step, as if computed one at a time.
+
+        Args:
+            values: A (T, inputs) matrix with the main input values of each step
+
+        Returns:
+            A (T, neurons) matrix with the output of each step
+        """
+        if not self.computation:
+            raise ValueError(f"Computation function not set for {self}!")
+        if set(self.inputs) != {self.MAIN_INPUT}:
+            raise ValueError(
+                f"Batched computation requires {self} to only have a main input"
+            )
+        outputs = self.computation.batch(values, **self.inputs)
+        if outputs.shape[1:] != self.shape:
+            raise ValueError(
+                f"{self.computation} gives outputs of shape {outputs.shape[1:]}, "
+                f"but {self} has shape {self.shape}"
+            )
+        if len(outputs):
+            self.output.values = outputs[-1]
+        return outputs
 
     def learn(self) -> None:
         """Adjust the synapses to learn."""
@@ -90,12 +153,20 @@ class Neurons:
             synapse_function: Optional - the function to use to generate
                 the synapses
         """
-        self.inputs[name] = synapses.Input(name, shape=self.output.shape)
+        self.inputs[name] = synapses.Input(
+            name, shape=self.output.shape, dtype=self.dtype, density=self.density
+        )
         self.inputs[name].connect(output, synapse_function)
 
     @property
     def values(self) -> np.ndarray:
-        """The values at the output of these neurons."""
+        """The values at the output of these neurons.
+
+        Buffered computations write into the float64 arrays of the output, so
+        the values are float64 even when the computation called on its own
+        gives booleans. The output alternates between two such arrays, so the
+        values are overwritten by the step after next: copy them to keep them.
+        """
         return self.output.values
 
     @property
@@ -105,27 +176,237 @@ class Neurons:
 
 
 class LayeredNeurons(Neurons):
-    """Class representing groups of neurons."""
+    """Class representing groups of neurons.
+
+    Layers are computed one after the other, unless pipelined. When pipelined,
+    all the layers compute at the same time on a thread pool, each of them from
+    the outputs of the previous step: a layer computes step t while the next
+    one computes step t - 1. The output of the last layer therefore lags the
+    input by one step per additional layer, until the pipeline is drained.
+    The threads of the pool are stopped by close, or at the end of a with
+    statement.
+
+    When contiguous, the outputs of all the innermost layers are stored in order
+    in a single flat buffer, exposed as activity, so that they can be processed
+    at once. Their values are then overwritten in place on every step.
+    """
+
+    def __init__(
+        self,
+        layers: list[Neurons],
+        pipelined: bool = False,
+        workers: int | None = None,
+        contiguous: bool = False,
+    ):
+        """Initialize the layers.
+
+        Args:
+            layers: The layers, in order
+            pipelined: Optional - whether to compute all layers at the same time,
+                with a delay of one step between consecutive layers
+            workers: Optional - the number of threads computing pipelined
+                layers, one per layer by default
+            contiguous: Optional - whether to store the outputs of all layers
+                in a single buffer
+        """
+        if pipelined and any(isinstance(l, LayeredNeurons) for l in layers):
+            raise ValueError("Pipelined layers cannot contain other layers")
 
-    def __init__(self, layers: list[Neurons]):
         self.layers = layers
         self.inputs = self.layers[0].inputs
         self.output = self.layers[-1].output
+        self.pipelined = pipelined
+        self.workers = workers
+        self.contiguous = contiguous
+        self._executor = None
+        self._activity = None
+        self._offsets = None
 
         if self.inputs[self.MAIN_INPUT].connected:
             log.warning("Creating layers with pre-connected input")
 
+        if contiguous:
+            self._bind(np.zeros(sum(self._sizes())))
+
+    def __enter__(self) -> Self:
+        """Use the layers in a with statement, which closes them at the end."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the layers."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop the threads computing pipelined layers.
+
+        Computing again afterwards starts new threads.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self) -> dict:
+        """Get the state for pickling, without the thread pool."""
+        return {**self.__dict__, "_executor": None}
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore the state, storing the outputs in a single buffer again."""
+        self.__dict__.update(state)
+        if self._activity is not None:
+            self._bind(self._activity)
+
+    @property
+    def activity(self) -> np.ndarray:
+        """The outputs of all the innermost layers, flattened one after another."""
+        if self._activity is None:
+            raise ValueError(f"{self} does not store its outputs contiguously")
+        return self._activity
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Where the output of each innermost layer starts within the activity.
+
+        The last offset is the size of the activity, so that the output of the
+        i-th layer is activity[offsets[i] : offsets[i + 1]].
+        """
+        if self._offsets is None:
+            raise ValueError(f"{self} does not store its outputs contiguously")
+        return self._offsets
+
+    def leaves(self) -> list[Neurons]:
+        """The innermost layers, in order."""
+        return [
+            leaf
+            for layer in self.layers
+            for leaf in (
+                layer.leaves() if isinstance(layer, LayeredNeurons) else [layer]
+            )
+        ]
+
+    def _sizes(self) -> list[int]:
+        """The output size of each innermost layer."""
+        return [math.prod(leaf.shape) for leaf in self.leaves()]
+
+    def _bind(self, activity: np.ndarray) -> None:
+        """Store the outputs of all the innermost layers in the given buffer.
+
+        Outputs already bound elsewhere, e.g. by a shared OutputMerge, cannot
+        be stored and raise a ValueError.
+        """
+        self._activity = activity
+        self._offsets = np.cumsum([0] + self._sizes())
+        self.contiguous = True
+        start = 0
+        for layer in self.layers:
+            if isinstance(layer, LayeredNeurons):
+                stop = start + sum(layer._sizes())
+                if layer._activity is not None:
+                    # Move the outputs of contiguous nested layers in here.
+                    for leaf in layer.leaves():
+                        leaf.output.unbind()
+                layer._bind(activity[start:stop])
+            else:
+                stop = start + math.prod(layer.shape)
+                layer.output.bind(activity[start:stop].reshape(layer.shape))
+            start = stop
+
+    def set(
+        self,
+        name: str,
+        output: synapses.Output,
+        synapse_function: Callable[[tuple[int, ...], tuple[int, ...]], None]
+        | None = None,
+    ):
+        """Connect an input of the first layer to the given output.
+
+        Args:
+            name: The name of the input
+            output: The output to connect this input to
+            synapse_function: Optional - the function to use to generate
+                the synapses
+        """
+        self.layers[0].set(name, output, synapse_function)
+
     def learn(self) -> None:
         """Adjust the synapses to learn."""
+        if self.pipelined:
+            raise ValueError(
+                "Cannot learn while pipelined, as the layers' inputs and outputs "
+                "belong to different steps"
+            )
         for layer in self.layers:
             layer.learn()
 
     def compute(self) -> np.ndarray:
         """Compute the output of these layers."""
+        if self.pipelined:
+            return self._compute_pipelined()
         for layer in self.layers:
             layer.compute()
         return self.values
 
+    def evaluate(self) -> np.ndarray:
+        """Compute the output of these layers.
+
+        Intermediate layers need to be set for the last one to be computed, so
+        this is the same as compute.
+        """
+        return self.compute()
+
+    def drain(self) -> np.ndarray:
+        """Run the pipeline until the latest input reaches the last layer.
+
+        Returns:
+            The output of the last layer for the latest input
+        """
+        if self.pipelined:
+            for _ in self.layers[1:]:
+                self._compute_pipelined()
+        return self.values
+
+    def _compute_pipelined(self) -> np.ndarray:
+        """Compute all layers at the same time from the previous step's outputs.
+
+        The outputs are only set once every layer is done, so no layer sees the
+        output of another one from the same step.
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers or len(self.layers),
+                thread_name_prefix="layer",
+            )
+        futures = [self._executor.submit(layer.evaluate) for layer in self.layers]
+        for layer, future in zip(self.layers, futures):
+            layer.output.values = future.result()
+        return self.values
+
+    def compute_batch(self, values: np.ndarray) -> np.ndarray:
+        """Compute the outputs of these layers for a batch of steps at once.
+
+        Each layer processes the whole batch before handing its outputs to the
+        next one, so the layers must be connected in a feed forward fashion.
+
+        Args:
+            values: A (T, inputs) matrix with the main input values of each step
+
+        Returns:
+            A (T, neurons) matrix with the output of the last layer on each step
+        """
+        for i, layer in enumerate(self.layers):
+            if i and not self._feeds(self.layers[i - 1], layer):
+                raise ValueError(
+                    f"Batched computation requires {layer} to be fed by the "
+                    f"previous layer {self.layers[i - 1]}"
+                )
+            values = layer.compute_batch(values)
+        return values
+
+    @staticmethod
+    def _feeds(previous: Neurons, layer: Neurons) -> bool:
+        """Whether the main input of a layer is the output of the previous one."""
+        source = layer.input._connected_output
+        return source is previous or source is previous.output
+
     @property
     def computation(self) -> list[_computation.Computation]:
         return [layer.computation for layer in self.layers]
@@ -149,6 +430,8 @@ def FeedForward(
     layers: list[Neurons],
     input_name: str = "main",
     synapse_function: Callable[[tuple[int, ...], tuple[int, ...]], None] = None,
+    pipelined: bool = False,
+    contiguous: bool = False,
 ) -> LayeredNeurons:
     """Connect all the layers in a feed forward fashion.
 
@@ -159,6 +442,10 @@ def FeedForward(
         input_name: The input to which to connect
         synapse_function: Optional - the function to use to generate
             the synapses
+        pipelined: Optional - whether to compute the layers as a pipeline,
+            see LayeredNeurons
+        contiguous: Optional - whether to store the outputs of all layers in
+            a single buffer, see LayeredNeurons
 
     Returns:
         A Neurons object containing the layers
@@ -166,7 +453,7 @@ def FeedForward(
     for i, layer in enumerate(layers[:-1]):
         layers[i + 1].set(input_name, layer)
 
-    return LayeredNeurons(layers)
+    return LayeredNeurons(layers, pipelined=pipelined, contiguous=contiguous)
 
 
 def FeedBackward(
@@ -0,0 +1,216 @@
+"""Module for computing neurons in the order given by their connections."""
+
+import heapq
+
+import numpy as np
+
+from protobrain import neuron
+from protobrain import synapses
+
+
+def _outputs(source) -> list[synapses.Output]:
+    """The outputs whose values make up the values of a connected source.
+
+    Args:
+        source: What an input is connected to, e.g. an output or neurons
+
+    Returns:
+        The underlying outputs
+    """
+    if isinstance(source, synapses.OutputMerge):
+        return [output for merged in source._outputs for output in _outputs(merged)]
+    if isinstance(source, synapses.OutputSlice):
+        return _outputs(source._output)
+    if isinstance(source, synapses.Output):
+        return [source]
+    return [source.output]
+
+
+def _components(nodes: list[int], edges: dict[int, set[int]]) -> list[list[int]]:
+    """The strongly connected components of a graph, by Tarjan's algorithm.
+
+    Args:
+        nodes: The nodes of the graph
+        edges: The nodes each node has an edge to
+
+    Returns:
+        The components, each as a sorted list of nodes
+    """
+    index, low, stack, on_stack, components = {}, {}, [], set(), []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(sorted(edges[root])))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(sorted(edges[successor]))))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while not component or component[-1] != node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    components.append(sorted(component))
+    return components
+
+
+class Scheduler(neuron.LayeredNeurons):
+    """Layers computed in the order given by their connections.
+
+    The layers are found from the connections of every input, and computed so
+    that each one comes after the layers it takes inputs from. Connections that
+    close a cycle become delay edges instead, through which a layer sees the
+    values of the previous step. Cycles are found as strongly connected
+    components, so only the layers on a cycle get delayed inputs. When the
+    connections allow several orders, the layers are picked in the order they
+    were given.
+
+    Layers whose inputs did not change since they were last computed, and which
+    did not learn since, are skipped. Outputs are only set when their values
+    change, so that idle regions do not wake up the layers they feed into.
+    """
+
+    def __init__(self, layers: list[neuron.Neurons], contiguous: bool = False):
+        """Initialize the layers.
+
+        Args:
+            layers: The layers, where nested layers are scheduled one by one
+            contiguous: Optional - whether to store the outputs of all layers
+                in a single buffer, see LayeredNeurons
+        """
+        super().__init__(layers, contiguous=contiguous)
+        self.order, self.delays = self._schedule(self.leaves())
+        self._seen = {}
+
+    def _schedule(
+        self, layers: list[neuron.Neurons]
+    ) -> tuple[list[neuron.Neurons], list[tuple[neuron.Neurons, neuron.Neurons]]]:
+        """Sort the layers so that each one follows those it takes inputs from.
+
+        Args:
+            layers: The layers to sort
+
+        Returns:
+            The layers in order, and the delay edges as (source, target) pairs
+        """
+        producers = {id(layer.output): i for i, layer in enumerate(layers)}
+        dependencies = [
+            {
+                producers[id(output)]
+                for inp in layer.inputs.values()
+                if inp.connected
+                for output in _outputs(inp._connected_output)
+                if id(output) in producers
+            }
+            for layer in layers
+        ]
+
+        delays = [(i, i) for i, sources in enumerate(dependencies) if i in sources]
+        order = []
+        self._order(list(range(len(layers))), dependencies, order, delays)
+        return [layers[i] for i in order], [
+            (layers[source], layers[target]) for source, target in delays
+        ]
+
+    def _order(
+        self,
+        nodes: list[int],
+        dependencies: list[set[int]],
+        order: list[int],
+        delays: list[tuple[int, int]],
+    ) -> None:
+        """Sort some of the layers, breaking the cycles between them.
+
+        The layers are grouped into strongly connected components, which are
+        sorted so that each one follows those it takes inputs from. A component
+        with several layers is a cycle, broken at its first layer: the inputs
+        it takes from within the component become delay edges, and the rest of
+        the component is sorted the same way. Layers outside of a cycle thus
+        never get delayed inputs, even when they feed into or read from it.
+
+        Args:
+            nodes: The indices of the layers to sort
+            dependencies: The indices of the layers each layer takes inputs from
+            order: The list to append the sorted indices to
+            delays: The list to append the delay edges to
+        """
+        members = set(nodes)
+        edges = {i: (dependencies[i] & members) - {i} for i in nodes}
+        components = _components(nodes, edges)
+        component_of = {
+            i: c for c, component in enumerate(components) for i in component
+        }
+        dependents = [set() for _ in components]
+        for i in nodes:
+            for source in edges[i]:
+                if component_of[source] != component_of[i]:
+                    dependents[component_of[source]].add(component_of[i])
+        pending = [0] * len(components)
+        for targets in dependents:
+            for target in targets:
+                pending[target] += 1
+
+        ready = [(components[c][0], c) for c, count in enumerate(pending) if not count]
+        heapq.heapify(ready)
+        while ready:
+            _, current = heapq.heappop(ready)
+            component = components[current]
+            if len(component) == 1:
+                order.extend(component)
+            else:
+                target = component[0]
+                cycle = set(component)
+                for source in sorted(edges[target] & cycle):
+                    delays.append((source, target))
+                broken = list(dependencies)
+                broken[target] = dependencies[target] - cycle
+                self._order(component, broken, order, delays)
+            for dependent in sorted(dependents[current]):
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    heapq.heappush(ready, (components[dependent][0], dependent))
+
+    def _versions(self, layer: neuron.Neurons) -> tuple[int, ...]:
+        """The versions of every output a layer takes its inputs from."""
+        return tuple(
+            output.version
+            for inp in layer.inputs.values()
+            if inp.connected
+            for output in _outputs(inp._connected_output)
+        )
+
+    def compute(self) -> np.ndarray:
+        """Compute the layers whose inputs changed, in order."""
+        for layer in self.order:
+            versions = self._versions(layer)
+            if self._seen.get(id(layer)) == versions:
+                continue
+            values = layer.evaluate()
+            self._seen[id(layer)] = versions
+            if not np.array_equal(values, layer.output.values):
+                layer.output.values = values
+        return self.values
+
+    def learn(self) -> None:
+        """Adjust the synapses to learn, so all layers need computing again."""
+        super().learn()
+        self._seen.clear()
+
+    def __getstate__(self) -> dict:
+        """Get the state for pickling, forgetting which layers were computed."""
+        return {**super().__getstate__(), "_seen": {}}
@@ -1,6 +1,7 @@
 """Module for handling a sensory layer."""
 
 import abc
+from collections.abc import Sequence
 
 import numpy as np
 
@@ -36,6 +37,23 @@ class Encoder[T](abc.ABC):
         """
         raise NotImplementedError()
 
+    def encode_many(self, values: Sequence[T]) -> np.ndarray:
+        """Encode a sequence of values.
+
+        Encoders that can encode many values faster than one at a time
+        override this.
+
+        Args:
+            values: The values to encode, in order
+
+        Returns:
+            A matrix with the encoding of each value in its rows.
+        """
+        encoded = np.empty((len(values),) + tuple(self.shape))
+        for i, value in enumerate(values):
+            encoded[i] = self.encode(value)
+        return encoded
+
 
 class Sensor[T]:
     """A class for handling input data."""
@@ -51,6 +69,23 @@ class Sensor[T]:
         self._value = value
         self.output.values = self._encoder.encode(value)
 
+    def feed_many(self, values: Sequence[T]) -> np.ndarray:
+        """Feed a sequence of values to the sensor.
+
+        The sensor is left holding the last value of the sequence.
+
+        Args:
+            values: The values to feed, in order
+
+        Returns:
+            A matrix with the encoding of each value in its rows.
+        """
+        encoded = self._encoder.encode_many(values)
+        if len(values):
+            self._value = values[-1]
+            self.output.values = encoded[-1]
+        return encoded
+
     @property
     def value(self) -> T:
         """Get the value encoded by this sensor."""
@@ -1,13 +1,66 @@
 """Module for handling neuron connections."""
 
+import functools
 import logging
-from typing import Callable
+from collections.abc import Callable, Sequence
 
 import numpy as np
+import numpy.typing as npt
 
 
 log = logging.getLogger(__name__)
 
+# The name of the input that neurons are fed by unless stated otherwise.
+MAIN_INPUT = "main"
+
+# Supported types for storing synapses. Synapses stored as uint8 are fixed-point
+# permanences, where PERMANENCE_SCALE represents a weight of 1.
+DTYPES = tuple(np.dtype(t) for t in (np.float64, np.float32, np.float16, np.uint8))
+PERMANENCE_SCALE = 255
+
+# Number of random weights generated at a time when creating synapses.
+_CHUNK_SIZE = 1 << 22
+
+
+def resolution(dtype: npt.DTypeLike) -> float:
+    """The weight represented by one unit of synapses of the given type.
+
+    Args:
+        dtype: The type of the stored synapses
+
+    Returns:
+        The weight of a stored value of 1
+    """
+    return 1 / PERMANENCE_SCALE if np.dtype(dtype) == np.uint8 else 1.0
+
+
+def quantize(weights: np.ndarray, dtype: npt.DTypeLike) -> np.ndarray:
+    """Convert synapses to the given storage type.
+
+    Args:
+        weights: The synapses to convert
+        dtype: The type to store them as
+
+    Returns:
+        The converted synapses, or the same ones if already of the right type
+    """
+    dtype = np.dtype(dtype)
+    if isinstance(weights, SparseSynapses):
+        return SparseSynapses(
+            weights.indptr,
+            weights.indices,
+            quantize(weights.data, dtype),
+            weights.shape,
+        )
+    weights = np.asarray(weights)
+    if weights.dtype == dtype:
+        return weights
+    if weights.dtype == np.uint8:
+        return (weights / PERMANENCE_SCALE).astype(dtype)
+    if dtype == np.uint8:
+        return np.rint(weights * PERMANENCE_SCALE).astype(dtype)
+    return weights.astype(dtype)
+
 
 class Input:
     """An input connection with synapses.
@@ -16,19 +69,44 @@ class Input:
     to an output.
     """
 
-    def __init__(self, name: str, shape: tuple[int, ...] | int):
+    def __init__(
+        self,
+        name: str,
+        shape: tuple[int, ...] | int,
+        dtype: npt.DTypeLike = np.float64,
+        density: float = 1.0,
+    ):
         """Initialize the input.
 
         Args:
             name: The name of the input
             shape: The shape of the neurons this input is feeding
+            dtype: Optional - the type used to store the synapses. One of
+                float64, float32, float16 or uint8 for fixed-point permanences
+            density: Optional - the fraction of all possible synapses to create.
+                Below 1, synapses are stored as SparseSynapses
         """
         if isinstance(shape, int):
             shape = (shape,)
+        if np.dtype(dtype) not in DTYPES:
+            raise ValueError(f"Unsupported synapse type {dtype}")
+        if not 0 < density <= 1:
+            raise ValueError(f"Synapse density must be in (0, 1], got {density}")
         self.name = name
         self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.density = density
         self.synapses = None
         self._connected_output = None
+        self._stack = None
+
+    def __getstate__(self) -> dict:
+        """Get the state for pickling, without any stack of synapses.
+
+        The synapses of a stacked input are a view that no longer shares memory
+        with the stack once unpickled, so the stack gets rebuilt instead.
+        """
+        return {**self.__dict__, "_stack": None}
 
     @property
     def connected(self) -> bool:
@@ -52,12 +130,23 @@ class Input:
             log.warning("Skipping reconnection of input-output pair")
             return  # Skip
 
-        if synapse_function is None:
-            synapse_function = Input._create_synapses
+        if synapse_function is None and self.density < 1:
+            synapse_function = functools.partial(
+                Input._create_sparse_synapses, density=self.density, dtype=self.dtype
+            )
+        elif synapse_function is None:
+            synapse_function = functools.partial(
+                Input._create_synapses, dtype=self.dtype
+            )
 
-        self.synapses = synapse_function(output.shape, self.shape)
+        self.synapses = quantize(synapse_function(output.shape, self.shape), self.dtype)
         self._connected_output = output
 
+    @property
+    def resolution(self) -> float:
+        """The weight represented by one unit of the stored synapses."""
+        return resolution(self.dtype if self.synapses is None else self.synapses.dtype)
+
     @property
     def values(self) -> np.ndarray:
         """The values available to this input.
@@ -73,21 +162,363 @@ class Input:
         output_shape: tuple[int, ...],
         input_shape: tuple[int, ...],
         symmetric: bool = False,
+        dtype: npt.DTypeLike = np.float64,
     ) -> np.ndarray:
         """Create the synapses between an input and an output.
 
+        The weights are generated in chunks and converted as they go, so that
+        narrower types never need the memory of a full float64 tensor.
+
         Args:
             output_shape: The shape of the output
             input_shape: The shape of the input
             symmetric: Whether to enforce symmetric weights
+            dtype: The type used to store the synapses
 
         Returns:
             A numpy tensor with the right shape and random weights
         """
         shape = output_shape + input_shape
-        strength = np.random.uniform(0, 1, shape)
+        if symmetric:
+            strength = np.random.uniform(0, 1, shape)
+            return quantize((strength + strength.T) / 2, dtype)
+
+        strength = np.empty(shape, dtype=dtype)
+        rows = max(1, _CHUNK_SIZE // max(1, int(np.prod(shape[1:]))))
+        for start in range(0, shape[0], rows):
+            chunk = strength[start : start + rows]
+            chunk[...] = quantize(np.random.uniform(0, 1, chunk.shape), dtype)
+
+        return strength
+
+    @classmethod
+    def _create_sparse_synapses(
+        cls,
+        output_shape: tuple[int, ...],
+        input_shape: tuple[int, ...],
+        density: float,
+        dtype: npt.DTypeLike = np.float64,
+    ) -> "SparseSynapses":
+        """Create a random subset of the synapses between an input and an output.
+
+        Each possible synapse is created with the given probability, so every
+        neuron samples about that fraction of the output. The synapses are
+        picked by drawing the gaps between them, so that the random draws scale
+        with the synapses created rather than with all possible ones.
+
+        Args:
+            output_shape: The shape of the output
+            input_shape: The shape of the input
+            density: The probability of creating each synapse
+            dtype: The type used to store the synapses
+
+        Returns:
+            The synapses in compressed sparse row form, with random weights
+        """
+        shape = (int(np.prod(output_shape)), int(np.prod(input_shape)))
+        index_type = _index_type(shape[1])
+        rows = max(1, _CHUNK_SIZE // max(1, shape[1]))
+        counts, indices, data = [], [], []
+        for start in range(0, shape[0], rows):
+            count = min(rows, shape[0] - start)
+            cells = _sample_cells(count * shape[1], density)
+            chunk_rows, chunk_columns = np.divmod(cells, shape[1])
+            counts.append(np.bincount(chunk_rows, minlength=count))
+            indices.append(chunk_columns.astype(index_type))
+            data.append(quantize(np.random.uniform(0, 1, len(chunk_columns)), dtype))
+
+        if not counts:
+            return SparseSynapses.from_dense(np.zeros(shape, dtype=dtype))
+
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.concatenate(counts), out=indptr[1:])
+        return SparseSynapses(
+            indptr, np.concatenate(indices), np.concatenate(data), shape
+        )
+
+
+def _sample_cells(size: int, probability: float) -> np.ndarray:
+    """Pick each of a number of cells with a probability.
+
+    The gaps between picked cells follow a geometric distribution, so only
+    about one random number is drawn per picked cell rather than one per cell,
+    and the cells come out sorted.
+
+    Args:
+        size: The number of cells
+        probability: The probability of picking each cell
+
+    Returns:
+        The indices of the picked cells, in increasing order
+    """
+    expected = size * probability
+    batch = int(expected + 4 * np.sqrt(expected)) + 16
+    picked, last = [], -1
+    while last < size:
+        positions = last + np.cumsum(np.random.geometric(probability, batch))
+        picked.append(positions)
+        last = positions[-1]
+    cells = np.concatenate(picked)
+    return cells[: np.searchsorted(cells, size)]
+
+
+def _index_type(size: int) -> np.dtype:
+    """The narrowest type able to index the given number of neurons."""
+    return np.dtype(np.int32 if size <= np.iinfo(np.int32).max else np.int64)
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenate the ranges between each pair of starts and stops."""
+    lengths = stops - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(len(offsets))
+
+
+class SparseSynapses:
+    """Synapses between an input and only some of the output's units.
+
+    Stored in compressed sparse row form: the synapses from the output unit i
+    are data[indptr[i]:indptr[i + 1]], each of them feeding the neuron given by
+    the matching entry of indices. They behave like a dense (outputs, neurons)
+    tensor where every missing synapse has a weight of 0.
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        shape: tuple[int, int],
+    ):
+        """Initialize the synapses.
+
+        Args:
+            indptr: Where the synapses of each output unit start, plus the total
+            indices: The neuron fed by each synapse, sorted within each unit
+            data: The weight of each synapse
+            shape: The shape of the equivalent dense tensor
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = tuple(shape)
+        self._columns = None
+        self._rows = None
+
+    @classmethod
+    def from_dense(cls, weights: np.ndarray) -> "SparseSynapses":
+        """Keep the non-zero synapses of a dense tensor.
+
+        Args:
+            weights: An (outputs, neurons) tensor of synapses
+
+        Returns:
+            The same synapses in compressed sparse row form
+        """
+        weights = np.asarray(weights)
+        rows, columns = np.nonzero(weights)
+        indptr = np.zeros(weights.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=weights.shape[0]), out=indptr[1:])
+        return cls(
+            indptr,
+            columns.astype(_index_type(weights.shape[1])),
+            weights[rows, columns],
+            weights.shape,
+        )
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The type used to store the weights."""
+        return self.data.dtype
+
+    @property
+    def nbytes(self) -> int:
+        """The memory used by the synapses."""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def toarray(self) -> np.ndarray:
+        """Convert the synapses into a dense tensor."""
+        dense = np.zeros(self.shape, dtype=self.dtype)
+        dense[self.row_of(np.arange(len(self.data))), self.indices] = self.data
+        return dense
+
+    def rows(self, units: np.ndarray) -> np.ndarray:
+        """Get the positions of the synapses coming from the given output units.
+
+        Args:
+            units: The indices of the output units
+
+        Returns:
+            The positions of their synapses in data and indices
+        """
+        return _ranges(self.indptr[units], self.indptr[units + 1])
+
+    def columns(self, neurons: np.ndarray) -> np.ndarray:
+        """Get the positions of the synapses feeding the given neurons.
+
+        The column order of the synapses is built on first use and cached, as
+        the structure of the synapses never changes.
+
+        Args:
+            neurons: The indices of the neurons
+
+        Returns:
+            The positions of their synapses in data and indices
+        """
+        if self._columns is None:
+            colptr = np.zeros(self.shape[1] + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(self.indices, minlength=self.shape[1]), out=colptr[1:]
+            )
+            self._columns = colptr, np.argsort(self.indices, kind="stable")
+        colptr, order = self._columns
+        return order[_ranges(colptr[neurons], colptr[neurons + 1])]
+
+    def row_of(self, positions: np.ndarray) -> np.ndarray:
+        """Get the output unit that each of the given synapses comes from.
+
+        Args:
+            positions: The positions of the synapses in data and indices
+
+        Returns:
+            The index of the output unit of each synapse
+        """
+        if self._rows is None:
+            self._rows = np.repeat(
+                np.arange(self.shape[0], dtype=self.indices.dtype),
+                np.diff(self.indptr),
+            )
+        return self._rows[positions]
+
+    def dot(self, values: np.ndarray) -> np.ndarray:
+        """Add up the weights of the synapses, weighted by the output values.
+
+        Only the synapses of the active output units are visited.
+
+        Args:
+            values: The values of the output units
+
+        Returns:
+            The activation of each neuron, in units of the stored weights
+        """
+        units = np.flatnonzero(values)
+        positions = self.rows(units)
+        weights = self.data[positions] * np.repeat(
+            np.ravel(values)[units], np.diff(self.indptr)[units]
+        )
+        # Without any active unit bincount gives integers, whatever the weights.
+        return np.bincount(
+            self.indices[positions], weights=weights, minlength=self.shape[1]
+        ).astype(np.float64, copy=False)
+
+    def matmul(self, values: np.ndarray) -> np.ndarray:
+        """Batched version of dot, with the output values of a step in each row.
+
+        Args:
+            values: A (T, outputs) matrix of values
+
+        Returns:
+            A (T, neurons) matrix of activations, in units of the stored weights
+        """
+        steps, units = np.nonzero(values)
+        positions = self.rows(units)
+        lengths = np.diff(self.indptr)[units]
+        weights = self.data[positions] * np.repeat(values[steps, units], lengths)
+        bins = np.repeat(steps, lengths) * self.shape[1] + self.indices[positions]
+        activations = np.bincount(
+            bins, weights=weights, minlength=len(values) * self.shape[1]
+        ).astype(np.float64, copy=False)
+        return activations.reshape(len(values), self.shape[1])
+
+
+class InputStack:
+    """The synapses of several inputs stored as a single contiguous block.
+
+    The synapses of each input become a view of their rows in the block, so
+    they keep being updated in place by learning, while the weighted sum over
+    all the inputs becomes a single product of the stacked values and synapses.
+    """
+
+    def __init__(self, inputs: Sequence[Input], synapses: np.ndarray | None = None):
+        """Stack the synapses of the inputs.
+
+        Args:
+            inputs: The inputs to stack, which must be stackable
+            synapses: Optional - the stacked synapses of the inputs, e.g. mapped
+                from a file, to use instead of concatenating their synapses
+        """
+        self.inputs = tuple(inputs)
+        self.offsets = np.cumsum([0] + [len(inp.synapses) for inp in self.inputs])
+        if synapses is None:
+            synapses = np.concatenate([inp.synapses for inp in self.inputs])
+        elif len(synapses) != self.offsets[-1]:
+            raise ValueError(
+                f"Expected {self.offsets[-1]} rows of stacked synapses, "
+                f"but got {len(synapses)}"
+            )
+        self.synapses = synapses
+        self._views = []
+        for inp, start, stop in zip(self.inputs, self.offsets, self.offsets[1:]):
+            inp.synapses = self.synapses[start:stop]
+            inp._stack = self
+            self._views.append(inp.synapses)
+        self._values = np.empty(
+            len(self.synapses), dtype=np.result_type(self.synapses.dtype, np.float32)
+        )
+
+    @classmethod
+    def of(cls, inputs: Sequence[Input]) -> "InputStack | None":
+        """Get the stack of the given inputs, creating it if necessary.
+
+        Args:
+            inputs: The inputs to stack
+
+        Returns:
+            Their stack, or None if their synapses cannot be stacked
+        """
+        inputs = tuple(inputs)
+        stack = inputs[0]._stack
+        if stack is not None and stack.matches(inputs):
+            return stack
+        return cls(inputs) if cls.stackable(inputs) else None
+
+    @staticmethod
+    def stackable(inputs: Sequence[Input]) -> bool:
+        """Whether the synapses of the given inputs can be stacked."""
+        weights = [inp.synapses for inp in inputs]
+        return all(
+            isinstance(w, np.ndarray)
+            and w.ndim == 2
+            and w.dtype == weights[0].dtype
+            and w.shape[1] == weights[0].shape[1]
+            for w in weights
+        )
+
+    def matches(self, inputs: tuple[Input, ...]) -> bool:
+        """Whether this stack still holds the synapses of the given inputs."""
+        return self.inputs == inputs and all(
+            inp.synapses is view for inp, view in zip(inputs, self._views)
+        )
+
+    @property
+    def resolution(self) -> float:
+        """The weight represented by one unit of the stored synapses."""
+        return resolution(self.synapses.dtype)
+
+    def values(self, gains: Sequence[float]) -> np.ndarray:
+        """Stack the values of the inputs, each scaled by its gain.
 
-        return (strength + strength.T) / 2 if symmetric else strength
+        Args:
+            gains: The gain of each input
+
+        Returns:
+            The stacked values, in a buffer that is reused on every call
+        """
+        for inp, gain, start, stop in zip(
+            self.inputs, gains, self.offsets, self.offsets[1:]
+        ):
+            np.multiply(np.ravel(inp.values), gain, out=self._values[start:stop])
+        return self._values
 
 
 class Output:
@@ -102,6 +533,9 @@ class Output:
         if isinstance(shape, int):
             shape = (shape,)
         self._values = np.zeros(shape)
+        self._bound = False
+        self._buffers = None
+        self.version = 0
         self.shape = self._values.shape
 
     @property
@@ -117,7 +551,63 @@ class Output:
                 "Dimension mismatch when specifying output values. "
                 "Expected {0}, but got {1}".format(self.shape, vals.shape)
             )
-        self._values = vals
+        if self._bound:
+            np.copyto(self._values, vals)
+        else:
+            self._values = vals
+        self.version += 1
+
+    def spare(self) -> np.ndarray:
+        """A preallocated array to compute the next values into.
+
+        Outputs own two such arrays, and the spare one is whichever is not
+        holding the current values. Setting the values to the spare array thus
+        alternates between both without allocating, and the current values stay
+        readable while the next ones are being computed.
+
+        Returns:
+            An array with the shape of the output, overwritten on every step
+        """
+        if self._buffers is None:
+            self._buffers = (np.zeros(self.shape), np.zeros(self.shape))
+        first, second = self._buffers
+        return second if self._values is first else first
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore the state, unbound until whatever bound the output does again."""
+        self.__dict__.update(state)
+        self._bound = False
+
+    def bind(self, buffer: np.ndarray) -> None:
+        """Keep the values of this output in the given buffer.
+
+        The current values are copied into the buffer, and so are any values
+        set from then on. The values are thus always the same array, which is
+        overwritten whenever they are set. An output can only be bound to one
+        buffer at a time, as whatever bound it reads the values from there.
+
+        Args:
+            buffer: An array with the shape of the output, usually a view
+        """
+        if self._bound:
+            raise ValueError("Output is already bound, unbind it first")
+        if buffer.shape != self.shape:
+            raise ValueError(
+                "Dimension mismatch when binding output values. "
+                f"Expected {self.shape}, but got {buffer.shape}"
+            )
+        np.copyto(buffer, self._values)
+        self._values = buffer
+        self._bound = True
+
+    def unbind(self) -> None:
+        """Keep the values of this output in an array of its own again.
+
+        Whatever bound the output no longer sees the values set from then on.
+        """
+        if self._bound:
+            self._values = self._values.copy()
+            self._bound = False
 
     def __getitem__(self, idxs) -> "OutputSlice":
         """Slice the Output."""
@@ -130,26 +620,66 @@ class Output:
 
 
 class OutputMerge(Output):
-    """Output that merges two or more outputs."""
+    """Output that merges two or more outputs.
 
-    def __init__(self, *outputs: Output, axis: int | None = None):
+    When shared, the merged outputs are bound to slices of a single array, so
+    the merged values are a view of it that needs no copying. Otherwise, the
+    merged values are concatenated when read and kept until any of the merged
+    outputs is set again. A shared merge falls back to concatenating once any
+    of the merged outputs is unbound.
+    """
+
+    def __init__(self, *outputs: Output, axis: int | None = None, shared: bool = False):
         """Initialize the output.
 
         Args:
             outputs: Outputs to merge
             axis: Axis along which to concatenate them
+            shared: Optional - whether the merged outputs should store their
+                values in slices of the merged values, if they can
         """
         if not outputs:
             raise ValueError("Need at least two outputs to merge")
 
+        outputs = tuple(
+            output if isinstance(output, Output) else output.output
+            for output in outputs
+        )
         if axis is None:
             axis = self.pick_axis(outputs)
+        elif not self._can_merge(outputs, axis):
+            raise ValueError(
+                "Cannot merge outputs of shapes "
+                f"{[output.shape for output in outputs]} along axis {axis}"
+            )
 
         self._axis = axis
         self._outputs = outputs
-        self.shape = np.concatenate(
-            [output.values for output in self._outputs], axis=axis
-        ).shape
+        self.shape = self._merged_shape(outputs, axis)
+        self._merged = None
+        self._versions = None
+        self.shared = shared and all(
+            type(output) is Output and not output._bound for output in outputs
+        )
+        if self.shared:
+            self._bind_outputs(np.zeros(self.shape))
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore the state, binding the merged outputs to the values again."""
+        self.__dict__.update(state)
+        if self.shared:
+            self._bind_outputs(self._merged)
+
+    def _bind_outputs(self, merged: np.ndarray) -> None:
+        """Bind the merged outputs to their slices of the merged values."""
+        self._merged = merged
+        start = 0
+        for output in self._outputs:
+            stop = start + output.shape[self._axis]
+            index = (slice(None),) * self._axis + (slice(start, stop),)
+            output.bind(merged[index])
+            start = stop
+        self._slices = [output.values for output in self._outputs]
 
     def _merge(self, outputs: tuple[Output], axis: int) -> np.ndarray:
         """Merge the output values.
@@ -160,6 +690,24 @@ class OutputMerge(Output):
         """
         return np.concatenate([output.values for output in outputs], axis=axis)
 
+    @staticmethod
+    def _can_merge(outputs: tuple[Output], axis: int) -> bool:
+        """Whether the outputs can be concatenated along the given axis."""
+        shape = outputs[0].shape
+        if not 0 <= axis < len(shape):
+            return False
+        rest = shape[:axis] + shape[axis + 1 :]
+        return all(
+            output.shape[:axis] + output.shape[axis + 1 :] == rest for output in outputs
+        )
+
+    @staticmethod
+    def _merged_shape(outputs: tuple[Output], axis: int) -> tuple[int, ...]:
+        """The shape of the outputs concatenated along the given axis."""
+        shape = list(outputs[0].shape)
+        shape[axis] = sum(output.shape[axis] for output in outputs)
+        return tuple(shape)
+
     def pick_axis(self, outputs: tuple[Output]) -> int:
         """Pick an axis for concatenating the outputs.
 
@@ -174,21 +722,35 @@ class OutputMerge(Output):
         """
         axis_options = range(len(outputs[0].shape))
         for axis in axis_options:
-            try:
-                self._merge(outputs, axis)
+            if self._can_merge(outputs, axis):
                 return axis
-            except Exception:
-                pass
         raise ValueError(
             "No single axis can be used to merge outputs of shapes {}".format(
                 [output.shape for output in outputs]
             )
         )
 
+    @property
+    def version(self) -> int:
+        """A number that changes whenever any of the merged outputs is set."""
+        return sum(output.version for output in self._outputs)
+
     @property
     def values(self) -> np.ndarray:
-        """Concatenate the values from the merged outputs."""
-        return self._merge(self._outputs, self._axis)
+        """The values from the merged outputs, concatenated."""
+        if self.shared:
+            if all(
+                output.values is values
+                for output, values in zip(self._outputs, self._slices)
+            ):
+                return self._merged
+            # An output was unbound since, so the merged values are stale.
+            self.shared = False
+        versions = tuple(output.version for output in self._outputs)
+        if versions != self._versions:
+            self._merged = self._merge(self._outputs, self._axis)
+            self._versions = versions
+        return self._merged
 
 
 class OutputSlice(Output):
@@ -209,6 +771,11 @@ class OutputSlice(Output):
         """The shape of the output."""
         return self.values.shape
 
+    @property
+    def version(self) -> int:
+        """A number that changes whenever the original output is set."""
+        return self._output.version
+
     @property
     def values(self) -> np.ndarray:
         """Slice the values from the internal output."""
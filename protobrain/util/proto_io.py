@@ -1,18 +1,72 @@
-"""Module for writing and reading multiple protobufs to a file."""
+"""Module for writing and reading multiple protobufs to a file.
+
+Each protobuf is written as a record made of its length, in 4 big endian
+bytes, followed by its serialized bytes. Writers can also keep an index in a
+sidecar file, holding the offset of every record as a little endian int64, so
+that readers can go straight to any record.
+"""
 
 import io
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from typing import Self
+
+import numpy as np
+
+INDEX_SUFFIX = ".idx"
+
+_LENGTH_BYTES = 4
+_OFFSET_TYPE = np.dtype("<i8")
+
+
+def index_path(path: str) -> str:
+    """The path of the index of a file of protobufs.
+
+    Args:
+        path: The path of the file of protobufs
+
+    Returns:
+        The path of its sidecar index
+    """
+    return os.fspath(path) + INDEX_SUFFIX
 
 
 class ProtoWriter:
     """Class for writing multiple protobufs to a file."""
 
-    def __init__(self, open_file: io.BufferedWriter):
+    def __init__(
+        self,
+        open_file: io.BufferedWriter,
+        index_file: io.BufferedWriter | None = None,
+        buffer_size: int = 0,
+    ):
         """Initialize the ProtoWriter.
 
         Args:
             open_file: An open binary file for writing the protobufs
+            index_file: Optional - an open binary file for writing the offset of
+                every protobuf, see index_path
+            buffer_size: Optional - the number of bytes to gather before writing
+                them all at once, in which case the writer needs to be flushed
+                or used as a context manager
         """
         self.open_file = open_file
+        self.index_file = index_file
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._offsets = []
+        self._position = open_file.tell() if index_file is not None else 0
+
+    def __enter__(self) -> Self:
+        """Use the writer in a with statement, which flushes it at the end."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Write anything left in the buffer."""
+        self.flush()
 
     def write(self, proto):
         """Write the protobuf to the file.
@@ -21,9 +75,22 @@ class ProtoWriter:
             proto: A protobuf object to write.
         """
         proto_bytes = proto.SerializeToString()
-        length_bytes = len(proto_bytes).to_bytes(4, "big")
-        self.open_file.write(length_bytes)
-        self.open_file.write(proto_bytes)
+        if self.index_file is not None:
+            self._offsets.append(self._position)
+            self._position += _LENGTH_BYTES + len(proto_bytes)
+
+        self._buffer += len(proto_bytes).to_bytes(_LENGTH_BYTES, "big")
+        self._buffer += proto_bytes
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered protobufs and their offsets to the files."""
+        self.open_file.write(self._buffer)
+        self._buffer.clear()
+        if self.index_file is not None and self._offsets:
+            self.index_file.write(np.array(self._offsets, _OFFSET_TYPE).tobytes())
+            self._offsets.clear()
 
 
 class ProtoReader:
@@ -42,7 +109,7 @@ class ProtoReader:
     def __iter__(self):
         """Iterate over the protobufs in the file."""
         while True:
-            length_bytes = self.open_file.read(4)
+            length_bytes = self.open_file.read(_LENGTH_BYTES)
             if not length_bytes:
                 break
 
@@ -50,3 +117,416 @@ class ProtoReader:
 
             proto_bytes = self.open_file.read(length)
             yield self.proto_class.FromString(proto_bytes)
+
+
+def build_index(path: str, write: bool = True) -> np.ndarray:
+    """Find the offset of every protobuf in a file by scanning it once.
+
+    Args:
+        path: The path of the file of protobufs
+        write: Optional - whether to save the offsets as the index of the file
+
+    Returns:
+        The offset of every protobuf in the file
+    """
+    offsets = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        position = 0
+        while position + _LENGTH_BYTES <= size:
+            offsets.append(position)
+            length = int.from_bytes(f.read(_LENGTH_BYTES), "big", signed=False)
+            position += _LENGTH_BYTES + length
+            f.seek(position)
+
+    offsets = np.array(offsets, _OFFSET_TYPE)
+    if write:
+        offsets.tofile(index_path(path))
+    return offsets
+
+
+def _index_matches(offsets: np.ndarray, data) -> bool:
+    """Whether an index holds the offsets of the protobufs in the given data.
+
+    Only the first and last offsets are checked, which is enough to find the
+    indices left behind when the file was appended to or rewritten.
+    """
+    if not len(offsets):
+        return not len(data)
+    last = int(offsets[-1])
+    if offsets[0] != 0 or not 0 <= last <= len(data) - _LENGTH_BYTES:
+        return False
+    length = int.from_bytes(data[last : last + _LENGTH_BYTES], "big")
+    return last + _LENGTH_BYTES + length == len(data)
+
+
+class IndexedProtoReader:
+    """Class for reading any of the protobufs in a file through a memory map.
+
+    The offsets of the protobufs are taken from the index of the file, which
+    gets built by scanning the file if missing or if it does not match the
+    file any more. Slicing gives another reader over some of the protobufs,
+    without reading or copying any of them.
+
+    The reader keeps the file mapped until it is closed, with close or at the
+    end of a with statement.
+    """
+
+    def __init__(self, path: str, proto_class, offsets: np.ndarray | None = None):
+        """Initialize the reader.
+
+        Args:
+            path: The path of the file of protobufs
+            proto_class: The class of the protobufs to decode
+            offsets: Optional - the offsets of the protobufs to read, taken from
+                the index of the file by default
+        """
+        self.path = path
+        self.proto_class = proto_class
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+
+        if offsets is None:
+            index = index_path(path)
+            if not os.path.exists(index):
+                offsets = build_index(path)
+            elif os.path.getsize(index):
+                offsets = np.memmap(index, _OFFSET_TYPE, "r")
+            else:
+                offsets = np.zeros(0, _OFFSET_TYPE)
+            if not _index_matches(offsets, self._map):
+                # Unmap the stale index before it gets overwritten.
+                del offsets
+                offsets = build_index(path)
+        self.offsets = offsets
+
+    def __enter__(self) -> Self:
+        """Use the reader in a with statement, which closes it at the end."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the reader."""
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file and its index, after which no protobuf can be read."""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = b""
+        self.offsets = np.zeros(0, _OFFSET_TYPE)
+
+    def __len__(self) -> int:
+        """The number of protobufs that can be read."""
+        return len(self.offsets)
+
+    def __getitem__(self, index: int | slice):
+        """Read a protobuf, or get a reader for a slice of them.
+
+        Args:
+            index: The position of the protobuf, or a slice of positions
+
+        Returns:
+            The decoded protobuf, or a reader over the sliced protobufs
+        """
+        if isinstance(index, slice):
+            return IndexedProtoReader(self.path, self.proto_class, self.offsets[index])
+        return self.proto_class.FromString(self.raw(index))
+
+    def __iter__(self):
+        """Iterate over the protobufs in order."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def raw(self, index: int) -> bytes:
+        """The serialized bytes of a protobuf, without decoding them.
+
+        Args:
+            index: The position of the protobuf
+
+        Returns:
+            The bytes of the protobuf
+        """
+        start = int(self.offsets[index]) + _LENGTH_BYTES
+        length = int.from_bytes(self._map[start - _LENGTH_BYTES : start], "big")
+        return self._map[start : start + length]
+
+
+BLOCK_MAGIC = b"PBBLOCK1"
+ZLIB = "zlib"
+LZMA = "lzma"
+
+_CODECS = {
+    ZLIB: (1, zlib.compress, zlib.decompress),
+    LZMA: (2, lzma.compress, lzma.decompress),
+}
+_BLOCK_HEADER = struct.Struct(">II")
+_INDEX_ENTRY = struct.Struct("<qq")
+_FOOTER = struct.Struct("<q")
+_SDR = "protobrain.proto.SparseDistributedRepresentation"
+
+
+def _sdrs(proto):
+    """Find every SparseDistributedRepresentation within a protobuf."""
+    for field, value in proto.ListFields():
+        if field.message_type is None:
+            continue
+        for message in value if field.is_repeated else [value]:
+            if message.DESCRIPTOR.full_name == _SDR:
+                yield message
+            else:
+                yield from _sdrs(message)
+
+
+def _delta_encode(proto):
+    """Replace the on bits of every representation by their differences."""
+    for sdr in _sdrs(proto):
+        on_bits = np.asarray(sdr.on_bits, dtype=np.int64)
+        sdr.on_bits[:] = np.diff(on_bits, prepend=0).tolist()
+    return proto
+
+
+def _delta_decode(proto):
+    """Restore the on bits of every representation from their differences."""
+    for sdr in _sdrs(proto):
+        sdr.on_bits[:] = np.cumsum(sdr.on_bits, dtype=np.int64).tolist()
+    return proto
+
+
+class BlockWriter:
+    """Class for writing protobufs to a file in compressed blocks.
+
+    Protobufs are gathered into blocks of records like those of a ProtoWriter,
+    and each block is compressed on its own. The on bits of every sparse
+    distributed representation are stored as the differences between
+    consecutive bits, which are small for sorted bits and so compress well.
+    Closing the writer appends an index of the blocks, to read any protobuf
+    without decompressing the blocks before it.
+
+    The file starts with BLOCK_MAGIC and a byte for the compression and delta
+    encoding. Each block is its compressed size and number of protobufs, as
+    two big endian uint32, followed by the compressed records. An empty block
+    ends the blocks, followed by the offset and first protobuf of every block,
+    as pairs of little endian int64, and by the offset of this index.
+    """
+
+    def __init__(
+        self,
+        open_file: io.BufferedWriter,
+        compression: str = ZLIB,
+        block_size: int = 1024,
+        delta: bool = True,
+    ):
+        """Initialize the BlockWriter.
+
+        Args:
+            open_file: An open binary file for writing the protobufs
+            compression: Optional - either ZLIB or LZMA
+            block_size: Optional - the number of protobufs in each block
+            delta: Optional - whether to store the differences between the on
+                bits of sparse distributed representations
+        """
+        if compression not in _CODECS:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+        self.open_file = open_file
+        self.block_size = block_size
+        self.delta = delta
+        codec, self._compress, _ = _CODECS[compression]
+        self._records = ProtoWriter(io.BytesIO())
+        self._count = 0
+        self._index = []
+        self._written = 0
+        self._closed = False
+
+        self.open_file.write(BLOCK_MAGIC + bytes([codec | delta << 7]))
+        self._position = len(BLOCK_MAGIC) + 1
+
+    def __enter__(self) -> Self:
+        """Use the writer in a with statement, which closes it at the end."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Write the last block and the index."""
+        self.close()
+
+    def write(self, proto):
+        """Add a protobuf to the current block, writing it once full.
+
+        Args:
+            proto: A protobuf object to write.
+        """
+        if self.delta:
+            copy = type(proto)()
+            copy.CopyFrom(proto)
+            proto = _delta_encode(copy)
+        self._records.write(proto)
+        self._count += 1
+        if self._count >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Compress and write the current block, if it has any protobufs."""
+        if not self._count:
+            return
+        records = self._records.open_file
+        compressed = self._compress(records.getvalue())
+        self.open_file.write(_BLOCK_HEADER.pack(len(compressed), self._count))
+        self.open_file.write(compressed)
+        self._index.append((self._position, self._written))
+        self._position += _BLOCK_HEADER.size + len(compressed)
+        self._written += self._count
+        self._count = 0
+        records.seek(0)
+        records.truncate()
+
+    def close(self):
+        """Write the last block, the end of the blocks and their index."""
+        if self._closed:
+            return
+        self.flush()
+        self.open_file.write(_BLOCK_HEADER.pack(0, 0))
+        index_start = self._position + _BLOCK_HEADER.size
+        for entry in self._index:
+            self.open_file.write(_INDEX_ENTRY.pack(*entry))
+        self.open_file.write(_FOOTER.pack(index_start))
+        self._closed = True
+
+
+class BlockReader:
+    """Class for reading protobufs written by a BlockWriter.
+
+    Iterating decompresses one block at a time, so files of any size can be
+    streamed. Indexing finds the block of a protobuf from the index at the end
+    of the file, and keeps the last decompressed block for nearby reads.
+    """
+
+    def __init__(self, open_file: io.BufferedReader, proto_class):
+        """Initialize the BlockReader.
+
+        Args:
+            open_file: An open binary file to read the protobufs from
+            proto_class: The class of the protobufs to decode
+        """
+        self.open_file = open_file
+        self.proto_class = proto_class
+
+        header = open_file.read(len(BLOCK_MAGIC) + 1)
+        if header[: len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+            raise ValueError("Not a file of protobuf blocks")
+        codec = header[-1] & 0x7F
+        self.delta = bool(header[-1] >> 7)
+        (self._decompress,) = [
+            decompress for c, _, decompress in _CODECS.values() if c == codec
+        ]
+        self._start = open_file.tell()
+        self._index = None
+        self._cached = None
+
+    def _blocks(self):
+        """Iterate over the decompressed records of every block, in order."""
+        self.open_file.seek(self._start)
+        while True:
+            header = self.open_file.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                break
+            size, count = _BLOCK_HEADER.unpack(header)
+            if not count:
+                break
+            yield self._decompress(self.open_file.read(size))
+
+    def _decode(self, records: bytes) -> list:
+        """Decode every protobuf in the records of a block."""
+        reader = ProtoReader(io.BytesIO(records), self.proto_class)
+        return [_delta_decode(p) if self.delta else p for p in reader]
+
+    def __iter__(self):
+        """Iterate over the protobufs in the file."""
+        for records in self._blocks():
+            yield from self._decode(records)
+
+    @property
+    def index(self) -> np.ndarray:
+        """The offset and first protobuf of every block, and the total count.
+
+        The last row holds the end of the blocks and the number of protobufs.
+        Files that were not closed have no index, so their blocks get scanned.
+        """
+        if self._index is None:
+            index = self._read_index()
+            if index is None:
+                index = self._scan()
+            self._index = np.vstack([index, [[0, self._count(index)]]])
+        return self._index
+
+    def _read_index(self) -> np.ndarray | None:
+        """Read the index at the end of the file, if the file was closed."""
+        end = self.open_file.seek(0, os.SEEK_END)
+        if end < self._start + _BLOCK_HEADER.size + _FOOTER.size:
+            return None
+        self.open_file.seek(end - _FOOTER.size)
+        (index_start,) = _FOOTER.unpack(self.open_file.read(_FOOTER.size))
+        index_size = end - _FOOTER.size - index_start
+        if index_start < self._start + _BLOCK_HEADER.size or index_size < 0:
+            return None
+        if index_size % _INDEX_ENTRY.size:
+            return None
+        self.open_file.seek(index_start - _BLOCK_HEADER.size)
+        if _BLOCK_HEADER.unpack(self.open_file.read(_BLOCK_HEADER.size)) != (0, 0):
+            return None
+        entries = self.open_file.read(index_size)
+        return np.frombuffer(entries, "<i8").reshape(-1, 2).astype(np.int64)
+
+    def _scan(self) -> np.ndarray:
+        """Find the offset and first protobuf of every block by reading them."""
+        entries, first = [], 0
+        self.open_file.seek(self._start)
+        while True:
+            position = self.open_file.tell()
+            header = self.open_file.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                break
+            size, count = _BLOCK_HEADER.unpack(header)
+            if not count:
+                break
+            entries.append((position, first))
+            first += count
+            self.open_file.seek(size, os.SEEK_CUR)
+        return np.array(entries, dtype=np.int64).reshape(-1, 2)
+
+    def _count(self, index: np.ndarray) -> int:
+        """The number of protobufs, from the first protobuf of the last block."""
+        if not len(index):
+            return 0
+        self.open_file.seek(index[-1, 0])
+        _, count = _BLOCK_HEADER.unpack(self.open_file.read(_BLOCK_HEADER.size))
+        return int(index[-1, 1]) + count
+
+    def __len__(self) -> int:
+        """The number of protobufs in the file."""
+        return int(self.index[-1, 1])
+
+    def __getitem__(self, index: int):
+        """Read the protobuf at the given position.
+
+        Args:
+            index: The position of the protobuf
+
+        Returns:
+            The decoded protobuf
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Protobuf {index} out of range")
+
+        block = int(np.searchsorted(self.index[:-1, 1], index, side="right")) - 1
+        if self._cached is None or self._cached[0] != block:
+            self.open_file.seek(self.index[block, 0])
+            size, _ = _BLOCK_HEADER.unpack(self.open_file.read(_BLOCK_HEADER.size))
+            records = self._decompress(self.open_file.read(size))
+            self._cached = block, self._decode(records)
+        return self._cached[1][index - self.index[block, 1]]
@@ -110,8 +110,8 @@ def encode_neurons(neurons, out=None):
         The protobuf
     """
     cortex = out or snapshot_pb2.CortexSnapshot()
-    if neurons.passthrough:
-        for layer in neurons.layers:
+    if isinstance(neurons, neuron.LayeredNeurons):
+        for layer in neurons.leaves():
             encode_sdr(layer.values, cortex.sdr.add())
     else:
         encode_sdr(neurons.values, cortex.sdr.add())
@@ -0,0 +1,133 @@
+"""Tests for experiment module."""
+
+import pytest
+
+experiment_pb2 = pytest.importorskip("protobrain.proto.experiment_pb2")
+
+from protobrain.cli import experiment
+from protobrain.proto import encoder_pb2
+from protobrain.proto import snapshot_pb2
+from protobrain.util import proto_io
+
+
+def create_experiment(values=()):
+    exp = experiment_pb2.Experiment()
+    exp.encoder.type = encoder_pb2.Encoder.NUMERICAL_CYCLIC
+    exp.encoder.shape.extend([30])
+    exp.encoder.Extensions[encoder_pb2.CyclicEncoder.cyclic_encoder].max_value = 10
+    exp.cortex.layer.extend([20, 10])
+    for value in values:
+        exp.input.add().int = value
+    return exp
+
+
+def read_snapshots(path):
+    with open(path, "rb") as f:
+        return list(proto_io.ProtoReader(f, snapshot_pb2.Snapshot))
+
+
+def test_run(tmp_path):
+    path = tmp_path / "snapshots"
+
+    steps = experiment.run(create_experiment([1, 2, 3]), path)
+
+    snapshots = read_snapshots(path)
+    assert steps == 3
+    assert len(snapshots) == 3
+    assert [len(s.cortex.sdr) for s in snapshots] == [2, 2, 2]
+    assert list(snapshots[0].sensor.sdr.shape) == [30]
+    assert len(proto_io.IndexedProtoReader(path, snapshot_pb2.Snapshot)) == 3
+
+
+def test_run_streamed_inputs(tmp_path):
+    inputs_path = tmp_path / "inputs"
+    with open(inputs_path, "wb") as f:
+        writer = proto_io.ProtoWriter(f)
+        for value in range(5):
+            sensor_value = encoder_pb2.SensorValue()
+            sensor_value.int = value
+            writer.write(sensor_value)
+    path = tmp_path / "snapshots"
+
+    steps = experiment.run(
+        create_experiment([7]), path, experiment.read_inputs(inputs_path)
+    )
+
+    assert steps == 5
+    assert len(read_snapshots(path)) == 5
+
+
+def test_read_inputs_lazily(tmp_path):
+    inputs_path = tmp_path / "inputs"
+    with open(inputs_path, "wb") as f:
+        writer = proto_io.ProtoWriter(f)
+        for value in (1.5, 2.5):
+            sensor_value = encoder_pb2.SensorValue()
+            sensor_value.float = value
+            writer.write(sensor_value)
+
+    inputs = experiment.read_inputs(inputs_path)
+
+    assert next(inputs) == 1.5
+    assert list(inputs) == [2.5]
+
+
+def write_experiments(tmp_path, count):
+    pairs = []
+    for i in range(count):
+        path = tmp_path / f"experiment_{i}"
+        path.write_bytes(create_experiment(range(i + 1)).SerializeToString())
+        pairs.append((str(path), str(tmp_path / f"output_{i}")))
+    return pairs
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_many(tmp_path, jobs):
+    pairs = write_experiments(tmp_path, 3)
+    pairs.insert(1, (str(tmp_path / "missing"), str(tmp_path / "output")))
+
+    results = experiment.run_many(pairs, jobs)
+
+    assert [steps for steps, _ in results] == [1, 0, 2, 3]
+    assert [error is None for _, error in results] == [True, False, True, True]
+    assert "FileNotFoundError" in results[1][1]
+    assert len(read_snapshots(pairs[3][1])) == 3
+
+
+def test_run_many_logs_traceback(tmp_path, caplog):
+    pairs = [(str(tmp_path / "missing"), str(tmp_path / "output"))]
+
+    experiment.run_many(pairs)
+
+    (record,) = caplog.records
+    assert "missing failed" in record.getMessage()
+    assert record.exc_info[0] is FileNotFoundError
+
+
+def test_read_manifest(tmp_path):
+    path = tmp_path / "manifest"
+    path.write_text("# experiments\nfirst out_1\n\n  second\tout_2  \n")
+
+    assert experiment.read_manifest(path) == [("first", "out_1"), ("second", "out_2")]
+
+
+def test_read_manifest_invalid(tmp_path):
+    path = tmp_path / "manifest"
+    path.write_text("first out_1\nsecond\n")
+
+    with pytest.raises(ValueError, match=":2:"):
+        experiment.read_manifest(path)
+
+
+def test_summarize():
+    pairs = [("first", "out_1"), ("second", "out_2")]
+
+    summary = experiment.summarize(pairs, [(10, None), (0, "ValueError: bad")], 2)
+
+    assert summary.splitlines() == [
+        "second: ValueError: bad",
+        (
+            "Ran 2 experiments (1 failed), 10 steps in 2.00s: "
+            "1.00 experiments/s, 5.0 steps/s"
+        ),
+    ]
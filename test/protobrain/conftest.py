@@ -0,0 +1,30 @@
+"""Fixtures shared by the tests of the protobrain package."""
+
+import pytest
+import numpy as np
+
+from protobrain import brain
+from protobrain import computation
+from protobrain import learning
+from protobrain import neuron
+from protobrain import sensor
+from protobrain.encoders import numerical
+
+
+@pytest.fixture
+def create_brain():
+    """A function creating a brain of three layers, the middle one looping back."""
+
+    def create(compute=None, dtype=np.float64, density=1.0):
+        np.random.seed(0)
+        layers = [neuron.Neurons(20, dtype=dtype, density=density) for _ in range(3)]
+        neuron.FeedForward(layers)
+        neuron.LoopBack(layers[1:2], "loopback")
+        return brain.Brain(
+            neuron.LayeredNeurons(layers),
+            sensor.Sensor(numerical.CyclicEncoder(0, 10, 30, sparsity=0.2)),
+            computation=compute or computation.SparseComputation(0.2),
+            learning=learning.HebbianLearning(),
+        )
+
+    return create
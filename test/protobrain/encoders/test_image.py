@@ -1,9 +1,12 @@
 """Tests for image encoder module."""
 
+import itertools
+
 import pytest
 
 import numpy as np
 
+from protobrain.encoders import image
 from protobrain.encoders.image import BlackWhiteEncoder
 
 
@@ -15,11 +18,115 @@ from protobrain.encoders.image import BlackWhiteEncoder
         (10, 10, 2),
     ],
 )
-def test_dimensions_correct(height: int, width: int, min_spatial_resolution: int):
+@pytest.mark.parametrize("backend", [None, image.NUMPY])
+def test_dimensions_correct(
+    height: int, width: int, min_spatial_resolution: int, backend: str | None
+):
     """Verify that the encoder dimensions match what it expects."""
     encoder = BlackWhiteEncoder(
-        height=height, width=width, min_spatial_resolution=min_spatial_resolution
+        height=height,
+        width=width,
+        min_spatial_resolution=min_spatial_resolution,
+        backend=backend,
     )
     sample_data = np.random.random((height, width))
     output = encoder.encode(sample_data)
     assert len(output) == encoder.length
+
+
+def reference_encode(encoder: BlackWhiteEncoder, value: np.ndarray) -> np.ndarray:
+    """Encode a single image box by box, as the encoder first did, without noise."""
+    if encoder.normalize:
+        value = value / max(1e-6, value.max())
+    _, _, filter_height, filter_width = encoder.filter.shape
+    rows = range(0, encoder.height - filter_height + 1, max(1, filter_height // 2))
+    columns = range(0, encoder.width - filter_width + 1, max(1, filter_width // 2))
+    levels = [
+        np.array(
+            [
+                [
+                    value[i : i + filter_height, j : j + filter_width].mean()
+                    for j in columns
+                ]
+                for i in rows
+            ]
+        )
+    ]
+    for _ in range(encoder.repeats):
+        level = levels[-1]
+        levels.append(
+            (level[:-1, :-1] + level[1:, :-1] + level[:-1, 1:] + level[1:, 1:]) / 4
+        )
+    averages = np.concatenate([level.ravel() for level in levels])
+    bounds = np.append(encoder.brightness_thresholds, 1)
+    return np.concatenate(
+        [
+            (averages >= low) & (averages <= high)
+            for low, high in itertools.pairwise(bounds)
+        ]
+    )
+
+
+@pytest.mark.parametrize("normalize", [True, False])
+@pytest.mark.parametrize("brightness_buckets", [2, 3])
+@pytest.mark.parametrize("backend", [None, image.NUMPY])
+def test_encode_many(normalize: bool, brightness_buckets: int, backend: str | None):
+    """Verify that encoding a stack of images matches encoding them box by box."""
+    encoder = BlackWhiteEncoder(
+        height=20,
+        width=30,
+        min_spatial_resolution=4,
+        brightness_buckets=brightness_buckets,
+        normalize=normalize,
+        backend=backend,
+    )
+    encoder.noise_value = 0
+    images = np.random.RandomState(0).random((5, 20, 30))
+    images[2] = 0
+
+    encoded = encoder.encode_many(images)
+
+    assert encoded.shape == (5, encoder.length)
+    np.testing.assert_array_equal(
+        encoded, [reference_encode(encoder, i) for i in images]
+    )
+    np.testing.assert_array_equal(encoder.encode(images[0]), encoded[0])
+
+
+@pytest.mark.parametrize(
+    argnames=["height", "width", "min_spatial_resolution", "brightness_buckets"],
+    argvalues=[
+        (20, 20, 3, 2),
+        (20, 30, 4, 3),
+        (64, 48, None, 2),
+    ],
+)
+def test_numpy_matches_torch(
+    height: int, width: int, min_spatial_resolution: int, brightness_buckets: int
+):
+    """Verify that both backends average the images the same way."""
+    pytest.importorskip("torch")
+    encoders = [
+        BlackWhiteEncoder(
+            height=height,
+            width=width,
+            min_spatial_resolution=min_spatial_resolution,
+            brightness_buckets=brightness_buckets,
+            backend=backend,
+        )
+        for backend in (image.TORCH, image.NUMPY)
+    ]
+    for encoder in encoders:
+        encoder.noise_value = 0
+    images = np.random.RandomState(0).random((4, height, width))
+
+    torch_levels, numpy_levels = (e._pyramid(images) for e in encoders)
+    torch_encoded, numpy_encoded = (e.encode_many(images) for e in encoders)
+
+    np.testing.assert_allclose(numpy_levels, torch_levels, atol=1e-6)
+    np.testing.assert_array_equal(numpy_encoded, torch_encoded)
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        BlackWhiteEncoder(height=10, width=10, backend="opencl")
@@ -1,5 +1,8 @@
 # Tests for numerical encoder
 
+import pytest
+import numpy as np
+
 from protobrain.encoders import numerical
 
 
@@ -20,3 +23,52 @@ def test_cyclic():
     assert all([0, 0, 1, 1, 0] == cyclic.encode(3))
     assert all([0, 0, 0, 1, 1] == cyclic.encode(4))
     assert all([1, 0, 0, 0, 1] == cyclic.encode(5))
+
+
+def test_encodings_shared():
+    cyclic = numerical.CyclicEncoder(min_value=1, max_value=5, length=5, sparsity=0.4)
+    encoded = cyclic.encode(2)
+    assert cyclic.encode(2.1) is encoded
+    assert cyclic.encode(3) is not encoded
+    assert not encoded.flags.writeable
+
+
+def test_encodings_limited():
+    fixed_range = numerical.SimpleEncoder(
+        min_value=0, max_value=99, length=100, sparsity=0.1, cache_size=800 * 3
+    )
+    first = fixed_range.encode(0)
+    for value in range(1, 10):
+        fixed_range.encode(value)
+    assert len(fixed_range._encodings) == 3
+    assert fixed_range.encode(0) is not first
+    assert all(fixed_range.encode(0) == first)
+
+
+def test_on_bits():
+    cyclic = numerical.CyclicEncoder(min_value=1, max_value=5, length=5, sparsity=0.4)
+    assert list(cyclic.on_bits(2)) == [1, 2]
+    assert list(cyclic.on_bits(5)) == [4, 0]
+    for value in range(1, 6):
+        assert set(cyclic.on_bits(value)) == set(cyclic.encode(value).nonzero()[0])
+    with pytest.raises(ValueError):
+        cyclic.on_bits(6)
+
+
+@pytest.mark.parametrize("encoder", [numerical.SimpleEncoder, numerical.CyclicEncoder])
+def test_encode_many(encoder):
+    encoder_ = encoder(min_value=-2, max_value=7.5, length=30, sparsity=0.2)
+    values = np.concatenate([[-2, 7.5], np.random.RandomState(0).uniform(-2, 7.5, 50)])
+
+    encoded = encoder_.encode_many(values)
+    indices, offsets = encoder_.on_bits_many(values)
+
+    np.testing.assert_array_equal(encoded, [encoder_.encode(v) for v in values])
+    assert encoder_.encode_many(values, dtype=bool).dtype == bool
+    assert list(offsets) == list(range(0, 6 * 53, 6))
+    for i, value in enumerate(values):
+        assert list(indices[offsets[i] : offsets[i + 1]]) == list(
+            encoder_.on_bits(value)
+        )
+    with pytest.raises(ValueError):
+        encoder_.encode_many([0, 8])
@@ -0,0 +1,118 @@
+"""Tests for the activity recorder."""
+
+import pytest
+import numpy as np
+
+from protobrain import brain
+from protobrain import computation
+from protobrain import neuron
+from protobrain import sensor
+from protobrain.encoders import numerical
+from protobrain.metrics import activity_recorder
+
+
+@pytest.fixture(scope="function")
+def layers():
+    return neuron.FeedForward([neuron.Neurons(10), neuron.Neurons((3, 4))])
+
+
+@pytest.mark.parametrize("mode", [activity_recorder.PACKED, activity_recorder.INDICES])
+def test_record(tmp_path, layers, mode):
+    recorder = activity_recorder.ActivityRecorder(tmp_path, mode=mode, capacity=2)
+    steps = np.random.RandomState(0).rand(5, 22) < 0.3
+    for step in steps:
+        layers.layers[0].output.values = step[:10]
+        layers.layers[1].output.values = step[10:].reshape(3, 4)
+        recorder.next(layers)
+
+    result = recorder.compute()
+    recording = activity_recorder.ActivityRecording(result.global_result)
+
+    assert len(recording) == 5
+    assert len(recording.layers) == 2
+    for i, step in enumerate(steps):
+        np.testing.assert_array_equal(recording.layers[0][i], step[:10])
+        np.testing.assert_array_equal(recording.layers[1][i], step[10:].reshape(3, 4))
+        np.testing.assert_array_equal(
+            recording.layers[1].on_bits(i), np.flatnonzero(step[10:])
+        )
+
+
+def test_reset_starts_new_recording(tmp_path, layers):
+    recorder = activity_recorder.ActivityRecorder(tmp_path)
+    recorder.next(layers)
+    first = recorder.compute().global_result
+
+    recorder.reset()
+    recorder.next(layers)
+    recorder.next(layers)
+    second = recorder.compute().global_result
+
+    assert first != second
+    assert len(activity_recorder.ActivityRecording(first)) == 1
+    assert len(activity_recorder.ActivityRecording(second)) == 2
+
+
+@pytest.mark.parametrize("mode", [activity_recorder.PACKED, activity_recorder.INDICES])
+def test_read_unfinished_recording(tmp_path, layers, mode):
+    recorder = activity_recorder.ActivityRecorder(tmp_path, mode=mode, capacity=4)
+    steps = np.random.RandomState(0).rand(3, 22) < 0.3
+    for step in steps:
+        layers.layers[0].output.values = step[:10]
+        layers.layers[1].output.values = step[10:].reshape(3, 4)
+        recorder.next(layers)
+
+    recording = activity_recorder.ActivityRecording(recorder.path)
+
+    assert len(recording) == 3
+    for i, step in enumerate(steps):
+        np.testing.assert_array_equal(recording.layers[0][i], step[:10])
+
+
+def test_unsupported_mode(tmp_path):
+    with pytest.raises(ValueError):
+        activity_recorder.ActivityRecorder(tmp_path, mode="dense")
+
+
+def test_attach_to_brain(tmp_path):
+    np.random.seed(0)
+    brain_ = brain.Brain(
+        neuron.FeedForward([neuron.Neurons(20), neuron.Neurons(20)]),
+        sensor.Sensor(numerical.CyclicEncoder(0, 10, 30, sparsity=0.2)),
+        computation=computation.SparseComputation(0.2),
+    )
+    recorder = activity_recorder.ActivityRecorder(
+        tmp_path, mode=activity_recorder.INDICES
+    )
+    brain_.attach(recorder)
+
+    outputs = brain_.compile().run([1, 2, 3], learn=False)
+    recording = activity_recorder.ActivityRecording(recorder.compute().global_result)
+
+    assert len(recording) == 3
+    for i, output in enumerate(outputs):
+        np.testing.assert_array_equal(recording.layers[1][i], output)
+
+
+def test_detach_from_brain(tmp_path):
+    np.random.seed(0)
+    brain_ = brain.Brain(
+        neuron.FeedForward([neuron.Neurons(20), neuron.Neurons(20)]),
+        sensor.Sensor(numerical.CyclicEncoder(0, 10, 30, sparsity=0.2)),
+        computation=computation.SparseComputation(0.2),
+    )
+    recorder = activity_recorder.ActivityRecorder(tmp_path)
+    brain_.attach(recorder)
+    brain_.sensor.feed(1)
+    brain_.compute()
+
+    with pytest.raises(ValueError, match="recorders are attached"):
+        brain_.compute_batch([1, 2])
+
+    path = brain_.detach(recorder).global_result
+    brain_.sensor.feed(2)
+    brain_.compute()
+
+    assert brain_.recorders == []
+    assert len(activity_recorder.ActivityRecording(path)) == 1
+    assert brain_.compute_batch([1, 2]).shape == (2, 20)
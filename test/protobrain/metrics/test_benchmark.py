@@ -0,0 +1,71 @@
+"""Tests for Benchmark."""
+
+import numpy as np
+
+from protobrain import brain
+from protobrain import computation
+from protobrain import learning
+from protobrain import neuron
+from protobrain import sensor
+from protobrain.encoders import numerical
+from protobrain.metrics import benchmark
+from protobrain.metrics import spike_count
+from protobrain.metrics import spike_density
+
+
+def create_brain(random_seed):
+    np.random.seed(random_seed)
+    return brain.Brain(
+        neuron.FeedForward([neuron.Neurons(i) for i in (20, 10)]),
+        sensor.Sensor(numerical.CyclicEncoder(0, 10, 50)),
+        computation=computation.SparseComputation(0.2),
+        learning=learning.HebbianLearning(),
+    )
+
+
+def test_parallel_run_matches_serial():
+    inputs = [i % 10 for i in range(30)]
+    bench = benchmark.Benchmark(
+        [spike_count.SpikeCount(), spike_density.SpikeDensity()]
+    )
+
+    serial = bench.run([create_brain(i) for i in range(3)], inputs, seed=0)
+    parallel = bench.run([create_brain(i) for i in range(3)], inputs, workers=2, seed=0)
+
+    for serial_results, parallel_results in zip(serial, parallel):
+        for name, result in serial_results.items():
+            assert parallel_results[name].global_result == result.global_result
+            assert parallel_results[name].per_layer_result == result.per_layer_result
+
+
+def create_thresholded_brain():
+    return brain.Brain(
+        neuron.FeedForward([neuron.Neurons(i) for i in (20, 10)]),
+        sensor.Sensor(numerical.CyclicEncoder(0, 10, 50)),
+        computation=computation.StandardComputation(0.5),
+        learning=learning.HebbianLearning(),
+    )
+
+
+def test_seed_makes_runs_reproducible():
+    inputs = [i % 10 for i in range(10)]
+    bench = benchmark.Benchmark([spike_count.SpikeCount()])
+
+    def counts(seed):
+        results = bench.run([create_thresholded_brain] * 2, inputs, seed=seed)
+        return [result["spike_count"].global_result for result in results]
+
+    assert counts(0) == counts(0)
+    assert counts(0) != counts(1)
+
+
+def test_serial_run_leaves_brains_untouched():
+    brain_ = create_brain(0)
+    weights = brain_.neurons.layers[0].input.synapses.copy()
+    np.random.seed(0)
+    state = np.random.get_state()
+
+    benchmark.Benchmark([spike_count.SpikeCount()]).run([brain_], [1, 2, 3], seed=1)
+
+    np.testing.assert_array_equal(brain_.neurons.layers[0].input.synapses, weights)
+    assert np.random.get_state()[1].tolist() == state[1].tolist()
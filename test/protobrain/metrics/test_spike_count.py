@@ -151,3 +151,35 @@ def test_changing_density_non_uniform_layers(non_uniform_layers):
         ],
         {0: 1, 1: 1, 2: 2},
     ]
+
+
+def test_counts_above_size(neurons):
+    metric = spike_count.SpikeCount()
+
+    neurons.output.values = np.array([1, 1, 0, 0])
+    for _ in range(6):
+        metric.next(neurons)
+
+    result = metric.compute()
+    assert result.global_result == {0: 2, 6: 2}
+    assert metric._accumulator.dtype == np.int64
+
+
+def test_contiguous_layers():
+    metric = spike_count.SpikeCount()
+    layers = neuron.LayeredNeurons(
+        [neuron.FeedForward([neuron.Neurons(4), neuron.Neurons(4)]), neuron.Neurons(4)],
+        contiguous=True,
+    )
+
+    for values in ([1, 0, 0, 0], [1, 1, 0, 0]):
+        for sublayer in layers.leaves():
+            sublayer.output.values = np.array(values)
+        metric.next(layers)
+
+    result = metric.compute()
+    assert result.global_result == {0: 6, 1: 3, 2: 3}
+    assert result.per_layer_result == [
+        [{0: 2, 1: 1, 2: 1}, {0: 2, 1: 1, 2: 1}],
+        {0: 2, 1: 1, 2: 1},
+    ]
@@ -154,3 +154,69 @@ def test_changing_density_non_uniform_layers(non_uniform_layers):
         ((0.25, 0.25, 0.25, 0.25), 0.50),
         ((0.50, 0.50, 0.50, 0.50), 0.75),
     ]
+
+
+def test_streaming_matches_full(non_uniform_layers):
+    full = spike_density.SpikeDensity()
+    streaming = spike_density.SpikeDensity(streaming=True, history=3)
+
+    for step in range(3):
+        for i, sublayer in enumerate(non_uniform_layers.layers[0].layers):
+            sublayer.output.values = np.roll([1, 1, 0, 0], step + i)
+        non_uniform_layers.layers[1].output.values = np.array([1, 0, 0, 0])
+        full.next(non_uniform_layers)
+        streaming.next(non_uniform_layers)
+
+    expected = full.compute()
+    result = streaming.compute()
+    assert result.global_result == pytest.approx(expected.global_result)
+    assert result.per_layer_result == expected.per_layer_result
+    assert result.per_step_result == pytest.approx(expected.per_step_result)
+    assert result.per_layer_per_step_result == expected.per_layer_per_step_result
+
+
+def test_streaming_history(neurons):
+    metric = spike_density.SpikeDensity(streaming=True, history=2)
+
+    for values in ([1, 0, 0, 0], [1, 1, 0, 0], [1, 1, 1, 0]):
+        neurons.output.values = np.array(values)
+        metric.next(neurons)
+
+    result = metric.compute()
+    assert result.global_result == pytest.approx(0.5)
+    assert result.per_layer_result == pytest.approx(0.5)
+    assert result.per_step_result == [0.5, 0.75]
+    assert result.per_layer_per_step_result == [0.5, 0.75]
+
+
+def test_streaming_without_history(neurons):
+    metric = spike_density.SpikeDensity(streaming=True)
+
+    neurons.output.values = np.array([1, 0, 0, 0])
+    metric.next(neurons)
+
+    result = metric.compute()
+    assert result.global_result == 0.25
+    assert result.per_step_result is None
+    assert result.per_layer_per_step_result is None
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_contiguous_layers(streaming):
+    metric = spike_density.SpikeDensity(streaming=streaming, history=2)
+    layers = neuron.LayeredNeurons(
+        [neuron.FeedForward([neuron.Neurons(4), neuron.Neurons(4)]), neuron.Neurons(2)],
+        contiguous=True,
+    )
+
+    for values in ([1, 0, 0, 0], [1, 1, 0, 0]):
+        for sublayer in layers.layers[0].layers:
+            sublayer.output.values = np.array(values)
+        layers.layers[1].output.values = np.array(values[:2])
+        metric.next(layers)
+
+    result = metric.compute()
+    assert result.global_result == pytest.approx(0.45)
+    assert result.per_layer_result == [[0.375, 0.375], 0.75]
+    assert result.per_step_result == pytest.approx([0.3, 0.6])
+    assert result.per_layer_per_step_result == [((0.25, 0.25), 0.5), ((0.5, 0.5), 1.0)]
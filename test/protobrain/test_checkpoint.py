@@ -0,0 +1,200 @@
+"""Tests for checkpoint module."""
+
+import json
+import os
+
+import pytest
+import numpy as np
+
+from protobrain import brain
+from protobrain import computation
+from protobrain import learning
+from protobrain import neuron
+from protobrain import scheduler
+from protobrain import synapses
+from protobrain import sensor
+from protobrain.encoders import image
+from protobrain.encoders import numerical
+
+
+def run(brain_, values):
+    outputs = []
+    for value in values:
+        brain_.sensor.feed(value)
+        outputs.append(brain_.compute().copy())
+        brain_.learn()
+    return outputs
+
+
+def mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize(
+    "dtype, density", [(np.float64, 1.0), (np.uint8, 1.0), (np.float32, 0.5)]
+)
+def test_load_matches_saved(create_brain, tmp_path, dtype, density, mmap):
+    inputs = list(np.random.RandomState(1).uniform(0, 10, 10))
+    saved = create_brain(dtype=dtype, density=density)
+    run(saved, inputs[:5])
+    saved.save(tmp_path)
+
+    loaded = brain.Brain.load(tmp_path, mmap=mmap)
+
+    np.testing.assert_array_equal(run(loaded, inputs[5:]), run(saved, inputs[5:]))
+    for layer, loaded_layer in zip(saved.neurons.layers, loaded.neurons.layers):
+        assert loaded_layer.inputs.keys() == layer.inputs.keys()
+        for name, inp in layer.inputs.items():
+            weights = loaded_layer.get(name).synapses
+            if density < 1:
+                weights, expected = weights.toarray(), inp.synapses.toarray()
+            else:
+                expected = inp.synapses
+            assert weights.dtype == expected.dtype
+            np.testing.assert_array_equal(weights, expected)
+
+
+def test_load_maps_synapses(create_brain, tmp_path):
+    saved = create_brain()
+    saved.save(tmp_path)
+    path = os.path.join(tmp_path, "layer_0.input_0.npy")
+    on_disk = np.load(path)
+
+    loaded = brain.Brain.load(tmp_path)
+    run(loaded, [1, 2, 3])
+
+    synapses_ = loaded.neurons.layers[0].input.synapses
+    assert isinstance(synapses_.base, np.memmap)
+    assert not np.array_equal(synapses_, on_disk)
+    np.testing.assert_array_equal(np.load(path), on_disk)
+    for layer in loaded.neurons.layers:
+        for inp in layer.inputs.values():
+            assert mapped(inp.synapses)
+
+
+def test_load_maps_stacked_synapses(create_brain, tmp_path):
+    saved = create_brain()
+    saved.save(tmp_path)
+
+    loaded = brain.Brain.load(tmp_path)
+    stack = loaded.neurons.layers[1].input._stack
+
+    assert list(loaded.neurons.layers[1].inputs) == ["main", "loopback"]
+    assert isinstance(stack.synapses, np.memmap)
+    run(loaded, [1, 2, 3])
+    assert loaded.neurons.layers[1].input._stack is stack
+
+
+def test_save_leaves_brain_untouched(create_brain, tmp_path):
+    saved = create_brain()
+    inputs = saved.neurons.layers[1].inputs.values()
+    weights = [inp.synapses for inp in inputs]
+
+    saved.save(tmp_path)
+
+    assert all(inp._stack is None for inp in inputs)
+    assert all(inp.synapses is w for inp, w in zip(inputs, weights))
+
+
+def test_load_shares_functions(create_brain, tmp_path):
+    create_brain().save(tmp_path)
+
+    loaded = brain.Brain.load(tmp_path)
+
+    computations = loaded.computation
+    assert isinstance(computations[0], computation.SparseComputation)
+    assert computations[0].n == 0.2
+    assert all(c is computations[0] for c in computations)
+    assert loaded.sensor.value == 0
+
+
+def test_save_topology(create_brain, tmp_path):
+    create_brain().save(tmp_path)
+
+    with open(os.path.join(tmp_path, "brain.json")) as f:
+        topology = json.load(f)
+
+    assert [layer["shape"] for layer in topology["layers"]] == [[20]] * 3
+    assert [
+        [(inp["name"], inp["source"]) for inp in layer["inputs"]]
+        for layer in topology["layers"]
+    ] == [
+        [("main", {"sensor": True})],
+        [("main", {"layer": 0}), ("loopback", {"layer": 1})],
+        [("main", {"layer": 1})],
+    ]
+    assert topology["neurons"]["type"] == "LayeredNeurons"
+    assert topology["objects"] == [
+        {
+            "type": "CyclicEncoder",
+            "parameters": {
+                "min_value": 0,
+                "max_value": 10,
+                "length": 30,
+                "sparsity": 0.2,
+                "cache_size": 64 << 20,
+            },
+        },
+        {
+            "type": "SparseComputation",
+            "parameters": {"n": 0.2, "indices": False, "gains": {}},
+        },
+        {
+            "type": "HebbianLearning",
+            "parameters": {"increase": 0.05, "decrease": 0.002},
+        },
+    ]
+    assert not any(name.endswith(".pkl") for name in os.listdir(tmp_path))
+
+
+def test_save_image_sensor(tmp_path):
+    encoder = image.BlackWhiteEncoder(8, 8, backend=image.NUMPY)
+    senz = sensor.Sensor(encoder)
+    saved = brain.Brain(neuron.Neurons(10), senz)
+    saved.neurons.input = senz
+    senz.feed(np.random.RandomState(0).rand(8, 8))
+    saved.save(tmp_path)
+
+    loaded = brain.Brain.load(tmp_path)
+
+    assert vars(loaded.sensor._encoder).keys() == vars(encoder).keys()
+    assert loaded.sensor._encoder.backend == image.NUMPY
+    np.testing.assert_array_equal(loaded.sensor.value, senz.value)
+    np.testing.assert_array_equal(loaded.sensor.values, senz.values)
+
+
+def test_save_unknown_function(create_brain, tmp_path):
+    class Threshold(computation.StandardComputation):
+        pass
+
+    with pytest.raises(ValueError, match="Threshold"):
+        create_brain(Threshold(0.5)).save(tmp_path)
+
+
+def test_load_merged_and_scheduled(tmp_path):
+    np.random.seed(0)
+    first, second, third = (neuron.Neurons(10) for _ in range(3))
+    second.set("main", first)
+    third.set("main", synapses.OutputMerge(first, second, shared=True))
+    third.set("part", first.output[2:8])
+    third.set("feedback", third)
+    saved = brain.Brain(
+        scheduler.Scheduler([first, second, third]),
+        sensor.Sensor(numerical.SimpleEncoder(0, 10, 30, sparsity=0.2)),
+        computation=computation.StandardComputation(2.0),
+        learning=learning.HebbianLearning(),
+    )
+    saved.save(tmp_path)
+
+    loaded = brain.Brain.load(tmp_path, mmap=False)
+
+    assert isinstance(loaded.neurons, scheduler.Scheduler)
+    merged = loaded.neurons.layers[2].get("main")._connected_output
+    assert isinstance(merged, synapses.OutputMerge)
+    assert merged.shape == (20,)
+    assert merged.shared
+    assert loaded.neurons.layers[2].get("part").values.shape == (6,)
+    np.testing.assert_array_equal(run(loaded, [1, 5, 9]), run(saved, [1, 5, 9]))
@@ -0,0 +1,88 @@
+"""Tests for compiled module."""
+
+import pytest
+import numpy as np
+
+from protobrain import computation
+from protobrain import synapses
+
+
+class Unbuffered(computation.Computation):
+    def __call__(self, main, **inputs):
+        return computation.StandardComputation(2.0)(main, **inputs)
+
+
+@pytest.mark.parametrize(
+    "compute",
+    [
+        computation.SparseComputation(0.2),
+        computation.StandardComputation(2.0),
+        Unbuffered(),
+    ],
+)
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.uint8])
+def test_run_matches_brain(create_brain, compute, dtype):
+    inputs = list(np.random.RandomState(1).uniform(0, 10, 20))
+    expected = create_brain(compute, dtype=dtype)
+    compiled = create_brain(compute, dtype=dtype)
+
+    outputs = []
+    for value in inputs:
+        expected.sensor.feed(value)
+        outputs.append(expected.compute().copy())
+        expected.learn()
+
+    np.testing.assert_array_equal(compiled.compile().run(inputs), outputs)
+    for layer, compiled_layer in zip(expected.neurons.layers, compiled.neurons.layers):
+        for name, inp in layer.inputs.items():
+            np.testing.assert_array_equal(
+                compiled_layer.get(name).synapses, inp.synapses
+            )
+
+
+def test_run_without_learning(create_brain):
+    inputs = [1, 2, 3, 4]
+    expected = create_brain(computation.SparseComputation(0.2))
+    compiled = create_brain(computation.SparseComputation(0.2))
+    compiled.learning = None
+
+    outputs = []
+    for value in inputs:
+        expected.sensor.feed(value)
+        outputs.append(expected.compute().copy())
+
+    np.testing.assert_array_equal(compiled.compile().run(inputs, learn=False), outputs)
+
+    with pytest.raises(ValueError):
+        compiled.compile().run(inputs)
+
+
+def test_close_unbinds_outputs(create_brain):
+    brain_ = create_brain()
+    layers = brain_.neurons.layers
+
+    with brain_.compile() as compiled:
+        compiled.run([1, 2])
+        assert not synapses.OutputMerge(layers[0], layers[1], shared=True).shared
+
+    assert not any(layer.output._bound for layer in layers)
+    assert not brain_.sensor.output._bound
+    assert synapses.OutputMerge(layers[0], layers[1], shared=True).shared
+    with pytest.raises(ValueError, match="closed"):
+        compiled.run([3])
+
+
+def test_discarded_compiled_brain_unbinds_outputs(create_brain):
+    brain_ = create_brain()
+
+    brain_.compile().run([1, 2])
+
+    assert not any(layer.output._bound for layer in brain_.neurons.layers)
+
+
+def test_missing_computation(create_brain):
+    brain_ = create_brain()
+    brain_.neurons.layers[1].computation = None
+
+    with pytest.raises(ValueError, match="Computation function not set"):
+        brain_.compile()
@@ -1,5 +1,6 @@
 """Tests for computation module."""
 
+import pytest
 import numpy as np
 
 from protobrain import computation
@@ -74,3 +75,317 @@ def test_sparse_computation_with_fixed_number():
     expected = [True, False, False, False]
 
     assert all(output == expected)
+
+
+def test_standard_computation_batch():
+    compute = computation.StandardComputation(threshold=1.2)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, computation=compute)
+
+    synapses = np.array([[0.8, 0.4], [0.6, 0.8], [0.5, 0.4]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    values = np.array([[1, 0, 1], [0, 1, 0], [1, 1, 1]])
+    output = n2.compute_batch(values)
+
+    expected = [[True, False], [False, False], [True, True]]
+
+    assert (output == expected).all()
+    assert all(n2.values == expected[-1])
+
+
+def test_sparse_computation_batch():
+    compute = computation.SparseComputation(n=2)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(4, computation=compute)
+
+    synapses = np.array(
+        [[0.8, 0.4, 0.5, 0.4], [0.6, 0.8, 0.9, 0.2], [0.5, 0.4, 0.5, 0.7]]
+    )
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    values = np.array([[1, 0, 1], [0, 1, 0]])
+    output = n2.compute_batch(values)
+
+    expected = [[True, False, False, True], [False, True, True, False]]
+
+    assert (output == expected).all()
+
+
+def test_sparse_computation_breaks_ties_by_index():
+    compute = computation.SparseComputation(n=2)
+
+    n1 = neuron.Neurons(2)
+    n2 = neuron.Neurons(5, computation=compute)
+
+    synapses = np.array([[0.5, 0.9, 0.5, 0.5, 0.1], [0.5, 0.9, 0.5, 0.5, 0.1]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 1])
+    output = n2.compute()
+
+    expected = [True, True, False, False, False]
+
+    assert all(output == expected)
+
+
+def test_sparse_computation_indices():
+    compute = computation.SparseComputation(n=2, indices=True)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(4)
+
+    synapses = np.array(
+        [[0.8, 0.4, 0.5, 0.4], [0.6, 0.8, 0.9, 0.2], [0.5, 0.4, 0.5, 0.7]]
+    )
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    assert list(compute(n2.input)) == [0, 3]
+
+    values = np.array([[1, 0, 1], [0, 1, 0]])
+    assert compute.batch(values, n2.input).tolist() == [[0, 3], [1, 2]]
+
+
+def test_sparse_computation_indices_through_neurons():
+    compute = computation.SparseComputation(n=2, indices=True)
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(4, computation=compute)
+    n2.input = n1
+
+    with pytest.raises(ValueError, match="outputs indices"):
+        n2.compute()
+    with pytest.raises(ValueError, match="gives outputs of shape"):
+        n2.compute_batch(np.array([[1, 0, 1], [0, 1, 0]]))
+
+
+def test_sparse_computation_reuses_output():
+    compute = computation.SparseComputation(n=2)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(4)
+
+    synapses = np.array(
+        [[0.8, 0.4, 0.5, 0.4], [0.6, 0.8, 0.9, 0.2], [0.5, 0.4, 0.5, 0.7]]
+    )
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    out = np.ones(4)
+    n1.output.values = np.array([1, 0, 1])
+    result = compute(n2.input, out=out)
+
+    assert result is out
+    assert list(out) == [1, 0, 0, 1]
+
+
+def test_standard_computation_reuses_buffers():
+    compute = computation.StandardComputation(threshold=1.2)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(4)
+
+    synapses = np.array(
+        [[0.8, 0.4, 0.5, 0.4], [0.6, 0.8, 0.9, 0.2], [0.5, 0.4, 0.5, 0.7]]
+    )
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    out = np.ones(4)
+    activations = np.empty(4)
+    n1.output.values = np.array([1, 0, 1])
+    result = compute(n2.input, out=out, activations=activations)
+
+    assert result is out
+    assert list(out) == [1, 0, 0, 0]
+    np.testing.assert_allclose(activations, [1.3, 0.8, 1.0, 1.1])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16, np.uint8])
+def test_standard_computation_dtype(dtype):
+    compute = computation.StandardComputation(threshold=1.25)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, computation=compute, dtype=dtype)
+
+    synapses = np.array([[0.8, 0.4], [0.6, 0.8], [0.5, 0.4]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    output = n2.compute()
+
+    assert all(output == [True, False])
+    assert (
+        n2.compute_batch(np.array([[1, 0, 1], [1, 1, 1]]))
+        == [
+            [True, False],
+            [True, True],
+        ]
+    ).all()
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.uint8])
+def test_narrow_synapses_widened_in_chunks(monkeypatch, dtype):
+    np.random.seed(0)
+    source = neuron.Neurons(50)
+    layer = neuron.Neurons(8, dtype=dtype)
+    layer.input = source
+    values = (np.random.rand(4, 50) < 0.5).astype(np.float64)
+    source.output.values = values[-1]
+    expected_dot = computation._dot(values[-1], layer.input)
+    expected_matmul = computation._matmul(values, layer.input)
+
+    monkeypatch.setattr(computation, "_CHUNK_SIZE", 3 * 8)
+    out = np.empty(8, dtype=np.float32)
+
+    activations = computation._dot(values[-1], layer.input, out)
+    assert activations is out
+    np.testing.assert_allclose(activations, expected_dot, rtol=1e-5)
+    np.testing.assert_allclose(
+        computation._matmul(values, layer.input), expected_matmul, rtol=1e-5
+    )
+
+
+def test_sparse_computation_sparse_synapses():
+    compute = computation.SparseComputation(n=5)
+
+    n1 = neuron.Neurons(50)
+    n2 = neuron.Neurons(40, computation=compute, density=0.2)
+    n2.input = n1
+
+    dense = neuron.Neurons(40, computation=compute)
+    dense.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: n2.input.synapses.toarray(),
+    )
+
+    n1.output.values = np.random.rand(50) < 0.3
+
+    np.testing.assert_array_equal(n2.compute(), dense.compute())
+    np.testing.assert_array_equal(
+        n2.compute_batch(np.eye(50)), dense.compute_batch(np.eye(50))
+    )
+
+
+@pytest.mark.parametrize(
+    "dtype, gains", [(np.uint8, None), (np.float64, {neuron.Neurons.MAIN_INPUT: 0.5})]
+)
+def test_sparse_synapses_silent_input(dtype, gains):
+    source = neuron.Neurons(10)
+    layer = neuron.Neurons(
+        5,
+        computation=computation.StandardComputation(0.1, gains=gains),
+        dtype=dtype,
+        density=0.5,
+    )
+    layer.input = source
+
+    assert not layer.compute().any()
+    assert not layer.compute_batch(np.zeros((3, 10))).any()
+
+
+def test_sparse_synapses_multidimensional_neurons():
+    np.random.seed(0)
+    source = neuron.Neurons(10)
+    layer = neuron.Neurons(
+        (4, 5), computation=computation.SparseComputation(3), density=0.5
+    )
+    layer.input = source
+    dense = layer.input.synapses.toarray().reshape(10, 4, 5)
+    source.output.values = np.random.rand(10) < 0.5
+
+    activations = computation._dot(source.values, layer.input)
+
+    np.testing.assert_allclose(activations, np.tensordot(source.values, dense, 1))
+    assert layer.compute().shape == (4, 5)
+    assert list(np.count_nonzero(layer.values, axis=-1)) == [3] * 4
+    assert layer.compute_batch(np.eye(10)[:2]).shape == (2, 4, 5)
+
+
+def test_standard_computation_multiple_inputs():
+    compute = computation.StandardComputation(threshold=1.2, gains={"feedback": 0.5})
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, computation=compute)
+    n3 = neuron.Neurons(2)
+
+    main_synapses = np.array([[0.8, 0.4], [0.6, 0.8], [0.5, 0.4]])
+    feedback_synapses = np.array([[0.4, 0.4], [1.0, 0.2]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: main_synapses,
+    )
+    n2.set(
+        "feedback",
+        n3,
+        synapse_function=lambda inp_shape, out_shape: feedback_synapses,
+    )
+
+    n1.output.values = np.array([0, 1, 0])
+    n3.output.values = np.array([1, 1])
+    output = n2.compute()
+
+    # Main adds [0.6, 0.8], feedback adds half of [1.4, 0.6].
+    expected = [True, False]
+
+    assert all(output == expected)
+
+
+def test_sparse_computation_loop_back():
+    compute = computation.SparseComputation(n=3, gains={"loopback": 0.1})
+
+    source = neuron.Neurons(10)
+    layers = neuron.LoopBack(
+        [neuron.Neurons(8, computation=compute)],
+        "loopback",
+    )
+    layers.input = source
+    layer = layers.layers[0]
+
+    source.output.values = np.random.rand(10) < 0.5
+    layer.output.values = np.random.rand(8) < 0.5
+    activations = np.dot(source.values, layer.input.synapses) + 0.1 * np.dot(
+        layer.values, layer.get("loopback").synapses
+    )
+    expected = np.zeros(8)
+    expected[np.argsort(-activations, kind="stable")[:3]] = 1
+
+    np.testing.assert_array_equal(layers.compute(), expected)
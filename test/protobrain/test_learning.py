@@ -5,6 +5,7 @@ from numpy import testing
 
 from protobrain import learning
 from protobrain import neuron
+from protobrain import synapses as synapses_module
 
 
 def test_hebbian_learning():
@@ -29,3 +30,107 @@ def test_hebbian_learning():
     expected_synapses = np.array([[0.90, 0.35], [0.55, 0.80], [0.60, 0.35]])
 
     testing.assert_allclose(n2.input.synapses, expected_synapses)
+
+
+def test_hebbian_learning_float32():
+    hl = learning.HebbianLearning(increase=0.1, decrease=0.05)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, learning=hl, dtype=np.float32)
+
+    synapses = np.array([[0.8, 0.4], [0.6, 0.8], [0.5, 0.4]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    n2.output.values = np.array([1, 0])
+
+    n2.learn()
+
+    expected_synapses = np.array([[0.90, 0.35], [0.55, 0.80], [0.60, 0.35]])
+
+    assert n2.input.synapses.dtype == np.float32
+    testing.assert_allclose(n2.input.synapses, expected_synapses, rtol=1e-6)
+
+
+def test_hebbian_learning_permanences():
+    hl = learning.HebbianLearning(increase=0.1, decrease=0.001)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, learning=hl, dtype=np.uint8)
+
+    synapses = np.array([[250, 0], [1, 200], [100, 1]], dtype=np.uint8)
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    n2.output.values = np.array([1, 0])
+
+    n2.learn()
+
+    # Increases by 26 units saturate at 255, decreases by 1 unit at 0.
+    expected_synapses = np.array([[255, 0], [0, 200], [126, 0]])
+
+    assert n2.input.synapses.dtype == np.uint8
+    testing.assert_array_equal(n2.input.synapses, expected_synapses)
+
+
+def test_hebbian_learning_sparse():
+    hl = learning.HebbianLearning(increase=0.1, decrease=0.05)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, learning=hl)
+
+    synapses = np.array([[0.8, 0.0], [0.6, 0.8], [0.0, 0.4]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: (
+            synapses_module.SparseSynapses.from_dense(synapses)
+        ),
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    n2.output.values = np.array([1, 0])
+
+    n2.learn()
+
+    expected_synapses = np.array([[0.90, 0.0], [0.55, 0.80], [0.0, 0.35]])
+
+    testing.assert_allclose(n2.input.synapses.toarray(), expected_synapses)
+
+
+def test_hebbian_learning_in_place():
+    hl = learning.HebbianLearning(increase=0.1, decrease=0.5)
+
+    n1 = neuron.Neurons(3)
+    n2 = neuron.Neurons(2, learning=hl)
+
+    synapses = np.array([[0.8, 0.4], [0.0, 0.8], [0.0, 0.4]])
+
+    n2.set(
+        neuron.Neurons.MAIN_INPUT,
+        n1,
+        synapse_function=lambda inp_shape, out_shape: synapses,
+    )
+
+    n1.output.values = np.array([1, 0, 1])
+    n2.output.values = np.array([1, 0])
+
+    n2.learn()
+    n2.learn()
+
+    # Synapses that reach 0 are pruned and never grow back.
+    expected_synapses = np.array([[1.0, 0.0], [0.0, 0.8], [0.0, 0.0]])
+
+    assert n2.input.synapses is synapses
+    testing.assert_allclose(n2.input.synapses, expected_synapses)
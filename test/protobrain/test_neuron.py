@@ -1,9 +1,13 @@
 """Tests for neuron module."""
 
+import pickle
+
 import pytest
 import numpy as np
 
+from protobrain import computation
 from protobrain import neuron
+from protobrain import synapses
 
 
 @pytest.fixture(scope="module")
@@ -81,3 +85,184 @@ def test_loop_back():
 
     for layer in layers:
         layer.get("loopback")._connected_output == layer.output
+
+
+def test_feed_forward_compute_batch():
+    source = neuron.Neurons(10)
+    layers = neuron.FeedForward(
+        [
+            neuron.Neurons(8, computation=computation.SparseComputation(3)),
+            neuron.Neurons(6, computation=computation.StandardComputation(0.5)),
+        ]
+    )
+    layers.input = source
+
+    values = np.random.rand(5, 10) < 0.5
+    expected = []
+    for row in values:
+        source.output.values = row
+        expected.append(layers.compute().copy())
+
+    np.testing.assert_array_equal(layers.compute_batch(values), expected)
+
+
+def test_compute_batch_requires_feed_forward():
+    source = neuron.Neurons(10)
+    layers = neuron.LoopBack(
+        [neuron.Neurons(10, computation=computation.SparseComputation(3))],
+        "loopback",
+    )
+    layers.input = source
+
+    with pytest.raises(ValueError):
+        layers.compute_batch(np.zeros((5, 10)))
+
+
+def test_feed_forward_pipelined():
+    def create_layers(pipelined):
+        np.random.seed(0)
+        layers = neuron.FeedForward(
+            [
+                neuron.Neurons(8, computation=computation.SparseComputation(3))
+                for _ in range(3)
+            ],
+            pipelined=pipelined,
+        )
+        layers.input = source
+        return layers
+
+    source = neuron.Neurons(8)
+    sequential = create_layers(pipelined=False)
+    pipelined = create_layers(pipelined=True)
+
+    values = np.random.rand(6, 8) < 0.5
+    expected, outputs = [], []
+    for row in values:
+        source.output.values = row
+        expected.append(sequential.compute().copy())
+        outputs.append(pipelined.compute().copy())
+
+    # Each additional layer delays the output by one step.
+    np.testing.assert_array_equal(outputs[2:], expected[:-2])
+    np.testing.assert_array_equal(pipelined.drain(), expected[-1])
+
+
+def test_close_pipelined():
+    source = neuron.Neurons(8)
+    compute = computation.SparseComputation(3)
+    with neuron.FeedForward(
+        [neuron.Neurons(8, computation=compute) for _ in range(2)], pipelined=True
+    ) as layers:
+        layers.input = source
+        layers.compute()
+        executor = layers._executor
+
+    assert layers._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+    layers.compute()
+    layers.close()
+
+
+def test_pipelined_layers_cannot_learn():
+    layers = neuron.FeedForward([neuron.Neurons(8), neuron.Neurons(8)], pipelined=True)
+
+    with pytest.raises(ValueError):
+        layers.learn()
+
+
+def test_contiguous_layers():
+    layers = neuron.LayeredNeurons(
+        [
+            neuron.FeedForward([neuron.Neurons(2), neuron.Neurons((2, 2))]),
+            neuron.Neurons(3),
+        ],
+        contiguous=True,
+    )
+    layers.layers[0].layers[1].output.values = np.ones((2, 2))
+    layers.layers[1].output.values = np.array([1.0, 0.0, 1.0])
+
+    np.testing.assert_array_equal(layers.offsets, [0, 2, 6, 9])
+    np.testing.assert_array_equal(layers.activity, [0, 0, 1, 1, 1, 1, 1, 0, 1])
+    np.testing.assert_array_equal(layers.layers[0].activity, [0, 0, 1, 1, 1, 1])
+
+    restored = pickle.loads(pickle.dumps(layers))
+    restored.layers[0].layers[0].output.values = np.ones(2)
+    np.testing.assert_array_equal(restored.activity, [1, 1, 1, 1, 1, 1, 1, 0, 1])
+
+
+def test_contiguous_feed_forward():
+    def create_layers(contiguous):
+        np.random.seed(0)
+        layers = neuron.FeedForward(
+            [
+                neuron.Neurons(8, computation=computation.SparseComputation(3))
+                for _ in range(3)
+            ],
+            contiguous=contiguous,
+        )
+        layers.input = source
+        return layers
+
+    source = neuron.Neurons(8)
+    separate = create_layers(contiguous=False)
+    contiguous = create_layers(contiguous=True)
+
+    for row in np.random.rand(4, 8) < 0.5:
+        source.output.values = row
+        separate.compute()
+        contiguous.compute()
+        np.testing.assert_array_equal(
+            contiguous.activity, np.concatenate([l.values for l in separate.layers])
+        )
+
+
+def test_contiguous_layers_shared_merge():
+    layers = [neuron.Neurons(2), neuron.Neurons(2)]
+    merged = synapses.OutputMerge(*layers, shared=True)
+
+    with pytest.raises(ValueError, match="already bound"):
+        neuron.LayeredNeurons(layers, contiguous=True)
+
+    layers[0].output.values = np.ones(2)
+    np.testing.assert_array_equal(merged.values, [1, 1, 0, 0])
+
+
+def test_layers_not_contiguous():
+    layers = neuron.FeedForward([neuron.Neurons(2), neuron.Neurons(2)])
+
+    with pytest.raises(ValueError):
+        _ = layers.activity
+
+
+def test_compute_alternates_buffers():
+    np.random.seed(0)
+    source = neuron.Neurons(8)
+    layer = neuron.Neurons(8, computation=computation.SparseComputation(3))
+    layer.input = source
+    layer.set("loopback", layer)
+
+    outputs = set()
+    for row in np.random.rand(4, 8) < 0.5:
+        source.output.values = row
+        expected = computation.SparseComputation(3)(
+            layer.input, loopback=layer.get("loopback")
+        )
+        np.testing.assert_array_equal(layer.compute(), expected)
+        assert layer.output.spare() is not layer.values
+        outputs.add(id(layer.values))
+
+    assert len(outputs) == 2
+
+
+def test_unbuffered_computation():
+    class Copy(computation.Computation):
+        def __call__(self, main):
+            return main.values > 0.5
+
+    source = neuron.Neurons(4)
+    layer = neuron.Neurons(4, computation=Copy())
+    layer.set("main", source, lambda output_shape, input_shape: np.eye(4))
+    source.output.values = np.array([1.0, 0.0, 1.0, 0.0])
+
+    np.testing.assert_array_equal(layer.compute(), [True, False, True, False])
@@ -0,0 +1,143 @@
+"""Tests for scheduler module."""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from protobrain import computation
+from protobrain import learning
+from protobrain import neuron
+from protobrain import scheduler
+
+
+def create_layers(sizes=(8, 8, 8)):
+    return [
+        neuron.Neurons(size, computation=computation.SparseComputation(3))
+        for size in sizes
+    ]
+
+
+def test_feed_forward_matches_layers():
+    source = neuron.Neurons(8)
+
+    def create(cls):
+        np.random.seed(0)
+        layers = create_layers()
+        neuron.FeedForward(layers)
+        neuron.LoopBack(layers, "loopback")
+        layered = cls(layers)
+        layered.input = source
+        return layered
+
+    expected = create(neuron.LayeredNeurons)
+    scheduled = create(scheduler.Scheduler)
+
+    for row in np.random.rand(5, 8) < 0.5:
+        source.output.values = row
+        np.testing.assert_array_equal(scheduled.compute(), expected.compute())
+
+    assert scheduled.order == scheduled.layers
+    assert scheduled.delays == [(layer, layer) for layer in scheduled.layers]
+
+
+def test_order_follows_connections():
+    layers = create_layers()
+    neuron.FeedBackward(layers, "main")
+
+    scheduled = scheduler.Scheduler(layers)
+
+    assert scheduled.order == layers[::-1]
+    assert scheduled.delays == []
+
+
+def test_cycles_become_delays():
+    first, second, third = layers = create_layers()
+    second.set("main", first)
+    third.set("main", second)
+    first.set("feedback", third)
+
+    scheduled = scheduler.Scheduler(layers)
+
+    assert scheduled.order == layers
+    assert scheduled.delays == [(third, first)]
+
+
+def test_only_cycles_become_delays():
+    reader, first, second = layers = create_layers()
+    reader.set("main", second)
+    first.set("main", second)
+    second.set("main", first)
+
+    scheduled = scheduler.Scheduler(layers)
+
+    assert scheduled.order == [first, second, reader]
+    assert scheduled.delays == [(second, first)]
+
+
+def test_nested_cycles_become_delays():
+    first, second, third = layers = create_layers()
+    second.set("main", first)
+    third.set("main", second)
+    first.set("feedback", third)
+    second.set("feedback", third)
+
+    scheduled = scheduler.Scheduler(layers)
+
+    assert scheduled.order == layers
+    assert scheduled.delays == [(third, first), (third, second)]
+
+
+def test_missing_computation():
+    source = neuron.Neurons(8)
+    layers = create_layers()
+    layers[1].computation = None
+    scheduled = scheduler.Scheduler(neuron.FeedForward(layers).layers)
+    scheduled.input = source
+
+    with pytest.raises(ValueError, match="Computation function not set"):
+        scheduled.compute()
+
+
+def test_skips_unchanged_inputs():
+    np.random.seed(0)
+    source = neuron.Neurons(8)
+    layers = create_layers()
+    scheduled = scheduler.Scheduler(neuron.FeedForward(layers).layers)
+    scheduled.input = source
+    evaluated = []
+    for layer in layers:
+
+        def evaluate(layer=layer):
+            evaluated.append(layer)
+            return neuron.Neurons.evaluate(layer)
+
+        layer.evaluate = evaluate
+
+    source.output.values = np.ones(8)
+    scheduled.compute()
+    assert evaluated == layers
+
+    evaluated.clear()
+    scheduled.compute()
+    assert evaluated == []
+
+    scheduled.learning = learning.HebbianLearning()
+    scheduled.learn()
+    scheduled.compute()
+    assert evaluated == layers
+
+
+def test_pickle():
+    np.random.seed(0)
+    source = neuron.Neurons(8)
+    scheduled = scheduler.Scheduler(neuron.FeedForward(create_layers()).layers)
+    scheduled.input = source
+    source.output.values = np.ones(8)
+    scheduled.compute()
+
+    restored = pickle.loads(pickle.dumps(scheduled))
+
+    assert len(restored.order) == 3
+    assert restored.order[0] is restored.layers[0]
+    np.testing.assert_array_equal(restored.compute(), scheduled.values)
@@ -0,0 +1,41 @@
+"""Tests for sensor module."""
+
+import numpy as np
+
+from protobrain import sensor
+from protobrain.encoders import numerical
+
+
+class ParityEncoder(sensor.Encoder[int]):
+    def __init__(self):
+        super().__init__(default_value=0, shape=(2,))
+
+    def encode(self, value):
+        return np.eye(2)[value % 2]
+
+
+def test_feed_many():
+    sensor_ = sensor.Sensor(numerical.CyclicEncoder(0, 10, 20, sparsity=0.2))
+
+    encoded = sensor_.feed_many([1, 4.5, 9])
+
+    assert encoded.shape == (3, 20)
+    np.testing.assert_array_equal(encoded[1], sensor_._encoder.encode(4.5))
+    np.testing.assert_array_equal(sensor_.values, encoded[-1])
+    assert sensor_.value == 9
+
+
+def test_feed_many_one_at_a_time():
+    sensor_ = sensor.Sensor(ParityEncoder())
+
+    encoded = sensor_.feed_many([1, 2, 3])
+
+    np.testing.assert_array_equal(encoded, [np.eye(2)[1], np.eye(2)[0], np.eye(2)[1]])
+    assert sensor_.value == 3
+
+
+def test_feed_many_empty():
+    sensor_ = sensor.Sensor(numerical.SimpleEncoder(0, 10, 20, sparsity=0.2))
+
+    assert sensor_.feed_many([]).shape == (0, 20)
+    assert sensor_.value == 0
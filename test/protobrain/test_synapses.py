@@ -1,5 +1,7 @@
 """Tests for synapses module."""
 
+import pickle
+
 import pytest
 import numpy as np
 
@@ -46,6 +48,29 @@ def test_output_validates_values():
         out.values = np.zeros(11)
 
 
+def test_bind_output():
+    out = synapses.Output(4)
+    out.values = np.array([1.0, 0.0, 1.0, 0.0])
+    buffer = np.zeros(6)
+
+    out.bind(buffer[1:5])
+    np.testing.assert_array_equal(buffer, [0, 1, 0, 1, 0, 0])
+
+    out.values = np.array([0.0, 1.0, 1.0, 1.0])
+    assert out.values.base is buffer
+    np.testing.assert_array_equal(buffer, [0, 0, 1, 1, 1, 0])
+
+    with pytest.raises(ValueError, match="already bound"):
+        out.bind(np.zeros(4))
+
+    out.unbind()
+    out.values = np.ones(4)
+    np.testing.assert_array_equal(buffer, [0, 0, 1, 1, 1, 0])
+
+    with pytest.raises(ValueError, match="Dimension mismatch"):
+        out.bind(np.zeros(5))
+
+
 def test_connect_input_output(shape, expected_output):
     inp = synapses.Input("", shape)
     out = synapses.Output(shape)
@@ -68,6 +93,59 @@ def test_connect_input_merged_output():
     assert all(inp.values == [1, 1, 1, 1, 1, 2, 2, 2, 2, 2])
 
 
+def test_merged_output_cached():
+    out1 = synapses.Output(2)
+    out2 = synapses.Output(2)
+    out = synapses.OutputMerge(out1, out2)
+
+    assert out.values is out.values
+    out2.values = np.ones(2)
+    np.testing.assert_array_equal(out.values, [0, 0, 1, 1])
+
+
+def test_merged_output_shared():
+    out1 = synapses.Output((2, 1))
+    out2 = synapses.Output((2, 2))
+    out = synapses.OutputMerge(out1, out2, shared=True)
+    merged = out.values
+
+    assert out.shared
+    assert out.shape == (2, 3)
+    out2.values = np.ones((2, 2))
+    assert out.values is merged
+    np.testing.assert_array_equal(merged, [[0, 1, 1], [0, 1, 1]])
+
+    restored = pickle.loads(pickle.dumps(out))
+    restored._outputs[0].values = np.ones((2, 1))
+    np.testing.assert_array_equal(restored.values, np.ones((2, 3)))
+
+
+def test_merged_output_unbound():
+    out1 = synapses.Output(2)
+    out2 = synapses.Output(2)
+    out = synapses.OutputMerge(out1, out2, shared=True)
+
+    out1.unbind()
+    out1.values = np.ones(2)
+
+    np.testing.assert_array_equal(out.values, [1, 1, 0, 0])
+    assert not out.shared
+
+
+def test_merged_output_not_shared():
+    out1 = synapses.Output(2)
+    out = synapses.OutputMerge(out1, out1[:1], shared=True)
+
+    assert not out.shared
+    out1.values = np.ones(2)
+    np.testing.assert_array_equal(out.values, [1, 1, 1])
+
+
+def test_merge_output_mismatch():
+    with pytest.raises(ValueError):
+        synapses.OutputMerge(synapses.Output((2, 3)), synapses.Output((3, 2)))
+
+
 def test_connect_input_sliced_output(shape, expected_output):
     inp = synapses.Input("", 2)
     out = synapses.Output(shape)
@@ -89,3 +167,112 @@ def test_connect_2d():
     out.values = expected_out
     for i in range(shape[0]):
         assert all(inp.values[i] == expected_out[i])
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.float16, np.uint8])
+def test_connect_input_dtype(dtype):
+    inp = synapses.Input("", 10, dtype=dtype)
+    out = synapses.Output(20)
+
+    inp.connect(out)
+
+    assert inp.synapses.dtype == dtype
+    assert inp.synapses.shape == (20, 10)
+
+
+def test_connect_input_unsupported_dtype():
+    with pytest.raises(ValueError):
+        synapses.Input("", 10, dtype=np.int32)
+
+
+def test_quantize_permanences():
+    weights = np.array([0.0, 0.5, 1.0])
+
+    permanences = synapses.quantize(weights, np.uint8)
+
+    assert list(permanences) == [0, 128, 255]
+    np.testing.assert_allclose(
+        synapses.quantize(permanences, np.float64), weights, atol=0.5 / 255
+    )
+
+
+@pytest.mark.parametrize("density", [0.05, 0.8])
+def test_connect_input_sparse(density):
+    inp = synapses.Input("", 200, density=density)
+    out = synapses.Output(300)
+
+    inp.connect(out)
+
+    weights = inp.synapses
+    assert isinstance(weights, synapses.SparseSynapses)
+    assert weights.shape == (300, 200)
+    assert abs(len(weights.data) / (300 * 200) - density) < 0.01
+    for start, stop in zip(weights.indptr, weights.indptr[1:]):
+        assert np.all(np.diff(weights.indices[start:stop]) > 0)
+
+
+def test_sparse_synapses_match_dense():
+    weights = np.random.rand(30, 20) * (np.random.rand(30, 20) < 0.2)
+    sparse = synapses.SparseSynapses.from_dense(weights)
+    values = (np.random.rand(5, 30) < 0.5) * np.random.rand(5, 30)
+
+    np.testing.assert_array_equal(sparse.toarray(), weights)
+    np.testing.assert_allclose(sparse.dot(values[0]), np.dot(values[0], weights))
+    np.testing.assert_allclose(sparse.matmul(values), np.matmul(values, weights))
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.uint8])
+def test_sparse_synapses_silent_input(dtype):
+    weights = synapses.SparseSynapses.from_dense(
+        (np.random.rand(30, 20) < 0.2).astype(dtype)
+    )
+
+    activations = weights.dot(np.zeros(30))
+    batch = weights.matmul(np.zeros((5, 30)))
+
+    assert activations.dtype == batch.dtype == np.float64
+    np.testing.assert_array_equal(activations, np.zeros(20))
+    np.testing.assert_array_equal(batch, np.zeros((5, 20)))
+
+
+def test_sparse_synapses_columns():
+    weights = np.array([[0.5, 0, 0.2], [0, 0.3, 0.4], [0.1, 0, 0]])
+    sparse = synapses.SparseSynapses.from_dense(weights)
+
+    positions = sparse.columns(np.array([0, 2]))
+
+    assert sorted(sparse.data[positions]) == [0.1, 0.2, 0.4, 0.5]
+    assert sorted(sparse.row_of(positions)) == [0, 0, 1, 2]
+
+
+def test_input_stack():
+    inp1 = synapses.Input("", 4)
+    inp2 = synapses.Input("", 4)
+    inp1.connect(synapses.Output(3))
+    inp2.connect(synapses.Output(2))
+    expected = np.concatenate([inp1.synapses, inp2.synapses])
+
+    stack = synapses.InputStack.of([inp1, inp2])
+
+    np.testing.assert_array_equal(stack.synapses, expected)
+    assert synapses.InputStack.of([inp1, inp2]) is stack
+
+    inp1.synapses[0, 0] = 0.0
+    assert stack.synapses[0, 0] == 0.0
+
+    inp2.synapses = np.zeros((2, 4))
+    assert synapses.InputStack.of([inp1, inp2]) is not stack
+
+
+def test_input_stack_pickle():
+    inp1 = synapses.Input("", 4)
+    inp2 = synapses.Input("", 4)
+    inp1.connect(synapses.Output(3))
+    inp2.connect(synapses.Output(2))
+    synapses.InputStack.of([inp1, inp2])
+
+    inp1, inp2 = pickle.loads(pickle.dumps([inp1, inp2]))
+    stack = synapses.InputStack.of([inp1, inp2])
+
+    inp1.synapses[0, 0] = 0.0
+    assert stack.synapses[0, 0] == 0.0
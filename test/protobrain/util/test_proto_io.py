@@ -0,0 +1,182 @@
+"""Tests for proto_io module."""
+
+import contextlib
+
+import pytest
+import numpy as np
+
+from protobrain.util import proto_io
+
+
+class Message:
+    """A stand-in for a protobuf, serialized as its own bytes."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def SerializeToString(self) -> bytes:
+        return self.data
+
+    @classmethod
+    def FromString(cls, data: bytes) -> "Message":
+        return cls(bytes(data))
+
+
+@pytest.fixture(scope="function")
+def messages():
+    return [Message(bytes([i]) * i) for i in range(10)]
+
+
+def write(path, messages, index=True, buffer_size=0):
+    index_path = proto_io.index_path(path)
+    with (
+        open(path, "wb") as f,
+        open(index_path, "wb") if index else contextlib.nullcontext() as index_file,
+        proto_io.ProtoWriter(f, index_file, buffer_size=buffer_size) as writer,
+    ):
+        for message in messages:
+            writer.write(message)
+
+
+@pytest.mark.parametrize("buffer_size", [0, 16, 1 << 20])
+def test_write_read(tmp_path, messages, buffer_size):
+    path = tmp_path / "protos"
+    write(path, messages, buffer_size=buffer_size)
+
+    with open(path, "rb") as f:
+        read = [m.data for m in proto_io.ProtoReader(f, Message)]
+
+    assert read == [m.data for m in messages]
+
+
+def test_indexed_reader(tmp_path, messages):
+    path = tmp_path / "protos"
+    write(path, messages, buffer_size=16)
+
+    reader = proto_io.IndexedProtoReader(path, Message)
+
+    assert len(reader) == 10
+    assert reader[5].data == messages[5].data
+    assert reader[-1].data == messages[-1].data
+    assert [m.data for m in reader[2:8:3]] == [messages[2].data, messages[5].data]
+    with pytest.raises(IndexError):
+        reader[10]
+
+
+def test_indexed_reader_builds_index(tmp_path, messages):
+    path = tmp_path / "protos"
+    write(path, messages, index=False)
+
+    reader = proto_io.IndexedProtoReader(path, Message)
+
+    assert [m.data for m in reader] == [m.data for m in messages]
+    assert list(proto_io.IndexedProtoReader(path, Message).offsets) == list(
+        reader.offsets
+    )
+
+
+@pytest.mark.parametrize("appended", [1, 3])
+def test_indexed_reader_rebuilds_stale_index(tmp_path, messages, appended):
+    path = tmp_path / "protos"
+    write(path, messages[:5])
+    with open(path, "ab") as f:
+        for message in messages[5 : 5 + appended]:
+            proto_io.ProtoWriter(f).write(message)
+
+    with proto_io.IndexedProtoReader(path, Message) as reader:
+        assert [m.data for m in reader] == [m.data for m in messages[: 5 + appended]]
+    assert len(np.fromfile(proto_io.index_path(path), "<i8")) == 5 + appended
+
+
+def test_indexed_reader_rebuilds_index_of_rewritten_file(tmp_path, messages):
+    path = tmp_path / "protos"
+    write(path, messages)
+    with open(path, "wb") as f:
+        proto_io.ProtoWriter(f).write(messages[3])
+
+    with proto_io.IndexedProtoReader(path, Message) as reader:
+        assert [m.data for m in reader] == [messages[3].data]
+
+
+def test_indexed_reader_close(tmp_path, messages):
+    path = tmp_path / "protos"
+    write(path, messages)
+
+    with proto_io.IndexedProtoReader(path, Message) as reader:
+        assert reader[3].data == messages[3].data
+        mapped = reader._map
+
+    assert mapped.closed
+    assert len(reader) == 0
+
+
+def test_indexed_reader_empty(tmp_path):
+    path = tmp_path / "protos"
+    write(path, [])
+
+    assert len(proto_io.IndexedProtoReader(path, Message)) == 0
+
+
+@pytest.fixture(scope="function")
+def snapshots():
+    snapshot_pb2 = pytest.importorskip("protobrain.proto.snapshot_pb2")
+    rng = np.random.RandomState(0)
+    snapshots = []
+    for _ in range(50):
+        snapshot = snapshot_pb2.Snapshot()
+        for _ in range(3):
+            sdr = snapshot.cortex.sdr.add()
+            sdr.shape.append(1000)
+            sdr.on_bits.extend(np.flatnonzero(rng.rand(1000) < 0.02).tolist())
+        snapshot.sensor.sdr.on_bits.extend([3, 4, 5])
+        snapshots.append(snapshot)
+    return snapshots
+
+
+@pytest.mark.parametrize("compression", [proto_io.ZLIB, proto_io.LZMA])
+def test_blocks(tmp_path, snapshots, compression):
+    path = tmp_path / "blocks"
+    with (
+        open(path, "wb") as f,
+        proto_io.BlockWriter(f, compression=compression, block_size=16) as w,
+    ):
+        for snapshot in snapshots:
+            w.write(snapshot)
+
+    with open(path, "rb") as f:
+        reader = proto_io.BlockReader(f, type(snapshots[0]))
+        assert list(reader) == snapshots
+        assert len(reader) == 50
+        assert reader[37] == snapshots[37]
+        assert reader[-1] == snapshots[-1]
+        assert reader[3] == snapshots[3]
+        with pytest.raises(IndexError):
+            reader[50]
+
+
+def test_blocks_compress(tmp_path, snapshots):
+    plain, blocks = tmp_path / "plain", tmp_path / "blocks"
+    with open(plain, "wb") as f:
+        writer = proto_io.ProtoWriter(f)
+        for snapshot in snapshots:
+            writer.write(snapshot)
+    with open(blocks, "wb") as f, proto_io.BlockWriter(f) as writer:
+        for snapshot in snapshots:
+            writer.write(snapshot)
+
+    assert blocks.stat().st_size < plain.stat().st_size / 2
+
+
+def test_blocks_without_index(tmp_path, messages):
+    path = tmp_path / "blocks"
+    with open(path, "wb") as f:
+        writer = proto_io.BlockWriter(f, block_size=3, delta=False)
+        for message in messages:
+            writer.write(message)
+        writer.flush()
+
+    with open(path, "rb") as f:
+        reader = proto_io.BlockReader(f, Message)
+        assert len(reader) == 10
+        assert reader[7].data == messages[7].data
+        assert [m.data for m in reader] == [m.data for m in messages]